@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import datetime
+import importlib
 import multiprocessing
 import os
 import sys
@@ -11,52 +12,89 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from ikabot.config import *
-from ikabot.function.activateMiracle import activateMiracle
-from ikabot.function.alertAttacks import alertAttacks
-from ikabot.function.alertLowWine import alertLowWine
-from ikabot.function.attackBarbarians import attackBarbarians
-from ikabot.function.autoBarbarians import autoBarbarians
-from ikabot.function.autoPirate import autoPirate
-from ikabot.function.buyResources import buyResources
 from ikabot.function.checkForUpdate import checkForUpdate
-from ikabot.function.constructBuilding import constructBuilding
-from ikabot.function.constructionList import constructionList
-from ikabot.function.decaptchaConf import decaptchaConf
-from ikabot.function.distributeResources import distributeResources
-from ikabot.function.donate import donate
-from ikabot.function.donationBot import donationBot
-from ikabot.function.dumpWorld import dumpWorld
-from ikabot.function.getStatus import getStatus
-from ikabot.function.importExportCookie import importExportCookie
-from ikabot.function.Research import research
-from ikabot.function.consolidateResources import consolidateResources
-from ikabot.function.killTasks import killTasks
-from ikabot.function.loginDaily import loginDaily
-from ikabot.function.logs import logs
-from ikabot.function.proxyConf import proxyConf, show_proxy
-from ikabot.function.searchForIslandSpaces import searchForIslandSpaces
-from ikabot.function.sellResources import sellResources
-from ikabot.function.sendResources import sendResources
-from ikabot.function.shipMovements import shipMovements
-from ikabot.function.stationArmy import stationArmy
-from ikabot.function.testTelegramBot import testTelegramBot
-from ikabot.function.trainArmy import trainArmy
-from ikabot.function.update import update
-from ikabot.function.vacationMode import vacationMode
-from ikabot.function.webServer import webServer
-from ikabot.function.loadCustomModule import loadCustomModule
-from ikabot.function.activateShrine import activateShrine
-from ikabot.helpers.botComm import telegramDataIsValid, updateTelegramData
+from ikabot.function.proxyConf import show_proxy
+from ikabot.helpers.botComm import telegramDataIsValid
+from ikabot.helpers.broker import startBroker
 from ikabot.helpers.gui import *
+from ikabot.helpers.jobs import loadJobs
 from ikabot.helpers.pedirInfo import read
-from ikabot.helpers.process import updateProcessList
+from ikabot.helpers.process import (
+    runTask,
+    startHeartbeat,
+    taskLabel,
+    taskUsage,
+    unregisterTask,
+    updateProcessList,
+)
+from ikabot.helpers.supervisor import supervise
+from ikabot.helpers.worker import isWorkerTask, runInWorker
 from ikabot.web.session import *
-from ikabot.function.UpgradeUnits import UpgradeUnits
-from ikabot.function.modifyProduction import modifyProduction, modifyAcademyWorkers
-from ikabot.function.reorganizeCityBuildings import reorganizeCityBuildings
-from ikabot.function.UpgradeUnits import UpgradeUnits
-from ikabot.function.developer import developer
-from ikabot.function.tavernManager import tavernManager
+
+# menu entry -> "module:function" of its task. Modules are only imported when their entry is selected, see loadFunction
+menu_actions = {
+    1: "ikabot.function.constructionList:constructionList",
+    2: "ikabot.function.sendResources:sendResources",
+    3: "ikabot.function.distributeResources:distributeResources",
+    4: "ikabot.function.getStatus:getStatus",
+    5: "ikabot.function.activateShrine:activateShrine",
+    6: "ikabot.function.loginDaily:loginDaily",
+    701: "ikabot.function.alertAttacks:alertAttacks",
+    702: "ikabot.function.alertLowWine:alertLowWine",
+    801: "ikabot.function.buyResources:buyResources",
+    802: "ikabot.function.sellResources:sellResources",
+    901: "ikabot.function.donate:donate",
+    902: "ikabot.function.donationBot:donationBot",
+    10: "ikabot.function.vacationMode:vacationMode",
+    11: "ikabot.function.activateMiracle:activateMiracle",
+    1201: "ikabot.function.trainArmy:trainArmy",
+    1202: "ikabot.function.stationArmy:stationArmy",
+    1203: "ikabot.function.UpgradeUnits:UpgradeUnits",
+    13: "ikabot.function.shipMovements:shipMovements",
+    14: "ikabot.function.constructBuilding:constructBuilding",
+    15: "ikabot.function.update:update",
+    16: "ikabot.function.webServer:webServer",
+    17: "ikabot.function.autoPirate:autoPirate",
+    18: "ikabot.function.Research:research",
+    1901: "ikabot.function.attackBarbarians:attackBarbarians",
+    1902: "ikabot.function.autoBarbarians:autoBarbarians",
+    2001: "ikabot.function.searchForIslandSpaces:searchForIslandSpaces",
+    2002: "ikabot.function.dumpWorld:dumpWorld",
+    2101: "ikabot.function.proxyConf:proxyConf",
+    2102: "ikabot.helpers.botComm:updateTelegramData",
+    2103: "ikabot.function.killTasks:killTasks",
+    2104: "ikabot.function.decaptchaConf:decaptchaConf",
+    2105: "ikabot.function.logs:logs",
+    2106: "ikabot.function.testTelegramBot:testTelegramBot",
+    2107: "ikabot.function.importExportCookie:importExportCookie",
+    2108: "ikabot.function.loadCustomModule:loadCustomModule",
+    2109: "ikabot.function.developer:developer",
+    2110: "ikabot.function.resumeTasks:resumeTasks",
+    22: "ikabot.function.consolidateResources:consolidateResources",
+    2301: "ikabot.function.modifyProduction:modifyProduction",
+    2302: "ikabot.function.modifyProduction:modifyAcademyWorkers",
+    2303: "ikabot.function.tavernManager:tavernManager",
+    24: "ikabot.function.reorganizeCityBuildings:reorganizeCityBuildings",
+}
+
+# functions that can be started from a job file, by name
+job_functions = {path.split(":")[1]: path for path in menu_actions.values()}
+job_functions["resourceTransportManager"] = "ikabot.function.resourceTransportManager:resourceTransportManager"
+
+
+def loadFunction(path):
+    """Imports the module of a task function and returns the function
+    Parameters
+    ----------
+    path : str
+        "module:function", as in ``menu_actions``
+
+    Returns
+    -------
+    function : Callable
+    """
+    module, name = path.split(":")
+    return getattr(importlib.import_module(module), name)
 
 
 def menu(session, checkUpdate=True):
@@ -73,6 +111,8 @@ def menu(session, checkUpdate=True):
 
     banner()
 
+    # reaps the tasks started from this menu that have ended, so they are not listed as zombies
+    multiprocessing.active_children()
     process_list = updateProcessList(session)
     if len(process_list) > 0:
         # Insert table header
@@ -80,89 +120,52 @@ def menu(session, checkUpdate=True):
         table.insert(
             0, {"pid": "pid", "action": "task", "date": "date", "status": "status"}
         )
+        usage = ["usage"] + [taskUsage(r) for r in process_list]
         # Get max length of strings in each category (date is always going to be 15)
-        maxPid, maxAction, maxStatus = [
+        maxPid, maxAction, maxStatus, maxUsage = [
             max(i)
             for i in [
                 [len(str(r["pid"])) for r in table],
-                [len(str(r["action"])) for r in table],
+                [len(taskLabel(r)) for r in table],
                 [len(str(r["status"])) for r in table],
+                [len(u) for u in usage],
             ]
         ]
         # Print header
         print(
-            "|{:^{maxPid}}|{:^{maxAction}}|{:^15}|{:^{maxStatus}}|".format(
+            "|{:^{maxPid}}|{:^{maxAction}}|{:^15}|{:^{maxStatus}}|{:^{maxUsage}}|".format(
                 table[0]["pid"],
-                table[0]["action"],
+                taskLabel(table[0]),
                 table[0]["date"],
                 table[0]["status"],
+                usage[0],
                 maxPid=maxPid,
                 maxAction=maxAction,
                 maxStatus=maxStatus,
+                maxUsage=maxUsage,
             )
         )
         # Print process list
         [
             print(
-                "|{:^{maxPid}}|{:^{maxAction}}|{:^15}|{:^{maxStatus}}|".format(
+                "|{:^{maxPid}}|{:^{maxAction}}|{:^15}|{:^{maxStatus}}|{:^{maxUsage}}|".format(
                     r["pid"],
-                    r["action"],
+                    taskLabel(r),
                     datetime.datetime.fromtimestamp(r["date"]).strftime(
                         "%b %d %H:%M:%S"
                     ),
                     r["status"],
+                    u,
                     maxPid=maxPid,
                     maxAction=maxAction,
                     maxStatus=maxStatus,
+                    maxUsage=maxUsage,
                 )
             )
-            for r in process_list
+            for r, u in zip(process_list, usage[1:])
         ]
         print("")
 
-    menu_actions = {
-        1: constructionList,
-        2: sendResources,
-        3: distributeResources,
-        4: getStatus,
-        5: activateShrine,
-        6: loginDaily,
-        701: alertAttacks,
-        702: alertLowWine,
-        801: buyResources,
-        802: sellResources,
-        901: donate,
-        902: donationBot,
-        10: vacationMode,
-        11: activateMiracle,
-        1201: trainArmy,
-        1202: stationArmy,
-        1203: UpgradeUnits,
-        13: shipMovements,
-        14: constructBuilding,
-        15: update,
-        16: webServer,
-        17: autoPirate,
-        18: research,
-        1901: attackBarbarians,
-        1902: autoBarbarians,
-        2001: searchForIslandSpaces,
-        2002: dumpWorld,
-        2101: proxyConf,
-        2102: updateTelegramData,
-        2103: killTasks,
-        2104: decaptchaConf,
-        2105: logs,
-        2106: testTelegramBot,
-        2107: importExportCookie,
-        2108: loadCustomModule,
-        2109: developer,
-        22: consolidateResources,
-        2301: modifyProduction,
-        2302: modifyAcademyWorkers,
-        2303: tavernManager,
-        24: reorganizeCityBuildings,
-    }
 
     print("(0)  Exit")
     print("(1)  Construction list")
@@ -302,8 +305,9 @@ def menu(session, checkUpdate=True):
         print("(7) Import / Export cookie")
         print("(8) Load custom ikabot module")
         print("(9) Developer Data")
+        print("(10) Resume interrupted tasks")
 
-        selected = read(min=0, max=9, digit=True)
+        selected = read(min=0, max=10, digit=True)
         if selected == 0:
             menu(session)
             return
@@ -311,24 +315,41 @@ def menu(session, checkUpdate=True):
             selected += 2100
 
     if selected != 0:
+        function = loadFunction(menu_actions[selected])
+        if broker_mode:
+            startBroker(session)
+    if selected != 0 and isWorkerTask(function):
+        config.has_params = len(config.predetermined_input) > 0
+        # the task adds itself to the process list
+        runInWorker(session, function)
+        menu(session, checkUpdate=False)
+    elif selected != 0:
         try:
             event = multiprocessing.Event()  # creates a new event
             config.has_params = len(config.predetermined_input) > 0
             process = multiprocessing.Process(
-                target=menu_actions[selected],
-                args=(session, event, sys.stdin.fileno(), config.predetermined_input),
-                name=menu_actions[selected].__name__,
+                target=runTask,
+                args=(
+                    function,
+                    session,
+                    event,
+                    sys.stdin.fileno(),
+                    config.predetermined_input,
+                ),
+                name=function.__name__,
             )
             process.start()
-            process_list.append(
-                {
-                    "pid": process.pid,
-                    "action": menu_actions[selected].__name__,
-                    "date": time.time(),
-                    "status": "started",
-                }
+            updateProcessList(
+                session,
+                programprocesslist=[
+                    {
+                        "pid": process.pid,
+                        "action": function.__name__,
+                        "date": time.time(),
+                        "status": "started",
+                    }
+                ],
             )
-            updateProcessList(session, programprocesslist=process_list)
             event.wait()  # waits for the process to fire the event that's been given to it. When it does  this process gets back control of the command line and asks user for more input
         except KeyboardInterrupt:
             pass
@@ -345,6 +366,95 @@ def menu(session, checkUpdate=True):
         )  # kills the process which executes this statement, but it does not kill it's child processes
 
 
+def startJob(session, job, restarts=0):
+    """Starts one job of a job file, feeding it the job's inputs, and waits until it has asked all its questions
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    job : dict
+        job returned by ``ikabot.helpers.jobs.loadJobs``
+    restarts : int
+        times the job has been restarted by the supervisor, shown in the process table
+
+    Returns
+    -------
+    process : multiprocessing.Process | None
+        the process of the task, or None if it runs inside the worker process or could not be started
+    """
+    function = loadFunction(job["function"])
+    if broker_mode:
+        startBroker(session)
+    del config.predetermined_input[:]
+    config.predetermined_input.extend(job["inputs"])
+    config.has_params = True
+    print("{}: starting {}".format(job["name"], function.__name__))
+    process = None
+    # the supervisor can only watch tasks that have a process of their own
+    if isWorkerTask(function) and not job["restart"]:
+        runInWorker(session, function, name=job["name"])
+    else:
+        event = multiprocessing.Event()
+        process = multiprocessing.Process(
+            target=runTask,
+            args=(
+                function,
+                session,
+                event,
+                sys.stdin.fileno(),
+                config.predetermined_input,
+            ),
+            name=function.__name__,
+        )
+        process.start()
+        entry = {
+            "pid": process.pid,
+            "action": function.__name__,
+            "name": job["name"],
+            "date": time.time(),
+            "status": "started",
+        }
+        if restarts:
+            entry["restarts"] = restarts
+        updateProcessList(session, programprocesslist=[entry])
+        if not event.wait(jobs_start_timeout):
+            process.terminate()
+            process = None
+            print("{}: the task did not start, it may need more inputs".format(job["name"]))
+    if len(config.predetermined_input) > 0:
+        print(
+            "{}: {} inputs were not used, check the job file".format(
+                job["name"], len(config.predetermined_input)
+            )
+        )
+        del config.predetermined_input[:]
+    return process
+
+
+def startJobs(session, jobs):
+    """Starts the given jobs directly, without going through the menu. Each task reads its answers from the job's inputs
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    jobs : list[dict]
+        jobs returned by ``ikabot.helpers.jobs.loadJobs``
+
+    Returns
+    -------
+    supervised : list[tuple[dict, multiprocessing.Process]]
+        the jobs that have to be restarted if they crash, with their process
+    """
+    running = {process.get("name") for process in updateProcessList(session)}
+    supervised = []
+    for job in jobs:
+        if job["name"] in running:
+            print("{}: already running, skipped".format(job["name"]))
+            continue
+        process = startJob(session, job)
+        if job["restart"] and process is not None:
+            supervised.append((job, process))
+    return supervised
+
+
 def init():
     home = "USERPROFILE" if isWindows else "HOME"
     os.chdir(os.getenv(home))
@@ -354,6 +464,19 @@ def init():
 
 
 def start():
+    jobs = None
+    if "--jobs" in sys.argv:
+        index = sys.argv.index("--jobs")
+        if index + 1 >= len(sys.argv):
+            print("Usage: ikabot --jobs <job file> [email password]")
+            sys.exit(1)
+        try:
+            jobs = loadJobs(sys.argv[index + 1], job_functions)
+        except (OSError, ValueError) as e:
+            print(e)
+            sys.exit(1)
+        del sys.argv[index : index + 2]
+
     init()
     config.has_params = len(sys.argv) > 1
     for arg in sys.argv:
@@ -364,6 +487,29 @@ def start():
     config.predetermined_input.pop(0)
 
     session = Session()
+    if jobs is not None:
+        supervised = startJobs(session, jobs)
+        if supervised:
+            startHeartbeat(session)
+            updateProcessList(
+                session,
+                programprocesslist=[
+                    {
+                        "pid": os.getpid(),
+                        "action": "supervisor",
+                        "date": time.time(),
+                        "status": "started",
+                    }
+                ],
+            )
+            print("Restarting the tasks that crash, press Ctrl+C to stop (the tasks keep running)")
+            try:
+                supervise(session, supervised, startJob)
+            except KeyboardInterrupt:
+                pass
+            unregisterTask(session)
+        # like leaving the menu, the tasks keep running
+        os._exit(0)
     try:
         menu(session)
     finally:
@@ -386,10 +532,3 @@ if __name__ == "__main__":
     if sys.platform.startswith("win"):
         multiprocessing.freeze_support()
     main()
-
-#############################################################
-# This is necessary to ensure that flask is frozen together #
-# with other requirements when creating ikabot.exe          #
-try: import flask                                           #
-except: pass                                                #
-#############################################################
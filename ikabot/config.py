@@ -29,6 +29,7 @@ has_params = False
 menu_cities = ""
 infoUser = ""
 ikaFile = ".ikabot"
+ikaDatabaseFile = ".ikabot.db"
 city_url = "view=city&cityId="
 island_url = "view=island&islandId="
 prompt = " >>  "
@@ -61,7 +62,52 @@ tradegoods_names = [
     "Sulfur Pit",
 ]
 ConnectionError_wait = 5 * 60
+# seconds a GET response can be served again from memory if no other request was sent in between, by view ("" is the bare index.php page). Views not listed are never cached
+response_cache_ttl = {
+    "": 2,
+    "city": 2,
+    "updateGlobalData": 2,
+}
+# keep-alive connections to the game server
+game_pool_size = int(os.getenv("IKABOT_POOL_SIZE", 4))  # maximum number of pooled connections
+game_pool_idle_timeout = int(os.getenv("IKABOT_POOL_IDLE_TIMEOUT", 60))  # seconds after which idle connections are discarded instead of reused
+# opt-in: run these tasks, which sleep most of the time, as threads of one worker process per account instead of one process each
+worker_mode = os.getenv("IKABOT_WORKER_MODE", "0").lower() in ("1", "true", "yes")
+worker_tasks = [
+    "alertAttacks",
+    "alertLowWine",
+    "autoPirate",
+    "donationBot",
+    "loginDaily",
+    "searchForIslandSpaces",
+]
+# opt-in: send the requests of every task through one broker process that owns the session, so that it is renewed only once when it expires
+broker_mode = os.getenv("IKABOT_BROKER", "0").lower() in ("1", "true", "yes")
+broker_idle_timeout = 60  # seconds the broker waits without tasks connected to it before exiting, once the menu is closed
+process_heartbeat_interval = 15  # seconds between the heartbeats every task writes to the process registry, they also refresh its resource usage
+process_heartbeat_timeout = 3 * 60  # a task that hasn't sent a heartbeat for this long is considered dead
+jobs_start_timeout = 5 * 60  # seconds a task started from a job file has to finish asking its questions
+# tasks of a job file with 'restart: true' are started again when they crash, waiting twice as long after each consecutive crash
+supervisor_backoff = 30  # seconds before the first restart
+supervisor_backoff_max = 30 * 60
+supervisor_max_restarts = 5  # consecutive crashes after which a task is considered to be in a crash loop and is given up
+supervisor_stable_time = 60 * 60  # a task that ran for this long before crashing starts counting its crashes again
+# the travel time parameters of each city are refreshed when its port level changes, and after this many seconds to pick up government and Poseidon changes
+travel_times_max_age = 6 * 60 * 60
+ship_reservation_timeout = 5 * 60  # seconds after which the ships reserved by a task that died without releasing them can be used by the others
+# requests of all the tasks of an account share a token bucket, kept in the local state database so that every process sees it
+request_rate = float(os.getenv("IKABOT_REQUEST_RATE", 0))  # requests per second, 0 (the default) disables the limit
+request_burst = int(os.getenv("IKABOT_REQUEST_BURST", 10))  # requests that can be sent at once after being idle
+# tokens each priority class leaves in the bucket for the classes above it, so bulk tasks yield to the latency critical ones when the bucket runs low
+request_priority_reserve = {"high": 0, "normal": 2, "bulk": 5}
+request_priorities = {  # priority class of the requests of each task, tasks not listed are "normal"
+    "alertAttacks": "high",
+    "webServer": "high",
+    "dumpWorld": "bulk",
+    "searchForIslandSpaces": "bulk",
+}
 actionRequest = "REQUESTID"
+actionRequest_max_age = 5 * 60  # seconds a harvested actionRequest token is trusted without refetching
 piracyMissionToBuildingLevel = {
     1: 1,
     2: 3,
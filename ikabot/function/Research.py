@@ -6,7 +6,7 @@ import traceback
 
 from ikabot.config import *
 from ikabot.helpers.botComm import *
-from ikabot.helpers.getJson import getCity
+from ikabot.helpers.getJson import getCity, getHeaderSnapshot
 from ikabot.helpers.gui import *
 from ikabot.helpers.pedirInfo import *
 from ikabot.helpers.process import set_child_mode
@@ -44,11 +44,7 @@ def experiment(session, experiments, automatic):
     while experiments["qty"] > 0:
         if automatic is True: experiments["qty"] = 999999
         # Validate if material is still there..oterwhise log it and send it via bot
-        session.get("view=city&cityId={}".format(experiments["cityID"]), noIndex=True)
-        data = session.get("view=updateGlobalData&ajax=1", noIndex=True)
-        json_data = json.loads(data, strict=False)
-        json_data = json_data[0][1]["headerData"]
-        current_glass = int(json_data["currentResources"]["3"])
+        current_glass = getHeaderSnapshot(session, experiments["cityID"])["availableResources"][3]
 
         if current_glass < 300000:
             if automatic is False:
@@ -231,6 +227,7 @@ def research(session, event, stdin_fd, predetermined_input):
             except Exception as e:
                 error_msg = f"Error in:\n{info}\nCause:\n{traceback.format_exc()}"
                 sendToBot(session, error_msg)
+                session.failed = True
             finally:
                 session.logout()
 
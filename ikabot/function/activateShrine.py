@@ -185,6 +185,7 @@ def activateShrine(session, event, stdin_fd, predetermined_input):
     except Exception as e:
         msg = f"Error in activateShrine:\n\n{e}"
         sendToBot(session, msg)
+        session.failed = True
     finally:
         session.logout()
 
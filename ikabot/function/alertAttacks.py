@@ -10,7 +10,7 @@ from ikabot.helpers.botComm import *
 from ikabot.helpers.gui import enter
 from ikabot.helpers.process import set_child_mode
 from ikabot.helpers.signals import setInfoSignal
-from ikabot.helpers.varios import daysHoursMinutes
+from ikabot.helpers.varios import daysHoursMinutes, getTaskId
 
 
 def alertAttacks(session, event, stdin_fd, predetermined_input):
@@ -54,15 +54,18 @@ def alertAttacks(session, event, stdin_fd, predetermined_input):
     except Exception as e:
         msg = "Error in:\n{}\nCause:\n{}".format(info, traceback.format_exc())
         sendToBot(session, msg)
+        session.failed = True
     finally:
         session.logout()
 
 
-def respondToAttack(session):
+def respondToAttack(session, task_id):
     """
     Parameters
     ---------
     session : ikabot.web.session.Session
+    task_id : int
+        id of the alertAttacks task, which the user quotes in the response
     """
 
     # this allows the user to respond to an attack via telegram
@@ -80,7 +83,7 @@ def respondToAttack(session):
             action = int(rta.group(2))
 
             # if the pid doesn't match, we ignore it
-            if pid != os.getpid():
+            if pid != task_id:
                 continue
 
             # currently just one action is supported
@@ -100,7 +103,8 @@ def do_it(session, minutes):
     """
 
     # this thread lets the user react to an attack once the alert is sent
-    thread = threading.Thread(target=respondToAttack, args=(session,))
+    task_id = getTaskId()
+    thread = threading.Thread(target=respondToAttack, args=(session, task_id))
     thread.start()
 
     knownAttacks = []
@@ -149,7 +153,7 @@ def do_it(session, minutes):
                     msg += "{} fleet\n".format(amountFleets)
                     msg += "arrival in: {}\n".format(daysHoursMinutes(timeLeft))
                     msg += "If you want to put the account in vacation mode send:\n"
-                    msg += "{:d}:1".format(os.getpid())
+                    msg += "{:d}:1".format(task_id)
                     sendToBot(session, msg)
 
         except Exception as e:
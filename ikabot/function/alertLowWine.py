@@ -2,7 +2,6 @@
 # -*- coding: utf-8 -*-
 
 import re
-import time
 import datetime
 import traceback
 from decimal import *
@@ -16,7 +15,7 @@ from ikabot.helpers.pedirInfo import getIdsOfCities
 from ikabot.helpers.process import set_child_mode
 from ikabot.helpers.resources import getWineConsumptionPerHour, getAvailableResources, getProductionPerHour
 from ikabot.helpers.signals import setInfoSignal
-from ikabot.helpers.varios import daysHoursMinutes
+from ikabot.helpers.varios import daysHoursMinutes, wait
 from ikabot.helpers.planRoutes import *
 
 getcontext().prec = 30
@@ -68,6 +67,7 @@ def alertLowWine(session, event, stdin_fd, predetermined_input):
     except Exception as e:
         msg = (f"Error in:\n{info}\nCause:\n{traceback.format_exc()}")
         sendToBot(session, msg)
+        session.failed = True
     finally:
         session.logout()
 
@@ -245,6 +245,6 @@ def do_it(session, hours, auto_transfer, transfer_amount):
             message_log.clear()
 
         if routes:
-            executeRoutes(session, routes, useFreighters=False)
+            executeRoutes(session, routes, useFreighters=False, resumable=False)
             routes.clear()
-        time.sleep(60 * 60)
+        wait(60 * 60)
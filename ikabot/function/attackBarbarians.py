@@ -318,6 +318,7 @@ def attackBarbarians(session, event, stdin_fd, predetermined_input):
     except Exception as e:
         msg = "Error in:\n{}\nCause:\n{}".format(info, traceback.format_exc())
         sendToBot(session, msg)
+        session.failed = True
     finally:
         session.logout()
 
@@ -9,6 +9,7 @@ from collections import defaultdict
 
 from ikabot.config import *
 from ikabot.helpers.botComm import *
+from ikabot.helpers.checkpoint import deleteCheckpoint, saveCheckpoint
 from ikabot.helpers.getJson import getCity
 from ikabot.helpers.gui import *
 from ikabot.helpers.naval import *
@@ -286,6 +287,7 @@ def autoBarbarians(session, event, stdin_fd, predetermined_input):
     except Exception as e:
         msg = "Error in:\n{}\nCause:\n{}".format(info, traceback.format_exc())
         sendToBot(session, msg)
+        session.failed = True
     finally:
         session.logout()
 
@@ -578,12 +580,49 @@ def has_units_in_city(session, city, units):
     )
 
 
-def do_it(session, island, city, float_city, schematic, units_data, ship_capacity):
+def do_it(session, island, city, float_city, schematic, units_data, ship_capacity, phase=None):
+    """
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    island : dict
+    city : dict
+    float_city : dict
+    schematic : list[dict]
+    units_data : dict
+    ship_capacity : int
+    phase : str
+        'attacking' or 'looting' if the grind is resumed while an attack or a looting was on its way
+    """
+
+    def save(phase):
+        saveCheckpoint(
+            session,
+            "autoBarbarians",
+            "ikabot.function.autoBarbarians:resume_do_it",
+            {
+                "island_id": island["id"],
+                "city_id": city["id"],
+                "float_city_id": float_city["id"] if float_city is not None else None,
+                "schematic": schematic,
+                "units_data": units_data,
+                "ship_capacity": ship_capacity,
+                "phase": phase,
+            },
+            info="barbarians [{}:{}] from {}".format(island["x"], island["y"], city["name"]),
+        )
+
+    if phase == "attacking":
+        wait_until_attack_is_over(session, city, island)
+    elif phase == "looting":
+        wait_for_looting(session, city, island)
+
     attempts = {"ships": 0}
     first_loop = True
     while True:
+        save(None)
         if first_loop is False:
-            time.sleep(FIVE_MINUTES)
+            wait(FIVE_MINUTES)
         else:
             first_loop = False
         html = session.get(island_url + island["id"])
@@ -601,6 +640,7 @@ def do_it(session, island, city, float_city, schematic, units_data, ship_capacit
             )
             break
         if island["barbarians"]["destroyed"] == 1:
+            save("looting")
             loot(
                 session,
                 island,
@@ -652,6 +692,7 @@ def do_it(session, island, city, float_city, schematic, units_data, ship_capacit
                 )
             ,
         )
+        save("attacking")
         do_attack(
             session,
             island,
@@ -674,6 +715,31 @@ def do_it(session, island, city, float_city, schematic, units_data, ship_capacit
             )
         ,
     )
+    deleteCheckpoint(session, "autoBarbarians")
+
+
+def resume_do_it(session, state):
+    """Resumes the grind checkpointed by ``do_it``
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    state : dict
+    """
+    island = getIsland(session.get(island_url + str(state["island_id"])))
+    city = getCity(session.get(city_url + str(state["city_id"])))
+    float_city = None
+    if state["float_city_id"] is not None:
+        float_city = getCity(session.get(city_url + str(state["float_city_id"])))
+    do_it(
+        session,
+        island,
+        city,
+        float_city,
+        state["schematic"],
+        state["units_data"],
+        state["ship_capacity"],
+        phase=state["phase"],
+    )
 
 
 def do_attack(session, island, city, schematic, ship_capacity, float_city=None, units_data={}):
@@ -120,6 +120,7 @@ def consolidateResources(session, event, stdin_fd, predetermined_input):
     except Exception as e:
         msg = "Error in:\n{}\nCause:\n{}".format(info, traceback.format_exc())
         sendToBot(session, msg)
+        session.failed = True
     finally:
         session.logout()
 
@@ -146,6 +147,9 @@ def do_it(session, limits, sourceCityIds, destinationCityId, intervalInHours):
             time.sleep(60)
             continue
             
+        # the routes of every source city are executed together, so that the available ships are shared between them
+        routes = []
+        destinationSpace = None
         # Loop through each source city ID in the provided list
         for sourceCityId in sourceCityIds:
             try:
@@ -157,6 +161,8 @@ def do_it(session, limits, sourceCityIds, destinationCityId, intervalInHours):
 
             toSend = [0] * len(materials_names)
             totalToSend = 0
+            if destinationSpace is None:
+                destinationSpace = list(destinationCity['freeSpaceForResources'])
 
             session.setStatus(
                 f"{sourceCity['name']} -> {destinationCity['name']}| Processing..."
@@ -166,28 +172,32 @@ def do_it(session, limits, sourceCityIds, destinationCityId, intervalInHours):
                 limit = limits[i]
                 
                 sourceAmount = sourceCity['availableResources'][i]
-                destinationSpace = destinationCity['freeSpaceForResources'][i]
 
                 if limit == -1 or limit < 0:  # Handle any negative number as "keep all"
                     toSend[i] = 0
                 else:
                     excess = max(0, sourceAmount - limit)
-                    sendable = min(excess, destinationSpace)
+                    sendable = min(excess, destinationSpace[i])
                     toSend[i] = sendable
                     totalToSend += sendable
+                    # the space is taken by the routes of the previous source cities
+                    destinationSpace[i] -= sendable
 
             if totalToSend != 0:
-                route = (
-                    sourceCity,
-                    destinationCity,
-                    destinationCity["islandId"],
-                    *toSend,
+                routes.append(
+                    (
+                        sourceCity,
+                        destinationCity,
+                        destinationCity["islandId"],
+                        *toSend,
+                    )
                 )
-
-                executeRoutes(session, [route], useFreighters=False)
                 loop_amount_sent += totalToSend
                 total_amount_sent += totalToSend
 
+        if routes:
+            executeRoutes(session, routes, useFreighters=False, resumable=False)
+
         nextRunTime = datetime.datetime.now() + datetime.timedelta(hours=intervalInHours)
         
         # Get the name of each source city by its ID for the final status message
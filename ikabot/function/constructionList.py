@@ -17,13 +17,17 @@ from functools import cache
 
 from ikabot.config import *
 from ikabot.helpers.botComm import *
+from ikabot.helpers.checkpoint import deleteCheckpoint, saveCheckpoint
 from ikabot.helpers.getJson import getCity
 from ikabot.helpers.gui import *
 from ikabot.helpers.pedirInfo import *
 from ikabot.helpers.planRoutes import *
 from ikabot.helpers.process import set_child_mode
 from ikabot.helpers.resources import getAvailableResources
+from ikabot.helpers.scheduler import sleepUntil
 from ikabot.helpers.signals import setInfoSignal
+from ikabot.helpers.transportPlanner import cityDistance, planDistribution
+from ikabot.helpers.travelTimes import travelTimeCost
 from ikabot.helpers.varios import *
 from ikabot.web.session import normal_get
 
@@ -72,7 +76,7 @@ def waitForConstruction(session, city_id, final_lvl):
         session.setStatus(
             f"Waiting until {getDateTime(time.time()+seconds_to_wait+10)[8:]}, {construction_building['name']} {construction_building['level']} -> {construction_building['level']+1} in {city['name']}, final lvl: {final_lvl}"
         )
-        wait(seconds_to_wait + 10)
+        sleepUntil(final_time + 10)
 
     html = session.get(city_url + city_id)
     city = getCity(html)
@@ -153,6 +157,61 @@ def expandBuilding(session, cityId, building, waitForResources):
     sendToBotDebug(session, msg, debugON_constructionList)
 
 
+def expandBuildings(session, cityId, buildings, waitForResources):
+    """Expands the buildings one after the other, checkpointing the ones that are left
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    cityId : int
+    buildings : list[dict]
+    waitForResources : bool
+    """
+    pending = [
+        {
+            "position": building["position"],
+            "name": building["name"],
+            "upgradeTo": building["upgradeTo"],
+        }
+        for building in buildings
+    ]
+    for building in buildings:
+        saveCheckpoint(
+            session,
+            "constructionList",
+            "ikabot.function.constructionList:resumeConstructionList",
+            {"cityId": cityId, "buildings": pending, "waitForResources": waitForResources},
+            info=", ".join(
+                "{} to {:d}".format(pending_building["name"], pending_building["upgradeTo"])
+                for pending_building in pending
+            ),
+        )
+        expandBuilding(session, cityId, building, waitForResources)
+        pending.pop(0)
+    deleteCheckpoint(session, "constructionList")
+
+
+def resumeConstructionList(session, state):
+    """Resumes the buildings checkpointed by ``expandBuildings``, skipping the levels that were already built
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    state : dict
+    """
+    html = session.get(city_url + str(state["cityId"]))
+    city = getCity(html)
+    buildings = []
+    for pending_building in state["buildings"]:
+        building = city["position"][pending_building["position"]]
+        current_level = building["level"]
+        if building["isBusy"]:
+            current_level += 1
+        if current_level >= pending_building["upgradeTo"]:
+            continue
+        building["upgradeTo"] = pending_building["upgradeTo"]
+        buildings.append(building)
+    expandBuildings(session, state["cityId"], buildings, state["waitForResources"])
+
+
 def getCostsReducers(city):
     """
     Parameters
@@ -355,35 +414,28 @@ def sendResourcesNeeded(session, destination_city_id, city_origins, missing_reso
         html = session.get(city_url + destination_city_id)
         cityD = getCity(html)
 
-        # build combined routes per origin city so multiple resources
+        # the closest providers are used first, and multiple resources
         # from the same city are sent in a single shipment
-        combined = {}  # origin_city_id -> (cityOrigin, toSend_list)
-
+        cities = {cityD["id"]: cityD}
+        supply = {}
+        demand = {cityD["id"]: [0] * len(materials_names)}
         for i in range(len(materials_names)):
             missing = missing_resources[i]
             if missing <= 0:
                 continue
 
             target = _round_up_resources(missing) if useRounding else missing
-            remaining = target
+            # the space is not checked, executeRoutes waits until the resources fit
+            demand[cityD["id"]][i] = target
 
             for cityOrigin in city_origins[i]:
-                if remaining == 0:
-                    break
+                cities[cityOrigin["id"]] = cityOrigin
+                supply.setdefault(cityOrigin["id"], [0] * len(materials_names))
+                supply[cityOrigin["id"]][i] = cityOrigin["availableResources"][i]
 
-                available = cityOrigin["availableResources"][i]
-                send = min(available, remaining)
-                remaining -= send
-
-                city_id = cityOrigin["id"]
-                if city_id not in combined:
-                    combined[city_id] = (cityOrigin, [0] * len(materials_names))
-                combined[city_id][1][i] += send
-
-        routes = []
-        for city_id, (cityOrigin, toSend) in combined.items():
-            route = (cityOrigin, cityD, cityD["islandId"], *toSend)
-            routes.append(route)
+        routes = planDistribution(
+            cities, supply, demand, travelTimeCost(session, cities)
+        )
 
         executeRoutes(session, routes, useFreighters)
     except Exception as e:
@@ -418,7 +470,11 @@ def chooseResourceProviders(session, cities_ids, cities, city_id, resource, miss
 
     origin_cities = []
     total_available = 0
-    for cityId in cities_ids:
+    # the closest cities are offered first, so that they are the ones chosen when there are enough resources
+    destination = cities[str(city_id)]
+    for cityId in sorted(
+        cities_ids, key=lambda cityId: cityDistance(cities[cityId], destination)
+    ):
         if cityId == city_id:
             continue
 
@@ -723,13 +779,13 @@ def constructionList(session, event, stdin_fd, predetermined_input):
     setInfoSignal(session, info)
     try:
         if expand:
-            for building in buildings:
-                expandBuilding(session, cityId, building, wait_resources)
+            expandBuildings(session, cityId, buildings, wait_resources)
         elif thread:
             thread.join()
     except Exception as e:
         msg = "Error in:\n{}\nCause:\n{}".format(info, traceback.format_exc())
         sendToBot(session, msg)
+        session.failed = True
     finally:
         session.logout()
 
@@ -12,6 +12,8 @@ from ikabot.helpers.planRoutes import executeRoutes
 from ikabot.helpers.process import set_child_mode
 from ikabot.helpers.resources import *
 from ikabot.helpers.signals import setInfoSignal
+from ikabot.helpers.transportPlanner import planDistribution
+from ikabot.helpers.travelTimes import travelTimeCost
 from ikabot.helpers.varios import addThousandSeparator
 
 
@@ -102,6 +104,7 @@ def distributeResources(session, event, stdin_fd, predetermined_input):
     except Exception as e:
         msg = "Error in:\n{}\nCause:\n{}".format(info, traceback.format_exc())
         sendToBot(session, msg)  # sends message to telegram bot
+        session.failed = True
     finally:
         session.logout()
 
@@ -167,68 +170,20 @@ def distribute_evenly(session, resource_type, cities_ids, cities):
                     )
             break
 
-    originCities = {
-        k: v
-        for k, v in sorted(originCities.items(), key=lambda item: item[1], reverse=True)
-    }  # sort origin cities in descending order
-    destinationCities = {
-        k: v for k, v in sorted(destinationCities.items(), key=lambda item: item[1])
-    }  # sort destination cities in ascending order
-
-    routes = []
-
-    for originCityID in originCities:  # iterate through all origin city ids
-
-        for (
-            destinationCityID
-        ) in destinationCities:  # iterate through all destination city ids
-            if (
-                originCities[originCityID] == 0
-                or destinationCities[destinationCityID] == 0
-            ):
-                continue
-
-            if (
-                originCities[originCityID] > destinationCities[destinationCityID]
-            ):  # if there's more resources above average in the origin city than resources below average in the destination city (origin city needs to have a surplus and destination city needs to have a deficit of resources for a route to be considered)
-                toSend = destinationCities[
-                    destinationCityID
-                ]  # number of resources to send is the number of resources below average in destination city
-            else:
-                toSend = originCities[
-                    originCityID
-                ]  # send the amount of resources above average of the current origin city
-
-            if toSend == 0:
-                continue
-
-            toSendArr = [0] * len(materials_names)
-            toSendArr[resource_type] = toSend
-            route = (
-                allCities[originCityID],
-                allCities[destinationCityID],
-                allCities[destinationCityID]["islandId"],
-                *toSendArr,
-            )
-            routes.append(route)
-
-            # ROUTE BLOCK
-            if originCities[originCityID] > destinationCities[destinationCityID]:
-                originCities[originCityID] -= destinationCities[
-                    destinationCityID
-                ]  # remove the sent amount from the origin city's surplus
-                destinationCities[destinationCityID] = (
-                    0  # set the amount of resources below average in destination city to 0
-                )
-            else:
-                destinationCities[destinationCityID] -= originCities[
-                    originCityID
-                ]  # remove the sent amount from the amount of resources below average in current destination city
-                originCities[originCityID] = (
-                    0  # set the amount of resources above average in origin city to 0
-                )
+    supply = {}
+    for cityID, amount in originCities.items():
+        supply[cityID] = [0] * len(materials_names)
+        supply[cityID][resource_type] = amount
+    demand = {}
+    for cityID, amount in destinationCities.items():
+        demand[cityID] = [0] * len(materials_names)
+        demand[cityID][resource_type] = min(
+            amount, allCities[cityID]["freeSpaceForResources"][resource_type]
+        )
 
-    return routes
+    return planDistribution(
+        allCities, supply, demand, travelTimeCost(session, allCities)
+    )
 
 
 def distribute_unevenly(session, resource_type, cities_ids, cities):
@@ -331,40 +286,19 @@ def distribute_unevenly(session, resource_type, cities_ids, cities):
             remaining_resources_to_send // len(free_storage_available_per_city)
         )
 
-    routes = []
-    for destination_city_id in destination_cities:
-        destination_city = destination_cities[destination_city_id]
-        island_id = destination_city["islandId"]
-        missing_resources = toSend[destination_city_id]
-        for origin_city_id in origin_cities:
-            if missing_resources == 0:
-                break
-
-            origin_city = origin_cities[origin_city_id]
-            resources_available_in_this_city = origin_city[
-                "available_amount_of_resource"
-            ]
-            for route in routes:
-                origin = route[0]
-                resource = route[resource_type + 3]
-                if origin["id"] == origin_city_id:
-                    resources_available_in_this_city -= resource
-
-            send_this_round = min(missing_resources, resources_available_in_this_city)
-            available = destination_city["free_storage_for_resource"]
-            if available == 0 or send_this_round == 0:
-                continue
-
-            if available < send_this_round:
-                missing_resources = 0
-                send_this_round = available
-            else:
-                missing_resources -= send_this_round
-
-            toSendArr = [0] * len(materials_names)
-            toSendArr[resource_type] = send_this_round
-            route = (origin_city, destination_city, island_id, *toSendArr)
-
-            routes.append(route)
+    supply = {}
+    for origin_city_id, origin_city in origin_cities.items():
+        supply[origin_city_id] = [0] * len(materials_names)
+        supply[origin_city_id][resource_type] = origin_city["available_amount_of_resource"]
+    demand = {}
+    for destination_city_id, destination_city in destination_cities.items():
+        demand[destination_city_id] = [0] * len(materials_names)
+        demand[destination_city_id][resource_type] = min(
+            toSend.get(destination_city_id, 0),
+            destination_city["free_storage_for_resource"],
+        )
 
-    return routes
+    cities = {**origin_cities, **destination_cities}
+    return planDistribution(
+        cities, supply, demand, travelTimeCost(session, cities)
+    )
@@ -3,7 +3,6 @@
 
 import ast
 import gzip
-import json
 import os
 import re
 import sys
@@ -14,7 +13,10 @@ from pathlib import Path
 import ikabot.config as config
 from ikabot.config import *
 from ikabot.helpers.botComm import sendToBot
+from ikabot.helpers.checkpoint import deleteCheckpoint, saveCheckpoint
 from ikabot.helpers.getJson import getIsland
+from ikabot.helpers.models import Island
+from ikabot.helpers import jsonCodec
 from ikabot.helpers.gui import banner, bcolors, enter
 from ikabot.helpers.pedirInfo import read
 from ikabot.helpers.process import set_child_mode
@@ -170,7 +172,7 @@ def do_it(session, waiting_time, coords, radius, shallow, non_empty_islands):
     data = session.post(
         "action=WorldMap&function=getJSONArea&x_min=0&x_max=50&y_min=0&y_max=50"
     )
-    for x, val in json.loads(data)["data"].items():
+    for x, val in jsonCodec.loads(data)["data"].items():
         for y, val2 in val.items():
             shallow_islands.append(
                 {
@@ -189,7 +191,7 @@ def do_it(session, waiting_time, coords, radius, shallow, non_empty_islands):
     data = session.post(
         "action=WorldMap&function=getJSONArea&x_min=50&x_max=100&y_min=0&y_max=50"
     )
-    for x, val in json.loads(data)["data"].items():
+    for x, val in jsonCodec.loads(data)["data"].items():
         for y, val2 in val.items():
             shallow_islands.append(
                 {
@@ -208,7 +210,7 @@ def do_it(session, waiting_time, coords, radius, shallow, non_empty_islands):
     data = session.post(
         "action=WorldMap&function=getJSONArea&x_min=0&x_max=50&y_min=50&y_max=100"
     )
-    for x, val in json.loads(data)["data"].items():
+    for x, val in jsonCodec.loads(data)["data"].items():
         for y, val2 in val.items():
             shallow_islands.append(
                 {
@@ -227,7 +229,7 @@ def do_it(session, waiting_time, coords, radius, shallow, non_empty_islands):
     data = session.post(
         "action=WorldMap&function=getJSONArea&x_min=50&x_max=100&y_min=50&y_max=100"
     )
-    for x, val in json.loads(data)["data"].items():
+    for x, val in jsonCodec.loads(data)["data"].items():
         for y, val2 in val.items():
             shallow_islands.append(
                 {
@@ -305,48 +307,105 @@ def do_it(session, waiting_time, coords, radius, shallow, non_empty_islands):
     # scan each island
 
     all_island = sorted(all_island)
-    dump_islands(shared_data, all_island, waiting_time, session)
-    update_status("Got {} individual islands".format(len(all_island)), 100, 100, True)
-
     name_suffix = "_partial" if partial else ""
     dump_name = dump_name.replace(".json.gz", name_suffix) + ".json.gz"
+    # the islands are also written to a file as they arrive, so that an interrupted dump can be resumed
+    part_path = dump_path + dump_name.replace(".json.gz", ".part.jsonl")
+    Path(dump_path).mkdir(exist_ok=True, parents=True)
+    saveCheckpoint(
+        session,
+        "dumpWorld",
+        "ikabot.function.dumpWorld:resume_dump",
+        {
+            "world": {key: value for key, value in world.items() if key != "islands"},
+            "islands": all_island,
+            "waiting_time": waiting_time,
+            "dump_path": dump_path,
+            "dump_name": dump_name,
+            "part_path": part_path,
+        },
+        info="{} islands to {}".format(len(all_island), dump_path + dump_name),
+    )
+    dump_islands(shared_data, all_island, waiting_time, session, part_path)
+    update_status("Got {} individual islands".format(len(all_island)), 100, 100, True)
+
     update_status("Dumping data to {}".format(dump_path + dump_name), 100, 100, True)
     dump(shared_data[5], dump_path, dump_name)
+    os.remove(part_path)
+    deleteCheckpoint(session, "dumpWorld")
     return dump_path + dump_name
 
 
+def resume_dump(session, state):
+    """Resumes the dump checkpointed by ``do_it``, reusing the islands that were already written to the part file
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    state : dict
+    """
+    shared_data[2] = time.time()
+    world = state["world"]
+    world["islands"] = []
+    if os.path.exists(state["part_path"]):
+        with open(state["part_path"], "r") as part:
+            for line in part:
+                try:
+                    world["islands"].append(Island(jsonCodec.loads(line)))
+                except ValueError:
+                    # the task died while writing this line
+                    break
+    # written again without the line that may have been cut short
+    with open(state["part_path"], "w") as part:
+        for island in world["islands"]:
+            part.write(jsonCodec.dumps(island) + "\n")
+    shared_data.append(world)
+
+    done = {int(island["id"]) for island in world["islands"]}
+    remaining = [island for island in state["islands"] if island[0] not in done]
+    dump_islands(shared_data, remaining, state["waiting_time"], session, state["part_path"])
+    dump(world, state["dump_path"], state["dump_name"])
+    os.remove(state["part_path"])
+    deleteCheckpoint(session, "dumpWorld")
+    sendToBot(
+        session,
+        "World data has been dumped to {}".format(state["dump_path"] + state["dump_name"]),
+    )
+
+
 def dump(world, dump_path, dump_name):
     world["dump_end_date"] = time.time()
     p = Path(dump_path)
     p.mkdir(exist_ok=True, parents=True)
     with gzip.open(dump_path + dump_name, "wb") as file:
-        json_string = json.dumps(world).encode("utf-8")
-        file.write(json_string)
-
-
-def dump_islands(shared_data, all_island, waiting_time, session):
-    world_islands_number = len(all_island)
-    for island in all_island:
-        island_id = island[0]
-        island_coords = (island[1], island[2])
-        update_status(
-            "Getting island id: {}, x: {}, y: {}".format(
-                island_id, island_coords[0], island_coords[1]
-            ),
-            len(shared_data[5]["islands"]) / world_islands_number * 100,
-            5 + (len(shared_data[5]["islands"]) / world_islands_number * 95),
-        )
-        html = ""
-        try:
-            html = session.get("view=island&islandId=" + str(island_id))
-        except Exception:
-            # try again
-            html = session.get("view=island&islandId=" + str(island_id))
-        island = getIsland(html)
-        shared_data[4].acquire()
-        shared_data[5]["islands"].append(island)
-        shared_data[4].release()
-        time.sleep(waiting_time)
+        file.write(jsonCodec.dumpsBytes(world))
+
+
+def dump_islands(shared_data, all_island, waiting_time, session, part_path):
+    world_islands_number = len(shared_data[5]["islands"]) + len(all_island)
+    with open(part_path, "a") as part:
+        for island in all_island:
+            island_id = island[0]
+            island_coords = (island[1], island[2])
+            update_status(
+                "Getting island id: {}, x: {}, y: {}".format(
+                    island_id, island_coords[0], island_coords[1]
+                ),
+                len(shared_data[5]["islands"]) / world_islands_number * 100,
+                5 + (len(shared_data[5]["islands"]) / world_islands_number * 95),
+            )
+            html = ""
+            try:
+                html = session.get("view=island&islandId=" + str(island_id))
+            except Exception:
+                # try again
+                html = session.get("view=island&islandId=" + str(island_id))
+            island = getIsland(html)
+            part.write(jsonCodec.dumps(island) + "\n")
+            part.flush()
+            shared_data[4].acquire()
+            shared_data[5]["islands"].append(island)
+            shared_data[4].release()
+            time.sleep(waiting_time)
 
 
 def update_terminal(shared_data):
@@ -412,7 +471,12 @@ def view_dump(session, event):
     print("Loading dump...")
     selected_dump = files[choice]
     with gzip.open(selected_dump, "rb") as file:
-        selected_dump = json.load(file)
+        selected_dump = jsonCodec.loads(file.read())
+    if not selected_dump["shallow"]:
+        # replace the parsed dicts one by one, so the whole dump is never held twice
+        islands = selected_dump["islands"]
+        for i, island in enumerate(islands):
+            islands[i] = Island(island)
 
     while True:
         banner()
@@ -6,7 +6,7 @@ import re
 from decimal import *
 
 from ikabot.config import *
-from ikabot.helpers.getJson import getCity
+from ikabot.helpers.getJson import getCity, getHeaderSnapshot
 from ikabot.helpers.gui import *
 from ikabot.helpers.market import getGold
 from ikabot.helpers.naval import *
@@ -50,40 +50,26 @@ def getStatus(session, event, stdin_fd, predetermined_input):
         available_ships = 0
         total_ships = 0
         for id in ids:
-            session.get("view=city&cityId={}".format(id), noIndex=True)
-            data = session.get("view=updateGlobalData&ajax=1", noIndex=True)
-            json_data = json.loads(data, strict=False)
-            json_data = json_data[0][1]["headerData"]
-            if json_data["relatedCity"]["owncity"] != 1:
+            header = getHeaderSnapshot(session, id)
+            if not header["isOwnCity"]:
                 continue
-            wood = Decimal(json_data["resourceProduction"])
-            good = Decimal(json_data["tradegoodProduction"])
-            typeGood = int(json_data["producedTradegood"])
-            total_production[0] += wood * 3600
-            total_production[typeGood] += good * 3600
-            total_wine_consumption += json_data["wineSpendings"]
-            housing_space = int(json_data["currentResources"]["population"])
+            typeGood = header["producedTradegood"]
+            total_production[0] += header["woodProductionPerHour"]
+            total_production[typeGood] += header["tradegoodProductionPerHour"]
+            total_wine_consumption += header["wineConsumptionPerHour"]
+            housing_space = header["population"]
             city_population[id] = {
                 "housing_space": housing_space
             }
-            citizens = int(json_data["currentResources"]["citizens"])
+            citizens = header["citizens"]
             total_housing_space += housing_space
             total_citizens += citizens
-            total_resources[0] += json_data["currentResources"]["resource"]
-            total_resources[1] += json_data["currentResources"]["1"]
-            total_resources[2] += json_data["currentResources"]["2"]
-            total_resources[3] += json_data["currentResources"]["3"]
-            total_resources[4] += json_data["currentResources"]["4"]
-            available_ships = json_data["freeTransporters"]
-            total_ships = json_data["maxTransporters"]
-            total_gold = int(Decimal(json_data["gold"]))
-            total_gold_production = int(
-                Decimal(
-                    json_data["scientistsUpkeep"]
-                    + json_data["income"]
-                    + json_data["upkeep"]
-                )
-            )
+            for i in range(len(materials_names)):
+                total_resources[i] += header["availableResources"][i]
+            available_ships = header["freeTransporters"]
+            total_ships = header["maxTransporters"]
+            total_gold = int(header["gold"])
+            total_gold_production = int(header["goldProductionPerHour"])
         print("Ships {:d}/{:d}".format(int(available_ships), int(total_ships)))
         print("\nTotal:")
         print("{:>10}".format(" "), end="|")
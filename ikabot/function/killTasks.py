@@ -4,9 +4,16 @@ import datetime
 import sys
 
 from ikabot.config import *
+from ikabot.helpers.checkpoint import deleteTaskCheckpoints
 from ikabot.helpers.gui import *
 from ikabot.helpers.pedirInfo import enter, read
-from ikabot.helpers.process import run, updateProcessList
+from ikabot.helpers.process import (
+    run,
+    taskLabel,
+    taskUsage,
+    unregisterTask,
+    updateProcessList,
+)
 
 
 def killTasks(session, event, stdin_fd, predetermined_input):
@@ -37,21 +44,23 @@ def killTasks(session, event, stdin_fd, predetermined_input):
             for process in process_list:
                 if "date" in process:
                     print(
-                        "({}) {:<35}{:>20} {:>10}".format(
+                        "({}) {:<35}{:>20} {:>10}  {}".format(
                             process_list.index(process) + 1,
-                            process["action"],
+                            taskLabel(process),
                             datetime.datetime.fromtimestamp(process["date"]).strftime(
                                 "%b %d %H:%M:%S"
                             ),
-                            process["pid"]
+                            process["pid"],
+                            taskUsage(process),
                         )
                     )
                 else:
                     print(
-                        "({}) {:<35} {:>10}".format(
+                        "({}) {:<35} {:>10}  {}".format(
                             process_list.index(process) + 1,
-                            process["action"],
-                            process["pid"]
+                            taskLabel(process),
+                            process["pid"],
+                            taskUsage(process),
                         )
                     )
             choise = read(min=0, max=len(process_list), digit=True)
@@ -59,10 +68,30 @@ def killTasks(session, event, stdin_fd, predetermined_input):
                 event.set()
                 return
             else:
+                if process_list[choise - 1].get("job"):
+                    # threads can't be killed from outside, only the whole worker process can
+                    print(
+                        "This task runs inside the worker process, killing it will also kill these tasks:"
+                    )
+                    for process in process_list:
+                        if process["pid"] == process_list[choise - 1]["pid"]:
+                            print("    " + process["action"])
+                    print("Proceed? [y/N]")
+                    rta = read(values=["y", "Y", "n", "N", ""])
+                    if rta.lower() != "y":
+                        continue
                 if isWindows:
                     run("taskkill /F /PID {}".format(process_list[choise - 1]["pid"]))
                 else:
                     run("kill -9 {}".format(process_list[choise - 1]["pid"]))
+                killed = [
+                    process.get("job") or process["pid"]
+                    for process in process_list
+                    if process["pid"] == process_list[choise - 1]["pid"]
+                ]
+                unregisterTask(session, killed)
+                # a task killed on purpose should not be offered to be resumed
+                deleteTaskCheckpoints(session, killed)
     except KeyboardInterrupt:
         event.set()
         return
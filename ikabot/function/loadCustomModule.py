@@ -5,6 +5,7 @@ import os
 import traceback
 from ikabot.helpers.pedirInfo import read, enter
 from ikabot.helpers.gui import *
+from ikabot.helpers.process import renameTask
 from ikabot.config import *
 from importlib.machinery import SourceFileLoader
 
@@ -104,22 +105,14 @@ def loadCustomModule(session, event, stdin_fd, predetermined_input):
                 path = modules[choice - 3]
                 name = os.path.basename(path).replace('.py', '')
 
-                # Rewrite our entry in processList so ikabot's running-task
+                # Rename our entry in the process list so ikabot's running-task
                 # display (main menu, killTasks, web server) shows the actual
-                # module name instead of 'loadCustomModule'. The processList
-                # row was created by the menu launcher with action set to the
+                # module name instead of 'loadCustomModule'. The entry was
+                # created by the menu launcher with action set to the
                 # loader's __name__; replace it now that we know which module
                 # was picked.
                 try:
-                    sd = session.getSessionData()
-                    plist = sd.get('processList', [])
-                    my_pid = os.getpid()
-                    for p in plist:
-                        if p.get('pid') == my_pid:
-                            p['action'] = 'lcm_' + name
-                            break
-                    sd['processList'] = plist
-                    session.setSessionData(sd)
+                    renameTask(session, 'lcm_' + name)
                     if hasattr(session, 'write_status'):
                         session.write_status(f'Module: {name}')
 						
@@ -4,20 +4,21 @@
 import traceback
 import time
 import datetime
-import json
 import os
 import re
 
 from ikabot.config import *
 from ikabot.helpers.botComm import *
+from ikabot.helpers.checkpoint import deleteCheckpoint, saveCheckpoint
 from ikabot.helpers.getJson import getCity, getIsland
 from ikabot.helpers.gui import *
 from ikabot.helpers.pedirInfo import *
-from ikabot.helpers.planRoutes import executeRoutes
+from ikabot.helpers.planRoutes import executeRoutes, getMinimumWaitingTime
 from ikabot.helpers.process import set_child_mode
 from ikabot.helpers.signals import setInfoSignal
 from ikabot.helpers.naval import getAvailableShips, getAvailableFreighters
-from ikabot.helpers.varios import addThousandSeparator, getDateTime
+from ikabot.helpers.scheduler import sleepUntil
+from ikabot.helpers.varios import addThousandSeparator, getDateTime, wait
 
 
 def print_module_banner(page_title=None):
@@ -40,122 +41,6 @@ def print_module_banner(page_title=None):
     print("")
 
 
-def get_lock_file_path(session, use_freighters=False):
-    """
-    Get the path to the SHARED shipping lock file
-    Uses a standardized naming convention for ship locks that can be shared across ALL scripts
-    
-    Lock file format: .ikabot_shared_{ship_type}_{server}_{username}.lock
-    - merchant_ships: .ikabot_shared_merchant_ships_s1-en_PlayerOne.lock
-    - freighters: .ikabot_shared_freighters_s1-en_PlayerOne.lock
-    
-    Any script using ships should use this same naming convention to coordinate properly.
-    
-    Parameters
-    ----------
-    session : ikabot.web.session.Session
-    use_freighters : bool
-    
-    Returns
-    -------
-    lock_file_path : str
-    """
-    ship_type = "freighters" if use_freighters else "merchant_ships"
-    # Sanitize server and username to be filesystem-safe
-    safe_server = session.servidor.replace('/', '_').replace('\\', '_')
-    safe_username = session.username.replace('/', '_').replace('\\', '_')
-    # SHARED lock file format - recognized by all scripts
-    lock_filename = f".ikabot_shared_{ship_type}_{safe_server}_{safe_username}.lock"
-    return os.path.join(os.path.expanduser("~"), lock_filename)
-
-
-
-def acquire_shipping_lock(session, use_freighters=False, timeout=300):
-    """
-    Try to acquire shipping lock, wait up to timeout seconds
-    
-    Parameters
-    ----------
-    session : ikabot.web.session.Session
-    use_freighters : bool
-        If True, use freighter lock file, otherwise use merchant lock file
-    timeout : int
-        Maximum seconds to wait for lock
-    
-    Returns
-    -------
-    success : bool
-        True if lock acquired, False if timeout
-    """
-    lock_file = get_lock_file_path(session, use_freighters)
-    start_time = time.time()
-    
-    while time.time() - start_time < timeout:
-        try:
-            # Try to check if lock file exists
-            if not os.path.exists(lock_file):
-                # Create lock file
-                with open(lock_file, 'w') as f:
-                    lock_data = {
-                        'pid': os.getpid(),
-                        'timestamp': time.time(),
-                        'ship_type': 'freighters' if use_freighters else 'merchant_ships',
-                        'server': session.servidor,
-                        'username': session.username
-                    }
-                    json.dump(lock_data, f)
-                return True
-            else:
-                # Lock exists, check if it's stale (older than 10 minutes)
-                try:
-                    with open(lock_file, 'r') as f:
-                        lock_data = json.load(f)
-                        if time.time() - lock_data['timestamp'] > 600:
-                            # Stale lock, remove it
-                            os.remove(lock_file)
-                            continue
-                except:
-                    # Corrupted lock file, remove it
-                    try:
-                        os.remove(lock_file)
-                    except:
-                        pass
-                    continue
-        except Exception as e:
-            pass
-        
-        # Wait before trying again
-        time.sleep(5)
-    
-    return False  # Timeout
-
-
-def release_shipping_lock(session, use_freighters=False):
-    """
-    Release the shipping lock by deleting the lock file
-    
-    Parameters
-    ----------
-    session : ikabot.web.session.Session
-    use_freighters : bool
-        If True, release freighter lock, otherwise release merchant lock
-    """
-    lock_file = get_lock_file_path(session, use_freighters)
-    try:
-        if os.path.exists(lock_file):
-            # Verify this process owns the lock before removing
-            try:
-                with open(lock_file, 'r') as f:
-                    lock_data = json.load(f)
-                    if lock_data['pid'] == os.getpid():
-                        os.remove(lock_file)
-            except:
-                # If we can't read it, just try to remove it
-                os.remove(lock_file)
-    except Exception as e:
-        pass
-
-
 def readResourceAmount(resource_name):
     """
     Read a resource amount with automatic comma formatting display
@@ -724,6 +609,7 @@ def consolidateMode(session, event, stdin_fd, predetermined_input, telegram_enab
     except Exception as e:
         msg = "Error in:\n{}\nCause:\n{}".format(info, traceback.format_exc())
         sendToBot(session, msg)
+        session.failed = True
     finally:
         session.logout()
 
@@ -926,11 +812,12 @@ def distributeMode(session, event, stdin_fd, predetermined_input, telegram_enabl
     except Exception as e:
         msg = "Error in:\n{}\nCause:\n{}".format(info, traceback.format_exc())
         sendToBot(session, msg)
+        session.failed = True
     finally:
         session.logout()
 
 
-def do_it(session, origin_cities, destination_city, island, interval_hours, resource_config, useFreighters, send_mode, telegram_enabled, notify_on_start):
+def do_it(session, origin_cities, destination_city, island, interval_hours, resource_config, useFreighters, send_mode, telegram_enabled, notify_on_start, resume=None):
     """
     Parameters
     ----------
@@ -944,22 +831,57 @@ def do_it(session, origin_cities, destination_city, island, interval_hours, reso
     send_mode : int
     telegram_enabled : bool or None
     notify_on_start : bool
+    resume : dict
+        progress saved in the checkpoint of an interrupted run, see ``resume_do_it``
     """
     
     first_run = True
     next_run_time = datetime.datetime.now()
     total_shipments = 0
-    consecutive_failures = 0  # Track consecutive lock acquisition failures
+    done = 0  # origin cities already served in this cycle
+    if resume is not None:
+        first_run = resume["first_run"]
+        next_run_time = datetime.datetime.fromtimestamp(resume["next_run_time"])
+        total_shipments = resume["total_shipments"]
+        done = resume["done"]
+
+    def save():
+        saveCheckpoint(
+            session,
+            "resourceTransportManager",
+            "ikabot.function.resourceTransportManager:resume_do_it",
+            {
+                "origin_cities": [{"id": city["id"], "name": city["name"]} for city in origin_cities],
+                "destination_city": {"id": destination_city["id"], "name": destination_city["name"]},
+                "island": {"id": island["id"], "x": island["x"], "y": island["y"]},
+                "interval_hours": interval_hours,
+                "resource_config": resource_config,
+                "useFreighters": useFreighters,
+                "send_mode": send_mode,
+                "telegram_enabled": telegram_enabled,
+                "notify_on_start": notify_on_start,
+                "progress": {
+                    "first_run": first_run,
+                    "next_run_time": next_run_time.timestamp(),
+                    "total_shipments": total_shipments,
+                    "done": done,
+                },
+            },
+            info="{} -> {}".format(
+                ", ".join(city["name"] for city in origin_cities), destination_city["name"]
+            ),
+        )
     
     while True:
+        save()
         current_time = datetime.datetime.now()
         
         if current_time < next_run_time and not first_run:
-            time.sleep(60)
+            sleepUntil(next_run_time.timestamp())
             continue
         
-        # Send start notification if enabled
-        if notify_on_start:
+        # Send start notification if enabled, unless the cycle was interrupted halfway
+        if notify_on_start and done == 0:
             # Calculate total resources to be sent this cycle
             total_resources_this_cycle = [0] * len(materials_names)
             grand_total_this_cycle = 0
@@ -1005,7 +927,7 @@ def do_it(session, origin_cities, destination_city, island, interval_hours, reso
         destination_city = getCity(html)
         
         # Loop through each origin city
-        for origin_city in origin_cities:
+        for origin_city in origin_cities[done:]:
             # Get updated origin city data
             html = session.get(city_url + str(origin_city['id']))
             origin_city = getCity(html)
@@ -1067,85 +989,50 @@ def do_it(session, origin_cities, destination_city, island, interval_hours, reso
                             f"{origin_city['name']} -> {destination_city['name']} | Found {available_ships} {ship_type}, attempting to send..."
                         )
                     else:
-                        # No ships available, wait 2 minutes and check again
-                        wait_time = 120
+                        # No ships available, wait until the next of our fleets arrives instead of polling
+                        wait_time = getMinimumWaitingTime(session) or 120
                         elapsed = int(time.time() - ship_check_start)
                         session.setStatus(
                             f"{origin_city['name']} -> {destination_city['name']} | Waiting for {ship_type} (checked for {elapsed}s)..."
                         )
-                        time.sleep(wait_time)
-                
-                # Try to acquire shipping lock with retries
-                max_retries = 3
-                retry_count = 0
-                lock_acquired = False
+                        wait(wait_time)
                 
-                while retry_count < max_retries and not lock_acquired:
-                    session.setStatus(
-                        f"{origin_city['name']} -> {destination_city['name']} | Waiting for shipping lock (attempt {retry_count + 1}/{max_retries})..."
-                    )
-                    
-                    if acquire_shipping_lock(session, use_freighters=useFreighters, timeout=300):
-                        lock_acquired = True
-                    else:
-                        retry_count += 1
-                        if retry_count < max_retries and telegram_enabled:
-                            msg = f"Account: {session.username}\nFrom: {origin_city['name']}\nTo: [{island['x']}:{island['y']}] {destination_city['name']}\nProblem: Failed to acquire shipping lock on attempt {retry_count}/{max_retries}\nAction: Retrying in 1 minute..."
-                            sendToBot(session, msg)
-                        time.sleep(60)  # Wait 1 minute before retry
-            
-                if lock_acquired:
-                    try:
-                        route = (
-                            origin_city,
-                            destination_city,
-                            island["id"],
-                            *toSend,
-                        )
-                        
-                        session.setStatus(
-                            f"{origin_city['name']} -> {destination_city['name']} | Sending resources..."
-                        )
-                        
-                        executeRoutes(session, [route], useFreighters)
-                        total_shipments += 1
-                        
-                        # Reset consecutive failures on success
-                        consecutive_failures = 0
-                        
-                        # Calculate ships used
-                        ship_capacity, freighter_capacity = getShipCapacity(session)
-                        capacity = freighter_capacity if useFreighters else ship_capacity
-                        ships_used = (total_to_send + capacity - 1) // capacity  # Ceiling division
-                        ship_type_name = "freighters" if useFreighters else "merchant ships"
-                        
-                        # Create summary message
-                        resources_sent = []
-                        for i, amount in enumerate(toSend):
-                            if amount > 0:
-                                resources_sent.append(f"{addThousandSeparator(amount)} {materials_names[i]}")
-                        
-                        if telegram_enabled:
-                            msg = f"Account: {session.username}\nFrom: {origin_city['name']}\nTo: [{island['x']}:{island['y']}] {destination_city['name']}\nShips: {ships_used} {ship_type_name}\nSent: {', '.join(resources_sent)}"
-                            sendToBot(session, msg)
-                        
-                    finally:
-                        release_shipping_lock(session, use_freighters=useFreighters)
-                else:
-                    # Failed all retry attempts
-                    consecutive_failures += 1
-                    if telegram_enabled:
-                        msg = f"Account: {session.username}\nFrom: {origin_city['name']}\nTo: [{island['x']}:{island['y']}] {destination_city['name']}\nProblem: Could not acquire shipping lock\nAttempts: {max_retries}\nConsecutive failures: {consecutive_failures}\nAction: Skipping this cycle"
-                        sendToBot(session, msg)
-                    
-                    # Alert if too many consecutive failures
-                    if consecutive_failures >= 3 and telegram_enabled:
-                        alert_msg = f"⚠️ WARNING\nAccount: {session.username}\nFrom: {origin_city['name']}\nTo: [{island['x']}:{island['y']}] {destination_city['name']}\nProblem: {consecutive_failures} consecutive shipping failures\nPlease check for issues!"
-                        sendToBot(session, alert_msg)
+                route = (
+                    origin_city,
+                    destination_city,
+                    island["id"],
+                    *toSend,
+                )
+
+                session.setStatus(
+                    f"{origin_city['name']} -> {destination_city['name']} | Sending resources..."
+                )
+
+                executeRoutes(session, [route], useFreighters, resumable=False)
+                total_shipments += 1
+
+                # Calculate ships used
+                ship_capacity, freighter_capacity = getShipCapacity(session)
+                capacity = freighter_capacity if useFreighters else ship_capacity
+                ships_used = (total_to_send + capacity - 1) // capacity  # Ceiling division
+                ship_type_name = "freighters" if useFreighters else "merchant ships"
+
+                # Create summary message
+                resources_sent = []
+                for i, amount in enumerate(toSend):
+                    if amount > 0:
+                        resources_sent.append(f"{addThousandSeparator(amount)} {materials_names[i]}")
+
+                if telegram_enabled:
+                    msg = f"Account: {session.username}\nFrom: {origin_city['name']}\nTo: [{island['x']}:{island['y']}] {destination_city['name']}\nShips: {ships_used} {ship_type_name}\nSent: {', '.join(resources_sent)}"
+                    sendToBot(session, msg)
             else:
                 if telegram_enabled:
                     msg = f"Account: {session.username}\nFrom: {origin_city['name']}\nTo: [{island['x']}:{island['y']}] {destination_city['name']}\nStatus: No resources to send (all below thresholds or no space)"
                     sendToBot(session, msg)
+
+            done += 1
+            save()
         
         # End of origin cities loop
         
@@ -1153,10 +1040,12 @@ def do_it(session, origin_cities, destination_city, island, interval_hours, reso
         if interval_hours == 0:
             source_cities_names = ', '.join([city['name'] for city in origin_cities])
             session.setStatus(f"One-time shipment completed: {source_cities_names} -> {destination_city['name']}")
+            deleteCheckpoint(session, "resourceTransportManager")
             return
         
         # Schedule next run for recurring shipments
         next_run_time = datetime.datetime.now() + datetime.timedelta(hours=interval_hours)
+        done = 0
         
         # Create summary of all source cities for status
         source_cities_names = ', '.join([city['name'] for city in origin_cities])
@@ -1166,7 +1055,29 @@ def do_it(session, origin_cities, destination_city, island, interval_hours, reso
         )
         
         first_run = False
-        time.sleep(60 * 60)  # Sleep for 1 hour, then check if it's time
+        sleepUntil(next_run_time.timestamp())
+
+
+def resume_do_it(session, state):
+    """Resumes the shipments checkpointed by ``do_it``
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    state : dict
+    """
+    do_it(
+        session,
+        state["origin_cities"],
+        state["destination_city"],
+        state["island"],
+        state["interval_hours"],
+        state["resource_config"],
+        state["useFreighters"],
+        state["send_mode"],
+        state["telegram_enabled"],
+        state["notify_on_start"],
+        resume=state["progress"],
+    )
 
 
 def do_it_distribute(session, origin_city, destination_cities, interval_hours, resource_config, useFreighters, telegram_enabled, notify_on_start):
@@ -1188,13 +1099,12 @@ def do_it_distribute(session, origin_city, destination_cities, interval_hours, r
     first_run = True
     next_run_time = datetime.datetime.now()
     total_shipments = 0
-    consecutive_failures = 0
     
     while True:
         current_time = datetime.datetime.now()
         
         if current_time < next_run_time and not first_run:
-            time.sleep(60)
+            sleepUntil(next_run_time.timestamp())
             continue
         
         # Send start notification if enabled
@@ -1277,79 +1187,43 @@ def do_it_distribute(session, origin_city, destination_cities, interval_hours, r
                             f"{origin_city['name']} -> {destination_city['name']} | Found {available_ships} {ship_type}, attempting to send..."
                         )
                     else:
-                        wait_time = 120
+                        # No ships available, wait until the next of our fleets arrives instead of polling
+                        wait_time = getMinimumWaitingTime(session) or 120
                         elapsed = int(time.time() - ship_check_start)
                         session.setStatus(
                             f"{origin_city['name']} -> {destination_city['name']} | Waiting for {ship_type} (checked for {elapsed}s)..."
                         )
-                        time.sleep(wait_time)
-                
-                # Try to acquire shipping lock with retries
-                max_retries = 3
-                retry_count = 0
-                lock_acquired = False
+                        wait(wait_time)
                 
-                while retry_count < max_retries and not lock_acquired:
-                    session.setStatus(
-                        f"{origin_city['name']} -> {destination_city['name']} | Waiting for shipping lock (attempt {retry_count + 1}/{max_retries})..."
-                    )
-                    
-                    if acquire_shipping_lock(session, use_freighters=useFreighters, timeout=300):
-                        lock_acquired = True
-                    else:
-                        retry_count += 1
-                        if retry_count < max_retries and telegram_enabled:
-                            msg = f"Account: {session.username}\nFrom: {origin_city['name']}\nTo: [{dest_island['x']}:{dest_island['y']}] {destination_city['name']}\nProblem: Failed to acquire shipping lock on attempt {retry_count}/{max_retries}\nAction: Retrying in 1 minute..."
-                            sendToBot(session, msg)
-                        time.sleep(60)
-                
-                if lock_acquired:
-                    try:
-                        route = (
-                            origin_city,
-                            destination_city,
-                            dest_island["id"],
-                            *toSend,
-                        )
-                        
-                        session.setStatus(
-                            f"{origin_city['name']} -> {destination_city['name']} | Sending resources..."
-                        )
-                        
-                        executeRoutes(session, [route], useFreighters)
-                        total_shipments += 1
-                        
-                        # Reset consecutive failures on success
-                        consecutive_failures = 0
-                        
-                        # Calculate ships used
-                        ship_capacity, freighter_capacity = getShipCapacity(session)
-                        capacity = freighter_capacity if useFreighters else ship_capacity
-                        ships_used = (total_to_send + capacity - 1) // capacity  # Ceiling division
-                        ship_type_name = "freighters" if useFreighters else "merchant ships"
-                        
-                        # Create summary message
-                        resources_sent = []
-                        for i, amount in enumerate(toSend):
-                            if amount > 0:
-                                resources_sent.append(f"{addThousandSeparator(amount)} {materials_names[i]}")
-                        
-                        if telegram_enabled:
-                            msg = f"Account: {session.username}\nFrom: {origin_city['name']}\nTo: [{dest_island['x']}:{dest_island['y']}] {destination_city['name']}\nShips: {ships_used} {ship_type_name}\nSent: {', '.join(resources_sent)}"
-                            sendToBot(session, msg)
-                        
-                    finally:
-                        release_shipping_lock(session, use_freighters=useFreighters)
-                else:
-                    # Failed all retry attempts
-                    consecutive_failures += 1
-                    if telegram_enabled:
-                        msg = f"Account: {session.username}\nFrom: {origin_city['name']}\nTo: [{dest_island['x']}:{dest_island['y']}] {destination_city['name']}\nProblem: Could not acquire shipping lock\nAttempts: {max_retries}\nConsecutive failures: {consecutive_failures}\nAction: Skipping this destination"
-                        sendToBot(session, msg)
-                    
-                    if consecutive_failures >= 3 and telegram_enabled:
-                        alert_msg = f"⚠️ WARNING\nAccount: {session.username}\nFrom: {origin_city['name']}\nTo: [{dest_island['x']}:{dest_island['y']}] {destination_city['name']}\nProblem: {consecutive_failures} consecutive shipping failures\nPlease check for issues!"
-                        sendToBot(session, alert_msg)
+                route = (
+                    origin_city,
+                    destination_city,
+                    dest_island["id"],
+                    *toSend,
+                )
+
+                session.setStatus(
+                    f"{origin_city['name']} -> {destination_city['name']} | Sending resources..."
+                )
+
+                executeRoutes(session, [route], useFreighters, resumable=False)
+                total_shipments += 1
+
+                # Calculate ships used
+                ship_capacity, freighter_capacity = getShipCapacity(session)
+                capacity = freighter_capacity if useFreighters else ship_capacity
+                ships_used = (total_to_send + capacity - 1) // capacity  # Ceiling division
+                ship_type_name = "freighters" if useFreighters else "merchant ships"
+
+                # Create summary message
+                resources_sent = []
+                for i, amount in enumerate(toSend):
+                    if amount > 0:
+                        resources_sent.append(f"{addThousandSeparator(amount)} {materials_names[i]}")
+
+                if telegram_enabled:
+                    msg = f"Account: {session.username}\nFrom: {origin_city['name']}\nTo: [{dest_island['x']}:{dest_island['y']}] {destination_city['name']}\nShips: {ships_used} {ship_type_name}\nSent: {', '.join(resources_sent)}"
+                    sendToBot(session, msg)
             else:
                 if telegram_enabled:
                     msg = f"Account: {session.username}\nFrom: {origin_city['name']}\nTo: [{dest_island['x']}:{dest_island['y']}] {destination_city['name']}\nStatus: No resources to send (insufficient or no space)"
@@ -1372,5 +1246,5 @@ def do_it_distribute(session, origin_city, destination_cities, interval_hours, r
         )
         
         first_run = False
-        time.sleep(60 * 60)  # Sleep for 1 hour, then check if it's time
+        sleepUntil(next_run_time.timestamp())
 
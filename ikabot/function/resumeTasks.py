@@ -0,0 +1,87 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+import sys
+import traceback
+
+from ikabot.config import *
+from ikabot.helpers.botComm import *
+from ikabot.helpers.checkpoint import (
+    claimCheckpoint,
+    deleteCheckpoint,
+    getInterruptedCheckpoints,
+    resumeCheckpoint,
+)
+from ikabot.helpers.gui import *
+from ikabot.helpers.pedirInfo import read
+from ikabot.helpers.process import set_child_mode
+from ikabot.helpers.signals import setInfoSignal
+
+
+def resumeTasks(session, event, stdin_fd, predetermined_input):
+    """
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    event : multiprocessing.Event
+    stdin_fd: int
+    predetermined_input : multiprocessing.managers.SyncManager.list
+    """
+    sys.stdin = os.fdopen(stdin_fd)
+    config.predetermined_input = predetermined_input
+    try:
+        while True:
+            banner()
+            checkpoints = getInterruptedCheckpoints(session)
+            if len(checkpoints) == 0:
+                print("There are no interrupted tasks")
+                enter()
+                event.set()
+                return
+            print("Which task do you want to pick up?\n")
+            print("(0) Exit")
+            for i, checkpoint in enumerate(checkpoints):
+                print(
+                    "({}) {:<20}{:>17}  {}".format(
+                        i + 1,
+                        checkpoint["kind"],
+                        datetime.datetime.fromtimestamp(checkpoint["updated"]).strftime(
+                            "%b %d %H:%M:%S"
+                        ),
+                        checkpoint["info"],
+                    )
+                )
+            choice = read(min=0, max=len(checkpoints), digit=True)
+            if choice == 0:
+                event.set()
+                return
+            checkpoint = checkpoints[choice - 1]
+            print("(1) Resume it")
+            print("(2) Discard it")
+            action = read(min=1, max=2, digit=True)
+            if not claimCheckpoint(session, checkpoint):
+                print("The task has already been picked up by another process")
+                enter()
+                continue
+            if action == 2:
+                deleteCheckpoint(session, checkpoint["kind"])
+                continue
+            break
+    except KeyboardInterrupt:
+        event.set()
+        return
+
+    set_child_mode(session)
+    event.set()
+
+    info = "\nResumed {}: {}\n".format(checkpoint["kind"], checkpoint["info"])
+    setInfoSignal(session, info)
+    try:
+        resumeCheckpoint(session, checkpoint)
+    except Exception:
+        msg = "Error in:\n{}\nCause:\n{}".format(info, traceback.format_exc())
+        sendToBot(session, msg)
+        session.failed = True
+    finally:
+        session.logout()
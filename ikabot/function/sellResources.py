@@ -208,6 +208,7 @@ def sellToOffers(session, city_to_buy_from, resource_type, event):
     except Exception as e:
         msg = "Error in:\n{}\nCause:\n{}".format(info, traceback.format_exc())
         sendToBot(session, msg)
+        session.failed = True
     finally:
         session.logout()
 
@@ -282,6 +283,7 @@ def createOffer(session, my_offering_market_city, resource_type, event):
     except Exception as e:
         msg = "Error in:\n{}\nCause:\n{}".format(info, traceback.format_exc())
         sendToBot(session, msg)
+        session.failed = True
     finally:
         session.logout()
 
@@ -601,5 +601,6 @@ def _run_equilibrium_mode(session, event, stdin_fd, predetermined_input):
         traceback.print_exc()
         if notification_mode in (1, 2):
             sendToBot(session, msg)
+        session.failed = True
     finally:
         session.logout()
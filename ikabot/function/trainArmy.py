@@ -465,6 +465,7 @@ def trainArmy(session, event, stdin_fd, predetermined_input):
                     info, traceback.format_exc()
                 )
                 sendToBot(session, msg)
+                session.failed = True
             finally:
                 session.logout()
     except KeyboardInterrupt:
@@ -4,7 +4,6 @@
 import logging
 from ikabot.helpers.logging import getLogger
 import base64
-import json
 import pickle
 import re
 import socket
@@ -22,9 +21,18 @@ import requests
 from ikabot.config import *
 from ikabot.helpers.botComm import *
 from ikabot.helpers.getJson import *
+from ikabot.helpers import jsonCodec
 from ikabot.helpers.gui import *
 from ikabot.helpers.pedirInfo import *
-from ikabot.helpers.process import run, set_child_mode, updateProcessList
+from ikabot.helpers.checkpoint import deleteTaskCheckpoints
+from ikabot.helpers.process import (
+    run,
+    set_child_mode,
+    taskLabel,
+    taskUsage,
+    unregisterTask,
+    updateProcessList,
+)
 from ikabot.helpers.varios import wait
 
 
@@ -376,10 +384,28 @@ def webServer(session, event, stdin_fd, predetermined_input, port=None):
 def handleIkabotAPIRequest(session, request):
     if request.args["action"] == "killTask":
         try:
+            processes = [
+                process
+                for process in updateProcessList(session)
+                if str(process["pid"]) == request.args["pid"]
+            ]
+            workerJobs = [process for process in processes if process.get("job")]
+            if workerJobs:
+                # threads can't be killed from outside, only the whole worker process can, which needs the confirmation of the console menu
+                return mayorMessageResponse(
+                    ResponseTypes.FAILURE,
+                    "This task runs inside the worker process, killing it would also kill: {}. Use the kill tasks option of the console menu".format(
+                        ", ".join(taskLabel(process) for process in workerJobs)
+                    ),
+                )
             if isWindows:
                 run(f"taskkill /F /PID {request.args['pid']}")
             else:
                 run(f"kill -9 {request.args['pid']}")
+            killed = [process["pid"] for process in processes]
+            unregisterTask(session, killed)
+            # a task killed on purpose should not be offered to be resumed
+            deleteTaskCheckpoints(session, killed)
             return mayorMessageResponse(
                 ResponseTypes.SUCCESS, "Task successfully killed!"
             )
@@ -393,7 +419,7 @@ def mayorMessageResponse(type: ResponseTypes, message: str):
 
 def addSandbox(session, resp, req):
 
-    json_result = resp.json()
+    json_result = jsonCodec.loads(resp.content)
 
     html = json_result[1][1][1]
 
@@ -439,7 +465,7 @@ def addSandbox(session, resp, req):
     json_result[1][1][1] = html
 
     return sys.flask.Response(
-        json.dumps(json_result), 200, {"Content-Type": "text/html"}
+        jsonCodec.dumps(json_result), 200, {"Content-Type": "text/html; charset=utf-8"}
     )
 
 
@@ -451,6 +477,7 @@ def generateTableHTML(process_list):
                 <th>Task</th>
                 <th>Date</th>
                 <th>Status</th>
+                <th>Usage</th>
                 <th>Kill</th>
             </tr>
         """
@@ -461,9 +488,10 @@ def generateTableHTML(process_list):
             tr_string = '<tr class="alt">'
         table_html += f"{tr_string}\
             <td>{process['pid']}</td>\
-            <td>{process['action']}</td>\
+            <td>{taskLabel(process)}</td>\
             <td>{datetime.fromtimestamp(process['date']).strftime('%Y-%m-%d %H:%M:%S')}</td>\
             <td style=\"font-size:0.8em\">{process['status']}</td>\
+            <td style=\"font-size:0.8em\">{taskUsage(process)}</td>\
             <td><button class=\"button\" onclick=\"ajaxHandlerCall('?action=killTask&pid={process['pid']}&ikabot=1'); ajaxHandlerCall('?           view=ikabotSandbox&activeTab=tab_ikabotSandbox');\">Kill</button></td>\
             </tr>"
         i += 1
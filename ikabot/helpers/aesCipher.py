@@ -2,14 +2,17 @@
 # -*- coding: utf-8 -*-
 
 import base64
+import copy
 import hashlib
-import json
 import os
+import time
 
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 from ikabot.config import *
 from ikabot.helpers.botComm import *
+from ikabot.helpers.fileLock import lockFile, writeAtomically
+from ikabot.helpers import jsonCodec
 
 
 class AESCipher:
@@ -22,6 +25,8 @@ class AESCipher:
         ).digest()
         for i in range(0xFFF):
             self.key = hashlib.sha256(self.key).digest()
+        # (file fingerprint, entry key, parsed data) of the last entry decrypted by this process
+        self.cache = None
 
     def encrypt(self, plaintext):
         aesgcm = AESGCM(self.key)
@@ -57,18 +62,34 @@ class AESCipher:
         ----------
         session : ikabot.web.session.Session
         """
-        entry_key = self.getEntryKey(session)
-        with open(ikaFile, "r") as filehandler:
-            data = filehandler.read()
-
-        newFile = ""
-        for line in data.split("\n"):
-            if entry_key != line[:64]:
-                newFile += line + "\n"
+        self.__writeEntry(self.getEntryKey(session), None)
 
-        with open(ikaFile, "w") as filehandler:
-            filehandler.write(newFile.strip())
-            filehandler.flush()
+    def __writeEntry(self, entry_key, ciphertext):
+        """Replaces the line of the .ikabot file that belongs to ``entry_key``, leaving the lines of every other entry untouched. The file is rewritten atomically while holding the .ikabot lock
+        Parameters
+        ----------
+        entry_key : str
+        ciphertext : str
+            new encrypted data of the entry, or None to delete it
+        """
+        with lockFile(ikaFile):
+            with open(ikaFile, "r") as filehandler:
+                data = filehandler.read()
+
+            lines = []
+            written = ciphertext is None
+            for line in data.split("\n"):
+                if not line:
+                    continue
+                if entry_key != line[:64]:
+                    lines.append(line)
+                elif not written:
+                    lines.append(entry_key + " " + ciphertext)
+                    written = True
+            if not written:
+                lines.append(entry_key + " " + ciphertext)
+
+            writeAtomically(ikaFile, "\n".join(lines))
 
     def getSessionData(self, session, all=False):
         """
@@ -78,6 +99,14 @@ class AESCipher:
         all : bool
         """
         entry_key = self.getEntryKey(session)
+        fingerprint = self.__fileFingerprint()
+        if (
+            fingerprint is not None
+            and self.cache is not None
+            and self.cache[:2] == (fingerprint, entry_key)
+        ):
+            return self.__selectSessionData(session, self.cache[2], all)
+
         with open(ikaFile, "r") as filehandler:
             ciphertexts = filehandler.read()
 
@@ -99,23 +128,44 @@ class AESCipher:
                         os._exit(0)
                     self.deleteSessionData(session)
                     os._exit(0)
-                data_dict = json.loads(plaintext, strict=False)
-                if all:
-                    return data_dict
-                else:
-                    try:
-                        try:
-                            session_data = data_dict[session.username][session.mundo][
-                                session.servidor
-                            ]
-                        except Exception:
-                            session_data = {}
-                        session_data["shared"] = data_dict["shared"]
-                        return session_data
-                    except KeyError:
-                        return {}
+                data_dict = jsonCodec.loads(plaintext)
+                # a file modified within the last second could be rewritten again without its mtime changing, so it is not cached
+                if fingerprint is not None and time.time_ns() - fingerprint[0] > 10**9:
+                    self.cache = (fingerprint, entry_key, data_dict)
+                return self.__selectSessionData(session, data_dict, all)
         return {}
 
+    def __fileFingerprint(self):
+        """Returns a tuple that changes whenever the .ikabot file is written, or None if it can't be read"""
+        try:
+            stat = os.stat(ikaFile)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def __selectSessionData(self, session, data_dict, all):
+        """Returns a copy of the data of the session, so that callers can't modify the cached data
+        Parameters
+        ----------
+        session : ikabot.web.session.Session
+        data_dict : dict
+            the whole decrypted entry
+        all : bool
+        """
+        if all:
+            return copy.deepcopy(data_dict)
+        try:
+            try:
+                session_data = copy.deepcopy(
+                    data_dict[session.username][session.mundo][session.servidor]
+                )
+            except Exception:
+                session_data = {}
+            session_data["shared"] = copy.deepcopy(data_dict["shared"])
+            return session_data
+        except KeyError:
+            return {}
+
     def setSessionData(self, session, data, shared=False):
         """
         Parameters
@@ -123,39 +173,42 @@ class AESCipher:
         session : ikabot.web.session.Session
         data : dict
         """
-        session_data = self.getSessionData(session, True)
-
-        if shared:
-            if "shared" not in session_data:
-                session_data["shared"] = {}
-            if "logLevel" not in session_data["shared"]:
-                session_data["shared"]["logLevel"] = 2  # Warn by default
-            session_data["shared"] = {**session_data["shared"], **data}
-        else:
-            if session.username not in session_data:
-                session_data[session.username] = {}
-            if session.mundo not in session_data[session.username]:
-                session_data[session.username][session.mundo] = {}
-            if session.servidor not in session_data[session.username][session.mundo]:
-                session_data[session.username][session.mundo][session.servidor] = {}
-            if "shared" not in session_data:
-                session_data["shared"] = {}
-            session_data[session.username][session.mundo][session.servidor] = data
-
-        plaintext = json.dumps(session_data)
-        ciphertext = self.encrypt(plaintext)
-
-        with open(ikaFile, "r") as filehandler:
-            data = filehandler.read()
-
-        entry_key = self.getEntryKey(session)
-        newFile = ""
-        newline = entry_key + " " + ciphertext
-        for line in data.split("\n"):
-            if entry_key != line[:64]:
-                newFile += line + "\n"
-        newFile += newline + "\n"
-
-        with open(ikaFile, "w") as filehandler:
-            filehandler.write(newFile.strip())
-            filehandler.flush()
+        with lockFile(ikaFile):
+            session_data = self.getSessionData(session, True)
+
+            if shared:
+                if "shared" not in session_data:
+                    session_data["shared"] = {}
+                if "logLevel" not in session_data["shared"]:
+                    session_data["shared"]["logLevel"] = 2  # Warn by default
+                session_data["shared"] = {**session_data["shared"], **data}
+            else:
+                if session.username not in session_data:
+                    session_data[session.username] = {}
+                if session.mundo not in session_data[session.username]:
+                    session_data[session.username][session.mundo] = {}
+                if session.servidor not in session_data[session.username][session.mundo]:
+                    session_data[session.username][session.mundo][session.servidor] = {}
+                if "shared" not in session_data:
+                    session_data["shared"] = {}
+                session_data[session.username][session.mundo][session.servidor] = data
+
+            plaintext = jsonCodec.dumps(session_data)
+            ciphertext = self.encrypt(plaintext)
+            self.__writeEntry(self.getEntryKey(session), ciphertext)
+
+    def updateSessionData(self, session, function, shared=False):
+        """Reads the session data, lets ``function`` modify it and writes it back while holding the .ikabot lock, so no other process can write in between
+        Parameters
+        ----------
+        session : ikabot.web.session.Session
+        function : Callable[[dict], None]
+            function that receives the session data and modifies it in place
+        shared : bool
+        """
+        with lockFile(ikaFile):
+            session_data = self.getSessionData(session)
+            if shared:
+                session_data = session_data.get("shared", {})
+            function(session_data)
+            self.setSessionData(session, session_data, shared=shared)
@@ -14,6 +14,7 @@ import ikabot.config as config
 from ikabot.config import *
 from ikabot.helpers.gui import *
 from ikabot.helpers.pedirInfo import read
+from ikabot.helpers.varios import getTaskId
 
 
 def sendToBotDebug(session, msg, debugON):
@@ -53,7 +54,7 @@ def sendToBot(session, msg, Token=False, Photo=None):
     if Token is False:
         # A bit hacky, but fixes issue that config.infoUser isn't updated in new processes for sending TG messages.
         infoUser = "Server:{}, World:{}, Player:{}".format(session.servidor, session.word, session.username)
-        msg = "pid:{}\n{}\n{}".format(os.getpid(), infoUser, msg)
+        msg = "pid:{}\n{}\n{}".format(getTaskId(), infoUser, msg)
 
     sessionData = session.getSessionData()
     telegram_data = sessionData["shared"]["telegram"]
@@ -0,0 +1,189 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Opt-in session broker (``IKABOT_BROKER=1``). One broker process per menu owns the logged in session, and the tasks send it their ``Session.get`` and ``Session.post`` calls instead of talking to the game server themselves. The broker serves every task in a thread of its own, and the threads send their calls one at a time on that single session (see ``Session.get``), so the action request token, the cached response and the current city are never changed by two calls at once. When the session expires it is renewed once, with the other calls waiting for it, instead of every task logging in again on its own. Responses, connection pooling and the rate limit are shared as well.
+
+If the broker can't be reached, for example because it was killed, the task goes back to sending its requests directly.
+"""
+
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import time
+
+from ikabot.config import *
+from ikabot.helpers.logging import getLogger
+from ikabot.helpers.process import (
+    recordRequest,
+    set_child_mode,
+    startHeartbeat,
+    unregisterTask,
+    updateProcessList,
+)
+from ikabot.helpers.rateLimit import getRequestPriority, requestPriority
+
+logger = getLogger(__name__)
+
+# broker process started by this menu
+_broker = None
+# connection of each thread of the tasks to the broker
+_local = threading.local()
+
+
+class BrokerUnavailable(Exception):
+    """The broker can't be reached, the request has to be sent directly"""
+
+
+def startBroker(session):
+    """Starts the broker of this menu if it isn't running and makes ``session`` send its requests through it. Tasks started afterwards inherit the address of the broker with the session
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    """
+    global _broker
+    if _broker is not None and _broker.is_alive():
+        return
+    authkey = os.urandom(32)
+    connection, broker_connection = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=_brokerMain, args=(session, authkey, broker_connection), name="broker"
+    )
+    process.start()
+    broker_connection.close()
+    try:
+        address = connection.recv()
+    except EOFError:
+        logger.warning("The broker did not start, tasks will send their requests directly")
+        session.broker = None
+        return
+    finally:
+        connection.close()
+    session.broker = (address, authkey)
+    _broker = process
+
+
+def _connect(session):
+    connection = getattr(_local, "connection", None)
+    # connections can't be shared with forked children
+    if connection is not None and _local.pid == os.getpid():
+        return connection
+    address, authkey = session.broker
+    try:
+        connection = multiprocessing.connection.Client(address, authkey=authkey)
+    except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+        raise BrokerUnavailable(str(e))
+    _local.connection = connection
+    _local.pid = os.getpid()
+    return connection
+
+
+def brokerRequest(session, method, kwargs):
+    """Sends a request of the current task through the broker
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    method : str
+        "get" or "post"
+    kwargs : dict
+        arguments of ``Session.get`` or ``Session.post``
+
+    Returns
+    -------
+    result : str | requests.Response
+        what the method returned in the broker
+
+    Raises
+    ------
+    BrokerUnavailable
+        if the broker can't be reached. ``session.broker`` is cleared so that the following requests of the task are sent directly
+    """
+    start = time.time()
+    try:
+        connection = _connect(session)
+        connection.send((method, kwargs, getRequestPriority()))
+        status, result = connection.recv()
+    except (BrokerUnavailable, OSError, EOFError) as e:
+        logger.warning("The broker is not available, sending the requests directly: {}".format(e))
+        _local.connection = None
+        session.broker = None
+        raise BrokerUnavailable(str(e))
+    if status == "error":
+        raise result
+    # the broker accounts the requests it sends as its own, the task counts what it asked for
+    size = len(result) if isinstance(result, (str, bytes)) else len(result.content)
+    recordRequest(size, time.time() - start)
+    return result
+
+
+def _serve(session, connection, clients):
+    try:
+        while True:
+            try:
+                method, kwargs, priority = connection.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                with requestPriority(priority):
+                    reply = ("ok", getattr(session, method)(**kwargs))
+            except BaseException as e:
+                reply = ("error", e)
+            try:
+                connection.send(reply)
+            except (EOFError, OSError):
+                return
+            except Exception:
+                # the exception could not be pickled
+                connection.send(("error", Exception(repr(reply[1]))))
+    finally:
+        connection.close()
+        with clients["lock"]:
+            clients["count"] -= 1
+            clients["last"] = time.time()
+
+
+def _watch(session, clients):
+    parent = multiprocessing.parent_process()
+    while True:
+        time.sleep(broker_idle_timeout / 4)
+        with clients["lock"]:
+            idle = (
+                clients["count"] == 0
+                and time.time() - clients["last"] > broker_idle_timeout
+            )
+        # while the menu is open it may start more tasks that will use the broker
+        if idle and (parent is None or not parent.is_alive()):
+            unregisterTask(session)
+            os._exit(0)
+
+
+def _brokerMain(session, authkey, connection):
+    set_child_mode(session)
+    session.broker = None
+    startHeartbeat(session)
+    updateProcessList(
+        session,
+        programprocesslist=[
+            {
+                "pid": os.getpid(),
+                "action": "broker",
+                "date": time.time(),
+                "status": "serving requests",
+            }
+        ],
+    )
+    listener = multiprocessing.connection.Listener(authkey=authkey)
+    connection.send(listener.address)
+    connection.close()
+    clients = {"lock": threading.Lock(), "count": 0, "last": time.time()}
+    threading.Thread(target=_watch, args=(session, clients), daemon=True).start()
+    while True:
+        try:
+            client = listener.accept()
+        except (OSError, EOFError, multiprocessing.AuthenticationError):
+            continue
+        with clients["lock"]:
+            clients["count"] += 1
+        threading.Thread(
+            target=_serve, args=(session, client, clients), daemon=True
+        ).start()
@@ -0,0 +1,143 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Checkpoints of long running tasks. A task saves the work it still has to do after every step, keyed by its task id, so that if its process dies (a crash, a reboot of the host...) the pending work can be picked up again from the "Resume interrupted tasks" menu instead of starting over. Each checkpoint names the function that resumes it, which receives the session and the saved state.
+"""
+
+import importlib
+import time
+
+import psutil
+
+from ikabot.helpers import jsonCodec
+from ikabot.helpers.database import getAccountKey, getConnection
+from ikabot.helpers.process import updateProcessList
+from ikabot.helpers.varios import getTaskId
+
+
+def saveCheckpoint(session, kind, resume, state, info=""):
+    """Stores the state of the current task, replacing the previous checkpoint of the same kind
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    kind : str
+        what is being checkpointed, a task can hold one checkpoint of each kind
+    resume : str
+        "module:function" of the function that resumes the work, it is called with the session and ``state``
+    state : Any
+        json serializable state needed to resume the work
+    info : str
+        description shown to the user when choosing which checkpoint to resume
+    """
+    getConnection().execute(
+        "INSERT OR REPLACE INTO checkpoints (account, task, kind, resume, info, state, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            getAccountKey(session),
+            getTaskId(),
+            kind,
+            resume,
+            info,
+            jsonCodec.dumps(state),
+            time.time(),
+        ),
+    )
+
+
+def deleteCheckpoint(session, kind):
+    """Forgets the checkpoint of the current task, once its work is done
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    kind : str
+    """
+    getConnection().execute(
+        "DELETE FROM checkpoints WHERE account = ? AND task = ? AND kind = ?",
+        (getAccountKey(session), getTaskId(), kind),
+    )
+
+
+def deleteTaskCheckpoints(session, task_ids):
+    """Forgets every checkpoint of the given tasks, for example when they are killed on purpose
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    task_ids : list[int]
+    """
+    account = getAccountKey(session)
+    getConnection().executemany(
+        "DELETE FROM checkpoints WHERE account = ? AND task = ?",
+        [(account, task_id) for task_id in task_ids],
+    )
+
+
+def getInterruptedCheckpoints(session):
+    """
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+
+    Returns
+    -------
+    checkpoints : list[dict]
+        checkpoints of the account whose task is no longer running, oldest first. Each one has the keys 'task', 'kind', 'resume', 'info', 'state' and 'updated'
+    """
+    started = {
+        process.get("job") or process["pid"]: process["date"]
+        for process in updateProcessList(session)
+    }
+    started.setdefault(getTaskId(), psutil.Process().create_time())
+    rows = getConnection().execute(
+        "SELECT task, kind, resume, info, state, updated FROM checkpoints WHERE account = ? ORDER BY updated",
+        (getAccountKey(session),),
+    )
+    return [
+        {
+            "task": task,
+            "kind": kind,
+            "resume": resume,
+            "info": info,
+            "state": jsonCodec.loads(state),
+            "updated": updated,
+        }
+        for task, kind, resume, info, state, updated in rows
+        # task ids are pids, which are reused after a reboot. A task saves its checkpoints after it starts, so one saved before is from another task that had the same pid
+        if task not in started or started[task] > updated
+    ]
+
+
+def claimCheckpoint(session, checkpoint):
+    """Makes the current task the owner of an interrupted checkpoint. Only one task can claim each checkpoint, even if several try at the same time
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    checkpoint : dict
+        one of the checkpoints returned by ``getInterruptedCheckpoints``
+
+    Returns
+    -------
+    claimed : bool
+        False if another task claimed it first
+    """
+    cursor = getConnection().execute(
+        "UPDATE OR REPLACE checkpoints SET task = ?, updated = ? WHERE account = ? AND task = ? AND kind = ?",
+        (
+            getTaskId(),
+            time.time(),
+            getAccountKey(session),
+            checkpoint["task"],
+            checkpoint["kind"],
+        ),
+    )
+    return cursor.rowcount == 1
+
+
+def resumeCheckpoint(session, checkpoint):
+    """Runs the function that resumes a claimed checkpoint
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    checkpoint : dict
+    """
+    module, name = checkpoint["resume"].split(":")
+    function = getattr(importlib.import_module(module), name)
+    function(session, checkpoint["state"])
@@ -0,0 +1,104 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import sqlite3
+import threading
+
+from ikabot.config import *
+
+# Tables of the local state database. It only holds data that is cheap to lose and is not secret (task status, counters...), credentials and cookies stay in the encrypted .ikabot file
+schema = [
+    """CREATE TABLE IF NOT EXISTS processes (
+        account TEXT NOT NULL,
+        task INTEGER NOT NULL,
+        pid INTEGER,
+        job INTEGER,
+        action TEXT,
+        name TEXT,
+        date REAL,
+        restarts INTEGER,
+        status TEXT,
+        heartbeat REAL NOT NULL,
+        requests INTEGER,
+        received INTEGER,
+        latency REAL,
+        cpu REAL,
+        rss INTEGER,
+        PRIMARY KEY (account, task)
+    )""",
+    "CREATE INDEX IF NOT EXISTS processes_pid ON processes (pid)",
+    """CREATE TABLE IF NOT EXISTS request_buckets (
+        account TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS travel_parameters (
+        account TEXT NOT NULL,
+        city TEXT NOT NULL,
+        parameters TEXT NOT NULL,
+        port INTEGER,
+        updated REAL NOT NULL,
+        PRIMARY KEY (account, city)
+    )""",
+    """CREATE TABLE IF NOT EXISTS ship_reservations (
+        account TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        task INTEGER NOT NULL,
+        ships INTEGER NOT NULL,
+        expires REAL NOT NULL,
+        PRIMARY KEY (account, kind, task)
+    )""",
+    """CREATE TABLE IF NOT EXISTS checkpoints (
+        account TEXT NOT NULL,
+        task INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        resume TEXT NOT NULL,
+        info TEXT,
+        state TEXT NOT NULL,
+        updated REAL NOT NULL,
+        PRIMARY KEY (account, task, kind)
+    )""",
+]
+
+_local = threading.local()
+
+
+def getConnection():
+    """Returns a connection to the local state database, shared by all ikabot processes. Every thread of every process gets its own connection
+    Returns
+    -------
+    connection : sqlite3.Connection
+    """
+    connection = getattr(_local, "connection", None)
+    # connections can't be shared with forked children
+    if connection is not None and _local.pid == os.getpid():
+        return connection
+    connection = sqlite3.connect(ikaDatabaseFile, timeout=30, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    for statement in schema:
+        connection.execute(statement)
+    if not isWindows:
+        os.chmod(ikaDatabaseFile, 0o600)
+    _local.connection = connection
+    _local.pid = os.getpid()
+    return connection
+
+
+def getAccountKey(session):
+    """Returns a key that identifies the game account of the session in the local state database without storing the mail or the player name in clear
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+
+    Returns
+    -------
+    account key : str
+    """
+    return hashlib.sha256(
+        "{}\x00{}\x00{}\x00{}".format(
+            session.mail, session.username, session.mundo, session.servidor
+        ).encode("utf-8")
+    ).hexdigest()
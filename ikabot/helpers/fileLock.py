@@ -0,0 +1,110 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from ikabot.config import isWindows
+
+if isWindows:
+    import msvcrt
+else:
+    import fcntl
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _acquire(fd):
+    if isWindows:
+        os.lseek(fd, 0, os.SEEK_SET)
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK gives up after 10 seconds, keep waiting
+                continue
+    else:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+
+def _release(fd):
+    if isWindows:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+@contextmanager
+def lockFile(path):
+    """Context manager that holds an exclusive lock shared by all ikabot processes on ``path``. The lock is taken on a separate ``path + '.lock'`` file so that ``path`` itself can be replaced while locked. It is reentrant within the same thread
+    Parameters
+    ----------
+    path : str
+        path of the file to protect
+    """
+    path = os.path.abspath(path)
+    with _locks_guard:
+        state = _locks.setdefault(
+            path, {"lock": threading.RLock(), "depth": 0, "fd": None}
+        )
+    with state["lock"]:
+        if state["depth"] == 0:
+            fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                _acquire(fd)
+            except BaseException:
+                os.close(fd)
+                raise
+            state["fd"] = fd
+        state["depth"] += 1
+        try:
+            yield
+        finally:
+            state["depth"] -= 1
+            if state["depth"] == 0:
+                fd = state["fd"]
+                state["fd"] = None
+                try:
+                    _release(fd)
+                finally:
+                    os.close(fd)
+
+
+def writeAtomically(path, text):
+    """Writes ``text`` to a temporary file and renames it over ``path``, so readers see either the old or the new content but never a partially written file
+    Parameters
+    ----------
+    path : str
+        path of the file to write
+    text : str
+        new content of the file
+    """
+    path = os.path.abspath(path)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w") as filehandler:
+            filehandler.write(text)
+            filehandler.flush()
+            os.fsync(filehandler.fileno())
+        os.chmod(tmp_path, 0o600)
+        for attempt in range(10):
+            try:
+                os.replace(tmp_path, path)
+                return
+            except PermissionError:
+                # on windows the file can't be replaced while another process has it open
+                if not isWindows or attempt == 9:
+                    raise
+                time.sleep(0.1)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
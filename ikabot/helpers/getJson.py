@@ -1,14 +1,17 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import json
 import re
 import time
+from decimal import Decimal
 from math import ceil, floor
 from ikabot.helpers.resources import *
+from ikabot.helpers import jsonCodec
+from ikabot.helpers.models import FullCity, Island, WorldMapIsland
 from ikabot.helpers.varios import decodeUnicodeEscape
 from ikabot.config import *
 from typing import Dict, TypedDict, Optional, Any
+# The TypedDicts below document the keys of the parsed objects, which are stored in the slotted classes of models.py
 # TODO replace Optional with NotRequried when we drop support for python 3.9 and 3.10. NotRequired is more precise here than Optional
 LinkDict = TypedDict("LinkDict", {"onclick": str, "href": str, "tooltip": str})
 
@@ -222,6 +225,50 @@ WorldMapIslandDict = TypedDict(
     },
 )
 
+HeaderSnapshotDict = TypedDict(
+    "HeaderSnapshotDict",
+    {
+        "isOwnCity": bool,
+        "availableResources": list[int],
+        "storageCapacity": Optional[int],
+        "citizens": int,
+        "population": int,
+        "woodProductionPerHour": Decimal,
+        "tradegoodProductionPerHour": Decimal,
+        "producedTradegood": int,
+        "wineConsumptionPerHour": int,
+        "freeTransporters": int,
+        "maxTransporters": int,
+        "freeFreighters": Optional[int],
+        "maxFreighters": Optional[int],
+        "gold": Decimal,
+        "goldProductionPerHour": Decimal,
+    },
+)
+
+TransportParametersDict = TypedDict(
+    "TransportParametersDict",
+    {
+        "transporterSpeed": float,
+        "worldBonus": float,
+        "governmentBonus": float,
+        "poseidonEffect": float,
+        "marineChartArchiveBonus": float,
+        "minimumJourneyDuration": int,
+        "distance": float,
+        "fleetJourneyTime": int,
+        "queueTime": int,
+        "loadingSpeed": float,
+    },
+)
+
+# compiled once, these are searched in every city page that is parsed
+_FREE_CITIZENS = re.compile(r'js_GlobalMenu_citizens">(.*?)</span>')
+_NON_DIGITS = re.compile(r"\D")
+_RESOURCES_LISTED_FOR_SALE = re.compile(
+    r'branchOfficeResources: JSON\.parse\(\'{\\"resource\\":\\"(\d+)\\",\\"1\\":\\"(\d+)\\",\\"2\\":\\"(\d+)\\",\\"3\\":\\"(\d+)\\",\\"4\\":\\"(\d+)\\"}\'\)'
+)
+
 
 def getFreeCitizens(html: str) -> int:
     """This function is used in the ``getCity`` function to determine the amount of free (idle) citizens in the given city.
@@ -235,8 +282,8 @@ def getFreeCitizens(html: str) -> int:
     freeCitizens : int
         an integer representing the amount of free citizens in the given city.
     """
-    freeCitizens = re.search(r'js_GlobalMenu_citizens">(.*?)</span>', html).group(1)
-    freeCitizens = re.sub(r'\D', '', freeCitizens)
+    freeCitizens = _FREE_CITIZENS.search(html).group(1)
+    freeCitizens = _NON_DIGITS.sub('', freeCitizens)
     return int(freeCitizens)
 
 
@@ -252,10 +299,7 @@ def getResourcesListedForSale(html: str) -> list[int]:
     onSale : list[int]
         a list containing 5 integers each of which representing the amount of that particular resource which is on sale in the given city. For more information about the order of the resources, refer to ``config.py``
     """
-    rta = re.search(
-        r'branchOfficeResources: JSON\.parse\(\'{\\"resource\\":\\"(\d+)\\",\\"1\\":\\"(\d+)\\",\\"2\\":\\"(\d+)\\",\\"3\\":\\"(\d+)\\",\\"4\\":\\"(\d+)\\"}\'\)',
-        html,
-    )
+    rta = _RESOURCES_LISTED_FOR_SALE.search(html)
     if rta:
         return [
             int(rta.group(1)),
@@ -267,7 +311,7 @@ def getResourcesListedForSale(html: str) -> list[int]:
     else:
         return [0, 0, 0, 0, 0]
 
-def getWorldMapIslands(html: str) -> list[WorldMapIslandDict]:
+def getWorldMapIslands(html: str) -> list[WorldMapIsland]:
     """This function uses the html passed to it as a string to extract, parse and return a list of WorldMapIsland objects
     Parameters
     ----------
@@ -277,17 +321,17 @@ def getWorldMapIslands(html: str) -> list[WorldMapIslandDict]:
     Returns
     -------
     islands : list[WorldMapIsland]
-        this function returns a json parsed list of WorldMapIsland objects.
+        this function returns a json parsed list of WorldMapIsland objects. ``resourceName`` and ``miracleName`` are computed from ``resourceType`` and ``miracleType``.
     """
 
     isla = re.search(r"jsonData = '([\S\s]*?)'", html).group(1) if '!DOCTYPE html' in html else html
 
     worldMapIslands = []
 
-    data = json.loads(isla)['data']
+    data = jsonCodec.loads(isla)['data']
     for x in data:
         for y in data[x]:
-            worldMapIslands.append({
+            worldMapIslands.append(WorldMapIsland({
                 'x': int(x),
                 'y': int(y),
                 'id': int(data[x][y][0]),
@@ -302,9 +346,7 @@ def getWorldMapIslands(html: str) -> list[WorldMapIslandDict]:
                 'heliosTower': bool(int(data[x][y][9])),
                 'red': bool(int(data[x][y][10])),
                 'blue': bool(int(data[x][y][11])),
-                'resourceName': materials_names_english[int(data[x][y][2])],
-                'miracleName': miracle_names_english[int(data[x][y][3])]
-            })
+            }))
 
     return worldMapIslands
 # [
@@ -322,7 +364,7 @@ def getWorldMapIslands(html: str) -> list[WorldMapIslandDict]:
 # "0"           // blue 11
 # ]
 
-def getIsland(html: str) -> IslandDict:
+def getIsland(html: str) -> Island:
     """This function uses the html passed to it as a string to extract, parse and return an Island object
     Parameters
     ----------
@@ -332,26 +374,13 @@ def getIsland(html: str) -> IslandDict:
     Returns
     -------
     island : Island
-        this function returns a json parsed Island object.
+        this function returns a json parsed Island object. The aliases kept for backwards compatibility with old code (``x``, ``y``, ``tipo`` and the ``Id``, ``Name``, ``AllyId``, ``AllyTag`` and ``_type`` keys of the cities) are computed on access, see ``models.py``.
     """
     isla = re.search(r'ajax.Responder, (\[\[[\S\s]*?\]\])\)\;', html).group(1)
 
-    island: IslandDict = json.loads(isla)[1][1]
-
-    # Must add aliases for different properties to maintain backwards compatibility with old code
-
-    island["x"] = int(island["xCoord"])
-    island["y"] = int(island["yCoord"])
-    island["tipo"] = str(island["tradegood"])
+    island = Island(jsonCodec.loads(isla)[1][1])
 
     for city in island["cities"]:
-        for key in ["Id", "Name", "AllyId", "AllyTag"]:
-            if ('owner'+key) in city:
-                city[key] = city['owner'+key]
-        
-        if "buildplace_type" in city:
-            city["_type"] = city["buildplace_type"]
-        
         if city["type"] == 'buildplace':
             city["type"] = 'empty'
 
@@ -373,7 +402,7 @@ def getIsland(html: str) -> IslandDict:
     # return isla
 
 
-def getCity(html: str) -> FullCityDict:
+def getCity(html: str) -> FullCity:
     """This function uses the ``html`` passed to it as a string to extract, parse and return a City object
     Parameters
     ----------
@@ -382,20 +411,19 @@ def getCity(html: str) -> FullCityDict:
 
     Returns
     -------
-    city : dict
+    city : FullCity
         this function returns a json parsed City object. For more information about this object refer to the github wiki page of Ikabot.
     """
 
-    city = re.search(
-        r'"updateBackgroundData",\s?([\s\S]*?)\],\["updateTemplateData"', html
-    ).group(1)
-    city = json.loads(city, strict=False)
+    # plain string searches are much faster than a lazy regex spanning the whole block
+    start = html.find('"updateBackgroundData",')
+    end = html.find('],["updateTemplateData"', start) if start != -1 else -1
+    if end == -1:
+        raise AttributeError("The city data was not found in the page")
+    city = FullCity(jsonCodec.loads(html[start + len('"updateBackgroundData",') : end]))
 
-    city["ownerId"] = city.pop("ownerId")
+    # x, y and cityName are computed from islandXCoord, islandYCoord and name
     city["ownerName"] = decodeUnicodeEscape(city["ownerName"])
-    city["x"] = int(city["islandXCoord"])
-    city["y"] = int(city["islandYCoord"])
-    city["cityName"] = decodeUnicodeEscape(city["name"])
     city["name"] = decodeUnicodeEscape(city["name"])
 
     i = 0
@@ -460,33 +488,156 @@ def getTransportLoadingAndTravelTime(html: str, totalResources = 0, useFreighter
     assert capacityPerTransportPercent in [100, 80, 60, 40, 20], 'Please enter valid capacityPerTransportPercent, available values are 100, 80, 60, 40, 20'
     assert tritonBoostPercent in [0, 100, 200, 300], 'Please enter valid tritonBoostPercent, available values are 0, 100, 200, 300'
     
-    # get relevant bonuses and parmeters from response
-    transporterSpeed = float(re.search(r"'transporterSpeed': ([\d\.]+),", html).group(1))
-    worldBonus = float(re.search(r"'worldBonus': ([\d\.]+),", html).group(1))
-    governmentBonus = float(re.search(r"'governmentBonus': ([\d\.]+),", html).group(1))
-    poseidonEffect = float(re.search(r"'poseidonEffect': ([\d\.]+),", html).group(1))
-    marineChartArchiveBonus = float(re.search(r"'marineChartArchiveBonus': ([\d\.]+),", html).group(1))
-    minimumJourneyDuration = int(re.search(r"'minimumJourneyDuration': (\d+),", html).group(1))
-    distance = float(re.search(r"'distance': ([\d\.]+),", html).group(1))
-    fleetJourneyTime = int(re.search(r"'fleetJourneyTime': (\d+),", html).group(1))
-    queueTime = int(re.search(r"'queueTime': (\d+),", html).group(1))
-    loadingSpeed = float(re.search(r"'loadingSpeed': ([\d\.]+),", html).group(1))
-    
+    parameters = getTransportParameters(html)
+    return getTransportTime(parameters, parameters["distance"], totalResources, useFreighters, capacityPerTransportPercent, tritonBoostPercent)
+
+def getTransportParameters(html: str) -> TransportParametersDict:
+    """This function parses the parameters of the `transport` view that travel and loading times depend on
+    Parameters
+    ----------
+    html : str
+        text of the response obtained when requesting the `transport` view from the trading port
+
+    Returns
+    -------
+    parameters : TransportParametersDict
+        bonuses of the origin city, distance to the destination and the time at which the port will be free
+    """
+    return {
+        "transporterSpeed": float(re.search(r"'transporterSpeed': ([\d\.]+),", html).group(1)),
+        "worldBonus": float(re.search(r"'worldBonus': ([\d\.]+),", html).group(1)),
+        "governmentBonus": float(re.search(r"'governmentBonus': ([\d\.]+),", html).group(1)),
+        "poseidonEffect": float(re.search(r"'poseidonEffect': ([\d\.]+),", html).group(1)),
+        "marineChartArchiveBonus": float(re.search(r"'marineChartArchiveBonus': ([\d\.]+),", html).group(1)),
+        "minimumJourneyDuration": int(re.search(r"'minimumJourneyDuration': (\d+),", html).group(1)),
+        "distance": float(re.search(r"'distance': ([\d\.]+),", html).group(1)),
+        "fleetJourneyTime": int(re.search(r"'fleetJourneyTime': (\d+),", html).group(1)),
+        "queueTime": int(re.search(r"'queueTime': (\d+),", html).group(1)),
+        "loadingSpeed": float(re.search(r"'loadingSpeed': ([\d\.]+),", html).group(1)),
+    }
+
+def getTransportTime(parameters: TransportParametersDict, distance: float, totalResources = 0, useFreighters = False, capacityPerTransportPercent = 100, tritonBoostPercent = 0) -> tuple[int, int, int, int]:
+    """Gets total loading and travel time for a shipment from already parsed parameters, see ``getTransportLoadingAndTravelTime``
+    Parameters
+    ----------
+    parameters : TransportParametersDict
+        parameters of the origin city, as ``getTransportParameters`` returns them. Its 'distance' is not used
+    distance : float
+        distance to the destination
+    totalResources : int
+    useFreighters : bool
+    capacityPerTransportPercent : int
+    tritonBoostPercent : int
+
+    Returns
+    -------
+    totalTime : int
+    loadingTime : int
+    travelTime : int
+    queueTime : int
+    """
     # make sure queue time is not in the past
+    queueTime = parameters["queueTime"]
     queueTime = 0 if queueTime - time.time() <= 0 else int(queueTime - time.time())
     
     # calculate loading time
-    loadingTime = int(totalResources / loadingSpeed)
+    loadingTime = int(totalResources / parameters["loadingSpeed"])
 
     # calculate travel time            # lower capacity actually speeds up the transporter speed instead of lowering total travel time, this is stupid
-    fleetSpeed = floor(transporterSpeed *  (1.0 + (-0.835 * capacityPerTransportPercent + 83.5) / 100 ) ) * worldBonus * governmentBonus * (1.0 + poseidonEffect + tritonBoostPercent / 100)
-    uncappedDuration = int(ceil(((distance * fleetJourneyTime) / fleetSpeed) * marineChartArchiveBonus))
+    fleetSpeed = floor(parameters["transporterSpeed"] *  (1.0 + (-0.835 * capacityPerTransportPercent + 83.5) / 100 ) ) * parameters["worldBonus"] * parameters["governmentBonus"] * (1.0 + parameters["poseidonEffect"] + tritonBoostPercent / 100)
+    uncappedDuration = int(ceil(((distance * parameters["fleetJourneyTime"]) / fleetSpeed) * parameters["marineChartArchiveBonus"]))
     uncappedDuration *= 20 if useFreighters else 1
 
-    travelTime = uncappedDuration if uncappedDuration > minimumJourneyDuration else minimumJourneyDuration
+    travelTime = uncappedDuration if uncappedDuration > parameters["minimumJourneyDuration"] else parameters["minimumJourneyDuration"]
 
     return  travelTime + loadingTime + queueTime, loadingTime, travelTime, queueTime
 
+def getHeaderData(data: str) -> HeaderSnapshotDict:
+    """This function parses the ``headerData`` of an ``updateGlobalData`` ajax response, which holds everything that is displayed in the header of the game (resources, production, ships and gold)
+    Parameters
+    ----------
+    data : str
+        the json returned when a get request is made to the ``view=updateGlobalData&ajax=1`` endpoint
+
+    Returns
+    -------
+    snapshot : HeaderSnapshotDict
+        the header data of the current city
+    """
+    header = jsonCodec.loads(data)[0][1]["headerData"]
+    resources = header["currentResources"]
+    max_resources = header.get("maxResources")
+    return {
+        "isOwnCity": header["relatedCity"]["owncity"] == 1,
+        "availableResources": [
+            int(resources["resource"]),
+            int(resources["1"]),
+            int(resources["2"]),
+            int(resources["3"]),
+            int(resources["4"]),
+        ],
+        "storageCapacity": int(max_resources["resource"]) if isinstance(max_resources, dict) else None,
+        "citizens": int(resources["citizens"]),
+        "population": int(resources["population"]),
+        "woodProductionPerHour": Decimal(str(header["resourceProduction"])) * SECONDS_IN_HOUR,
+        "tradegoodProductionPerHour": Decimal(str(header["tradegoodProduction"])) * SECONDS_IN_HOUR,
+        "producedTradegood": int(header["producedTradegood"]),
+        "wineConsumptionPerHour": int(header["wineSpendings"]),
+        "freeTransporters": int(header["freeTransporters"]),
+        "maxTransporters": int(header["maxTransporters"]),
+        # None if the response doesn't say, the city page has to be read instead
+        "freeFreighters": int(header["freeFreighters"]) if "freeFreighters" in header else None,
+        "maxFreighters": int(header["maxFreighters"]) if "maxFreighters" in header else None,
+        "gold": Decimal(str(header["gold"])),
+        "goldProductionPerHour": Decimal(
+            str(header["scientistsUpkeep"] + header["income"] + header["upkeep"])
+        ),
+    }
+
+
+def changeCurrentCity(session, cityId):
+    """This function makes ``cityId`` the current city of the session with the lightweight ``changeCurrentCity`` action. The change is always sent, since another task or the broker may have switched cities since the last one
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+        the session object used to make requests to the game.
+    cityId : str
+        id of one of the cities of the account
+    """
+    cityId = str(cityId)
+    data = {
+        "action": "header",
+        "function": "changeCurrentCity",
+        "actionRequest": actionRequest,
+        "oldView": "city",
+        "cityId": cityId,
+        "backgroundView": "city",
+        "currentCityId": session.currentCityId or cityId,
+        "ajax": "1",
+    }
+    session.post(params=data)
+    session.currentCityId = cityId
+
+
+def getHeaderSnapshot(session, cityId=None) -> HeaderSnapshotDict:
+    """This function fetches the header data (resources, production, ships and gold) through the lightweight ``updateGlobalData`` ajax endpoint instead of downloading a full city page
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+        the session object used to make requests to the game.
+    cityId : str
+        if given, the bot first moves to this city with ``changeCurrentCity`` so that the snapshot describes it. Otherwise the snapshot is of the city the bot is currently in. Ship counts and gold are the same for every city.
+
+    Returns
+    -------
+    snapshot : HeaderSnapshotDict
+        the header data of the city
+    """
+    if cityId is not None:
+        changeCurrentCity(session, cityId)
+    return getHeaderData(session.get("view=updateGlobalData&ajax=1", noIndex=True))
+
+
 def getInventory(session):
 
     """
@@ -510,7 +661,7 @@ def getInventory(session):
     if not match:
         return None
 
-    inventory = json.loads(match.group(1))
+    inventory = jsonCodec.loads(match.group(1))
     return inventory
 
 
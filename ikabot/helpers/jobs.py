@@ -0,0 +1,115 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Job files for the headless mode (``ikabot --jobs jobs.yaml``). A job file lists the tasks to start and the answers to the questions each task asks when it starts, in the order they are asked::
+
+    jobs:
+      - function: loginDaily
+        restart: true
+      - function: constructionList
+        name: capital town hall
+        inputs: [1, 5, 2, "n"]
+      - function: autoPirate
+        enabled: false
+        inputs: [5, 1, "n", "n"]
+
+Jobs with ``restart: true`` are started again if they crash, see ``ikabot.helpers.supervisor``. JSON files with the same structure are also accepted. YAML needs PyYAML (pip install ikabot[jobs]).
+"""
+
+from ikabot.helpers import jsonCodec
+
+_JOB_KEYS = {"function", "name", "inputs", "enabled", "restart"}
+
+
+def loadJobs(path, functions):
+    """Reads and validates a job file
+    Parameters
+    ----------
+    path : str
+        path of a .yaml, .yml or .json job file
+    functions : dict[str, Any]
+        task functions that jobs can start, by name. The value is returned as the 'function' of the job, it can be a reference to the function to import it only when it is needed
+
+    Returns
+    -------
+    jobs : list[dict]
+        the enabled jobs, each one with the keys 'function', 'name', 'inputs' and 'restart'
+
+    Raises
+    ------
+    ValueError
+        if the file can't be parsed or any job is invalid. The message lists every problem found
+    """
+    with open(path, "r") as filehandler:
+        text = filehandler.read()
+    if path.lower().endswith((".yaml", ".yml")):
+        # imported here so that starting ikabot doesn't pay for it
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("PyYAML is needed to read {}, install it with: pip install ikabot[jobs]".format(path))
+        try:
+            spec = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ValueError("Could not parse {}: {}".format(path, e))
+    else:
+        try:
+            spec = jsonCodec.loads(text)
+        except ValueError as e:
+            raise ValueError("Could not parse {}: {}".format(path, e))
+
+    if isinstance(spec, dict):
+        spec = spec.get("jobs")
+    if not isinstance(spec, list):
+        raise ValueError("{} must contain a list of jobs".format(path))
+
+    errors = []
+    jobs = []
+    names = set()
+    for index, job in enumerate(spec, start=1):
+        where = "job {}".format(index)
+        if not isinstance(job, dict):
+            errors.append("{}: must be a mapping".format(where))
+            continue
+        unknown = set(job) - _JOB_KEYS
+        if unknown:
+            errors.append("{}: unknown keys {}".format(where, ", ".join(sorted(unknown))))
+        function = job.get("function")
+        if function not in functions:
+            errors.append("{}: unknown function {!r}".format(where, function))
+            continue
+        name = job.get("name", function)
+        if not isinstance(name, str):
+            errors.append("{}: name must be a string".format(where))
+            continue
+        where = "job {} ({})".format(index, name)
+        if name in names:
+            errors.append("{}: there is another job with the same name".format(where))
+        names.add(name)
+        inputs = job.get("inputs", [])
+        if not isinstance(inputs, list) or any(
+            isinstance(value, bool) or not isinstance(value, (int, str)) for value in inputs
+        ):
+            errors.append("{}: inputs must be a list of numbers and strings".format(where))
+            continue
+        enabled = job.get("enabled", True)
+        if not isinstance(enabled, bool):
+            errors.append("{}: enabled must be true or false".format(where))
+            continue
+        restart = job.get("restart", False)
+        if not isinstance(restart, bool):
+            errors.append("{}: restart must be true or false".format(where))
+            continue
+        if enabled:
+            jobs.append(
+                {
+                    "function": functions[function],
+                    "name": name,
+                    "inputs": inputs,
+                    "restart": restart,
+                }
+            )
+
+    if errors:
+        raise ValueError("Invalid job file {}:\n".format(path) + "\n".join(errors))
+    return jobs
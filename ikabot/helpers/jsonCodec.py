@@ -0,0 +1,97 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON encoding and decoding through the fastest library installed. orjson is used if available (pip install ikabot[fast]), then ujson, and the standard library otherwise.
+"""
+
+import json
+from collections.abc import Mapping
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+if orjson is not None:
+    backend = "orjson"
+elif ujson is not None:
+    backend = "ujson"
+else:
+    backend = "json"
+
+
+def loads(data):
+    """Decodes a json document. Game responses sometimes contain control characters inside strings, which only the standard library accepts (``strict=False``), so it is used whenever the fast backend rejects the document
+    Parameters
+    ----------
+    data : str | bytes
+        json document
+
+    Returns
+    -------
+    object : Any
+        decoded object
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    elif ujson is not None:
+        try:
+            return ujson.loads(data)
+        except (ValueError, OverflowError):
+            pass
+    return json.loads(data, strict=False)
+
+
+def _default(obj):
+    # the models of models.py are mappings but not dicts
+    if isinstance(obj, Mapping):
+        return dict(obj.items())
+    raise TypeError("Object of type {} is not JSON serializable".format(type(obj).__name__))
+
+
+def dumpsBytes(obj):
+    """Encodes an object as utf-8 json
+    Parameters
+    ----------
+    obj : Any
+        object to encode, dictionary keys that aren't strings are converted like the standard library does. Other mappings, like the models of ``models.py``, are encoded as objects
+
+    Returns
+    -------
+    data : bytes
+        json document
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    elif ujson is not None:
+        try:
+            return ujson.dumps(obj, ensure_ascii=False).encode("utf-8")
+        except (TypeError, OverflowError):
+            pass
+    return json.dumps(obj, default=_default, ensure_ascii=False).encode("utf-8")
+
+
+def dumps(obj):
+    """Encodes an object as json
+    Parameters
+    ----------
+    obj : Any
+        object to encode, dictionary keys that aren't strings are converted like the standard library does
+
+    Returns
+    -------
+    data : str
+        json document
+    """
+    return dumpsBytes(obj).decode("utf-8")
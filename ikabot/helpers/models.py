@@ -0,0 +1,400 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Slotted model objects for the game data parsed in ``getJson.py``. They behave like the dicts that used to be returned (``city["name"]``, ``"AllyTag" in city``, ``city.get(...)``...), but known keys are stored in slots and the compatibility aliases (``Id``, ``Name``, ``x``, ``tipo``, ``cityName``...) are properties computed from the original key instead of duplicated entries, so holding a whole world dump takes far less memory.
+"""
+
+import sys
+from collections.abc import MutableMapping
+
+from ikabot.config import materials_names_english, miracle_names_english
+
+_MISSING = object()
+
+
+class Model(MutableMapping):
+    """Base class of the models. Subclasses list the keys they store in ``__slots__``, any other key is kept in a regular dict so no data sent by the game is lost
+    Class attributes
+    ----------------
+    _aliases : dict[str, str]
+        alias key -> key it is computed from. The alias is exposed by a property of the same name, and it exists only while the key it is computed from does
+    _nested : dict[str, type]
+        key -> model class of the items of the list stored in that key
+    _interned : tuple[str]
+        keys whose string values repeat a lot across objects (``"city"``, ``"vacation"``...), they are interned so that every object shares the same string
+    """
+
+    __slots__ = ("_extra",)
+    _aliases = {}
+    _nested = {}
+    _interned = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = tuple(
+            field
+            for klass in reversed(cls.__mro__)
+            for field in klass.__dict__.get("__slots__", ())
+            if field != "_extra"
+        )
+        cls._fieldSet = frozenset(cls._fields)
+        cls._internedSet = frozenset(cls._interned)
+
+    def __init__(self, data=None, **kwargs):
+        """
+        Parameters
+        ----------
+        data : dict
+            the parsed json object, nested dicts listed in ``_nested`` are converted to models too
+        """
+        self._extra = None
+        if data is not None:
+            for key, value in data.items():
+                self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        if key in self._fieldSet or key in self._aliases:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self._fieldSet:
+            if key in self._internedSet and type(value) is str:
+                value = sys.intern(value)
+            elif key in self._nested and type(value) is list:
+                model = self._nested[key]
+                value = [model(item) if type(item) is dict else item for item in value]
+            setattr(self, key, value)
+        elif key in self._aliases:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._aliases:
+            key = self._aliases[key]
+        if key in self._fieldSet:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._aliases:
+            key = self._aliases[key]
+        if key in self._fieldSet:
+            return getattr(self, key, _MISSING) is not _MISSING
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        # aliases are left out, like that they aren't written twice to dumps
+        for field in self._fields:
+            if getattr(self, field, _MISSING) is not _MISSING:
+                yield field
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, dict(self.items()))
+
+    def copy(self):
+        """Returns a shallow copy of the object, like ``dict.copy``"""
+        return type(self)(self)
+
+    def toDict(self):
+        """Returns the object as plain dicts and lists, nested models are converted too
+        Returns
+        -------
+        data : dict
+        """
+        return {key: _toPlain(value) for key, value in self.items()}
+
+
+def _toPlain(value):
+    if isinstance(value, Model):
+        return value.toDict()
+    if type(value) is list:
+        return [_toPlain(item) for item in value]
+    return value
+
+
+class City(Model):
+    """A city or an empty building place on an island, as returned in ``Island["cities"]``"""
+
+    __slots__ = (
+        "type",
+        "name",
+        "id",
+        "level",
+        "ownerId",
+        "ownerName",
+        "ownerAllyId",
+        "ownerAllyTag",
+        "hasTreaties",
+        "actions",
+        "state",
+        "viewAble",
+        "infestedByPlague",
+        "buildplace_type",
+    )
+    _aliases = {
+        "Id": "ownerId",
+        "Name": "ownerName",
+        "AllyId": "ownerAllyId",
+        "AllyTag": "ownerAllyTag",
+        "_type": "buildplace_type",
+    }
+    _interned = ("type", "state", "buildplace_type")
+
+    @property
+    def Id(self):
+        return self.ownerId
+
+    @Id.setter
+    def Id(self, value):
+        self.ownerId = value
+
+    @property
+    def Name(self):
+        return self.ownerName
+
+    @Name.setter
+    def Name(self, value):
+        self.ownerName = value
+
+    @property
+    def AllyId(self):
+        return self.ownerAllyId
+
+    @AllyId.setter
+    def AllyId(self, value):
+        self.ownerAllyId = value
+
+    @property
+    def AllyTag(self):
+        return self.ownerAllyTag
+
+    @AllyTag.setter
+    def AllyTag(self, value):
+        self.ownerAllyTag = value
+
+    @property
+    def _type(self):
+        return self.buildplace_type
+
+    @_type.setter
+    def _type(self, value):
+        self["buildplace_type"] = value
+
+
+class Island(Model):
+    """An island, as returned by ``getIsland``"""
+
+    __slots__ = (
+        "id",
+        "type",
+        "name",
+        "xCoord",
+        "yCoord",
+        "tradegood",
+        "tradegoodTarget",
+        "resourceLevel",
+        "tradegoodLevel",
+        "wonder",
+        "wonderLevel",
+        "wonderName",
+        "showResourceWorkers",
+        "showTradegoodWorkers",
+        "showAgora",
+        "canEnterResource",
+        "canEnterTradegood",
+        "tradegoodEndUpgradeTime",
+        "resourceEndUpgradeTime",
+        "wonderEndUpgradeTime",
+        "isOwnCityOnIsland",
+        "cities",
+        "barbarians",
+        "avatarScores",
+        "specialServerBadges",
+        "selectedCityParameters",
+        "island",
+        "isHeliosTowerBuilt",
+        "heliosTop",
+        "heliosMid",
+        "heliosBase",
+        "heliosName",
+        "heliosTooltip",
+        "heliosActive",
+        "showResourceBonusIcon",
+        "showTradegoodBonusIcon",
+        "walkers",
+    )
+    _aliases = {"x": "xCoord", "y": "yCoord", "tipo": "tradegood"}
+    _nested = {"cities": City}
+
+    @property
+    def x(self):
+        return int(self.xCoord)
+
+    @x.setter
+    def x(self, value):
+        self.xCoord = str(value)
+
+    @property
+    def y(self):
+        return int(self.yCoord)
+
+    @y.setter
+    def y(self, value):
+        self.yCoord = str(value)
+
+    @property
+    def tipo(self):
+        return str(self.tradegood)
+
+    @tipo.setter
+    def tipo(self, value):
+        self.tradegood = int(value)
+
+
+class Position(Model):
+    """A building position of one of the player's cities, as returned in ``FullCity["position"]``"""
+
+    __slots__ = (
+        "position",
+        "name",
+        "level",
+        "isBusy",
+        "canUpgrade",
+        "isMaxLevel",
+        "building",
+        "shipIsAtDockyard",
+        "type",
+    )
+    _interned = ("name", "building", "type")
+
+
+class FullCity(Model):
+    """One of the player's cities, as returned by ``getCity``"""
+
+    __slots__ = (
+        "name",
+        "id",
+        "phase",
+        "isCapital",
+        "ownerId",
+        "ownerName",
+        "islandId",
+        "islandName",
+        "islandXCoord",
+        "islandYCoord",
+        "buildingSpeedupActive",
+        "showPirateFortressBackground",
+        "showPirateFortressShip",
+        "underConstruction",
+        "endUpgradeTime",
+        "startUpgradeTime",
+        "position",
+        "beachboys",
+        "spiesInside",
+        "cityLeftMenu",
+        "walkers",
+        "displayStaticPlague",
+        "dailyTasks",
+        "cityCinema",
+        "flyingTrader",
+        "isOwnCity",
+        "availableResources",
+        "storageCapacity",
+        "freeCitizens",
+        "wineConsumptionPerHour",
+        "resourcesListedForSale",
+        "freeSpaceForResources",
+    )
+    _aliases = {"x": "islandXCoord", "y": "islandYCoord", "cityName": "name"}
+    _nested = {"position": Position}
+
+    @property
+    def x(self):
+        return int(self.islandXCoord)
+
+    @x.setter
+    def x(self, value):
+        self.islandXCoord = str(value)
+
+    @property
+    def y(self):
+        return int(self.islandYCoord)
+
+    @y.setter
+    def y(self, value):
+        self.islandYCoord = str(value)
+
+    @property
+    def cityName(self):
+        return self.name
+
+    @cityName.setter
+    def cityName(self, value):
+        self.name = value
+
+
+class WorldMapIsland(Model):
+    """An island of the world map, as returned by ``getWorldMapIslands``"""
+
+    __slots__ = (
+        "x",
+        "y",
+        "id",
+        "name",
+        "resourceType",
+        "miracleType",
+        "unknownValue1",
+        "unknownValue2",
+        "woodLvl",
+        "cityCount",
+        "piracyInRange",
+        "heliosTower",
+        "red",
+        "blue",
+    )
+    _aliases = {"resourceName": "resourceType", "miracleName": "miracleType"}
+
+    @property
+    def resourceName(self):
+        return materials_names_english[self.resourceType]
+
+    @resourceName.setter
+    def resourceName(self, value):
+        self.resourceType = _nameIndex(materials_names_english, value, "resource")
+
+    @property
+    def miracleName(self):
+        return miracle_names_english[self.miracleType]
+
+    @miracleName.setter
+    def miracleName(self, value):
+        self.miracleType = _nameIndex(miracle_names_english, value, "miracle")
+
+
+def _nameIndex(names, name, kind):
+    try:
+        return names.index(name)
+    except ValueError:
+        raise ValueError("Unknown {} name {!r}, expected one of {}".format(kind, name, names)) from None
@@ -3,6 +3,8 @@
 
 import re
 
+from ikabot.helpers.getJson import getHeaderSnapshot
+
 
 def getAvailableShips(session):
     """Function that returns the total number of free (available) ships
@@ -16,8 +18,7 @@ def getAvailableShips(session):
     ships : int
         number of currently available ships
     """
-    html = session.get()
-    return int(re.search(r'GlobalMenu_freeTransporters">(\d+)<', html).group(1))
+    return getHeaderSnapshot(session)["freeTransporters"]
 
 
 def getTotalShips(session):
@@ -32,8 +33,7 @@ def getTotalShips(session):
     ships : int
         total number of ships the player has
     """
-    html = session.get()
-    return int(re.search(r'maxTransporters">(\d+)<', html).group(1))
+    return getHeaderSnapshot(session)["maxTransporters"]
 
 
 def getAvailableFreighters(session):
@@ -48,8 +48,11 @@ def getAvailableFreighters(session):
     ships : int
         number of currently available ships
     """
-    html = session.get()
-    return int(re.search(r'GlobalMenu_freeFreighters">(\d+)<', html).group(1))
+    freighters = getHeaderSnapshot(session)["freeFreighters"]
+    if freighters is None:
+        html = session.get()
+        freighters = int(re.search(r'GlobalMenu_freeFreighters">(\d+)<', html).group(1))
+    return freighters
 
 
 def getTotalFreighters(session):
@@ -64,5 +67,8 @@ def getTotalFreighters(session):
     ships : int
         total number of ships the player has
     """
-    html = session.get()
-    return int(re.search(r'maxFreighters">(\d+)<', html).group(1))
+    freighters = getHeaderSnapshot(session)["maxFreighters"]
+    if freighters is None:
+        html = session.get()
+        freighters = int(re.search(r'maxFreighters">(\d+)<', html).group(1))
+    return freighters
@@ -9,14 +9,16 @@ import time
 from decimal import *
 
 from ikabot.config import *
-from ikabot.helpers.getJson import getCity
+from ikabot.helpers.checkpoint import deleteCheckpoint, saveCheckpoint
+from ikabot.helpers.getJson import changeCurrentCity, getCity
 from ikabot.helpers.naval import *
 from ikabot.helpers.varios import wait
 from ikabot.helpers.pedirInfo import getShipCapacity
+from ikabot.helpers.shipLedger import shipReservation
 
 
-def sendGoods(session, originCityId, destinationCityId, islandId, ships, send, useFreighters=False):
-    """This function will execute one route
+def sendGoods(session, originCityId, destinationCityId, islandId, ships, send, useFreighters=False, originCity=None):
+    """This function will execute one route. The resources are loaded from the origin city, which becomes the current city of the session
     Parameters
     ----------
     session : ikabot.web.session.Session
@@ -31,151 +33,249 @@ def sendGoods(session, originCityId, destinationCityId, islandId, ships, send, u
         integer representing the amount of ships needed to execute the route
     send : list
         array of resources to send
+    useFreighters : bool
+    originCity : dict
+        the origin city as returned by ``getCity``, if the caller has already parsed it. It is fetched otherwise
+
+    Returns
+    -------
+    sent : bool
+        False if the ships are not in the port. It doesn't wait for them, so the caller can wait without keeping them reserved
+
+    Raises
+    ------
+    Exception
+        if the game refuses the shipment for any other reason
     """
-    # this can fail if a random request is made in between this two posts
-    while True:
-        html = session.get()
-        current_city = getCity(html)  # the city the bot is right now
-        city = getCity(session.get(city_url + originCityId))  # the origin city
-        currId = current_city["id"]
-
-        # Change from the city the bot is sitting right now to the city we want to load resources from
-        data = {
-            "action": "header",
-            "function": "changeCurrentCity",
-            "actionRequest": actionRequest,
-            "oldView": "city",
-            "cityId": originCityId,
-            "backgroundView": "city",
-            "currentCityId": currId,
-            "ajax": "1",
-        }
-
-        session.post(params=data)
-
-        # Request to send the resources from the origin to the target
-        data = {
-            "action": "transportOperations",
-            "function": "loadTransportersWithFreight",
-            "destinationCityId": destinationCityId,
-            "islandId": islandId,
-            "oldView": "",
-            "position": "",
-            "avatar2Name": "",
-            "city2Name": "",
-            "type": "",
-            "activeTab": "",
-            "transportDisplayPrice": "0",
-            "premiumTransporter": "0",
-            "capacity": "5",
-            "max_capacity": "5",
-            "jetPropulsion": "0",
-            "backgroundView": "city",
-            "currentCityId": originCityId,
-            "templateView": "transport",
-            "currentTab": "tabSendTransporter",
-            "actionRequest": actionRequest,
-            "ajax": "1",
-        }
-        
-        if useFreighters is False:
-            shiptype = "transporters"
-            data[shiptype] = ships
-        else:
-            shiptype = "usedFreightersShips"
-            data[shiptype] = ships
-            data["transporters"] = "0"
-        # add amounts of resources to send
-        for i in range(len(send)):
-            if city["availableResources"][i] > 0:
-                key = "cargo_resource" if i == 0 else "cargo_tradegood{:d}".format(i)
-                data[key] = send[i]
-
-        resp = session.post(params=data)
-        resp = json.loads(resp, strict=False)
-        if resp[3][1][0]["type"] == 10:
+    if originCity is None:
+        originCity = getCity(session.get(city_url + str(originCityId)))
+    # Change from the city the bot is sitting right now to the city we want to load resources from
+    changeCurrentCity(session, originCityId)
+
+    # Request to send the resources from the origin to the target
+    data = {
+        "action": "transportOperations",
+        "function": "loadTransportersWithFreight",
+        "destinationCityId": destinationCityId,
+        "islandId": islandId,
+        "oldView": "",
+        "position": "",
+        "avatar2Name": "",
+        "city2Name": "",
+        "type": "",
+        "activeTab": "",
+        "transportDisplayPrice": "0",
+        "premiumTransporter": "0",
+        "capacity": "5",
+        "max_capacity": "5",
+        "jetPropulsion": "0",
+        "backgroundView": "city",
+        "currentCityId": originCityId,
+        "templateView": "transport",
+        "currentTab": "tabSendTransporter",
+        "actionRequest": actionRequest,
+        "ajax": "1",
+    }
+    
+    if useFreighters is False:
+        shiptype = "transporters"
+        data[shiptype] = ships
+    else:
+        shiptype = "usedFreightersShips"
+        data[shiptype] = ships
+        data["transporters"] = "0"
+    # add amounts of resources to send
+    for i in range(len(send)):
+        if originCity["availableResources"][i] > 0:
+            key = "cargo_resource" if i == 0 else "cargo_tradegood{:d}".format(i)
+            data[key] = send[i]
+
+    resp = session.post(params=data)
+    resp = json.loads(resp, strict=False)
+    feedback = resp[3][1][0]
+    if feedback["type"] == 10:
+        return True
+    if feedback["type"] != 11:
+        raise Exception(
+            "The shipment from city {} to city {} was refused: {}".format(
+                originCityId, destinationCityId, feedback.get("text", feedback)
+            )
+        )
+    # the ships are not in the port yet
+    return False
+
+
+def _routeState(route):
+    (origin_city, destination_city, island_id, *toSend) = route
+    return [
+        {"id": origin_city["id"], "name": origin_city["name"]},
+        {"id": destination_city["id"], "name": destination_city["name"]},
+        island_id,
+        *toSend,
+    ]
+
+
+def splitShips(ships, needed):
+    """Splits the available ships between several routes, in proportion to the ships each one needs. Routes that need fewer ships than their share get just what they need, and the ships left after rounding go to the first routes
+    Parameters
+    ----------
+    ships : int
+        number of available ships
+    needed : list[int]
+        number of ships each route needs to carry everything it has left
+
+    Returns
+    -------
+    allocation : list[int]
+        number of ships given to each route
+    """
+    total = sum(needed)
+    if total <= ships:
+        return list(needed)
+    allocation = [ships * need // total for need in needed]
+    left = ships - sum(allocation)
+    for i, need in enumerate(needed):
+        if left == 0:
             break
-        elif resp[3][1][0]["type"] == 11:
-            wait(getMinimumWaitingTime(session))
-        time.sleep(5)
+        extra = min(need - allocation[i], left)
+        allocation[i] += extra
+        left -= extra
+    return allocation
 
 
-def executeRoutes(session, routes, useFreighters=False):
-    """This function will execute all the routes passed to it, regardless if there are enough ships available to do so
+def executeRoutes(session, routes, useFreighters=False, resumable=True):
+    """This function will execute all the routes passed to it, regardless if there are enough ships available to do so. Every time ships are available they are split between all the routes that are left and each route loads its share, so that several routes are served at once. The ships of each route are reserved in the ship ledger while they are loaded, so other tasks shipping at the same time don't try to load the same ones
     Parameters
     ----------
     session : ikabot.web.session.Session
         Session object
     routes : list
         a list of tuples, each of which represent a route. A route is defined like so : (originCity,destinationCity,islandId,wood,wine,marble,crystal,sulfur). originCity and destintionCity should be passed as City objects
+    resumable : bool
+        if True, the routes that are left are checkpointed after every shipment so they can be resumed if the task dies. Tasks that work out their routes again on every run should pass False
     """
     ship_capacity, freighter_capacity = getShipCapacity(session)
-    for route in routes:
-        (origin_city, destination_city, island_id, *toSend) = route
-        destination_city_id = destination_city["id"]
+    capacity = freighter_capacity if useFreighters else ship_capacity
+    pending = [_routeState(route) for route in routes if sum(route[3:]) > 0]
 
-        while sum(toSend) > 0:
-            session.setStatus(
-                f' Sending {toSend[0]}W, {toSend[1]}V, {toSend[2]}M, {toSend[3]}C, {toSend[4]}S | {origin_city["name"]} ---> {destination_city["name"]} '
+    def saveRoutes():
+        if resumable:
+            origin, destination = pending[0][0], pending[0][1]
+            saveCheckpoint(
+                session,
+                "executeRoutes",
+                "ikabot.helpers.planRoutes:resumeRoutes",
+                {"routes": pending, "useFreighters": useFreighters},
+                info="{} route(s) left, {} -> {}".format(
+                    len(pending), origin["name"], destination["name"]
+                ),
             )
-            ships_available = waitForArrival(session, useFreighters)
-            if useFreighters is False:
-                storageCapacityInShips = ships_available * ship_capacity
-            else:
-                storageCapacityInShips = ships_available * freighter_capacity
-
-            html = session.get(city_url + str(origin_city["id"]))
-            origin_city = getCity(html)
-            html = session.get(city_url + str(destination_city_id))
-            destination_city = getCity(html)
+
+    while pending:
+        saveRoutes()
+        ships_available = waitForArrival(session, useFreighters)
+        needed = [
+            int(math.ceil(Decimal(sum(route[3:])) / Decimal(capacity)))
+            for route in pending
+        ]
+        allocation = splitShips(ships_available, needed)
+
+        # every city is fetched once per round, the resources loaded and the space taken by the previous routes of the round are discounted
+        cities = {}
+
+        def fetchCity(city_id):
+            city_id = str(city_id)
+            if city_id not in cities:
+                cities[city_id] = getCity(session.get(city_url + city_id))
+            return cities[city_id]
+
+        sent_any = False
+        ships_busy = False
+        for route, ships in zip(pending, allocation):
+            if ships == 0:
+                continue
+            origin_city = fetchCity(route[0]["id"])
+            destination_city_id = route[1]["id"]
+            destination_city = fetchCity(destination_city_id)
             foreign = str(destination_city["id"]) != str(destination_city_id)
-            if foreign is False:
-                storageCapacityInCity = destination_city["freeSpaceForResources"]
+            toSend = route[3:]
+            session.setStatus(
+                f' Sending {toSend[0]}W, {toSend[1]}V, {toSend[2]}M, {toSend[3]}C, {toSend[4]}S | {route[0]["name"]} ---> {route[1]["name"]} '
+            )
 
+            storageCapacityInShips = ships * capacity
             send = []
             for i in range(len(toSend)):
+                min_val = min(
+                    origin_city["availableResources"][i],
+                    toSend[i],
+                    storageCapacityInShips,
+                )
                 if foreign is False:
-                    min_val = min(
-                        origin_city["availableResources"][i],
-                        toSend[i],
-                        storageCapacityInShips,
-                        storageCapacityInCity[i],
-                    )
-                else:
-                    min_val = min(
-                        origin_city["availableResources"][i],
-                        toSend[i],
-                        storageCapacityInShips,
-                    )
+                    min_val = min(min_val, destination_city["freeSpaceForResources"][i])
                 send.append(min_val)
-                storageCapacityInShips -= send[i]
-                toSend[i] -= send[i]
-
-            resources_to_send = sum(send)
-            if resources_to_send == 0:
-                # no space available
-                # wait an hour and try again
-                wait(60 * 60)
+                storageCapacityInShips -= min_val
+
+            if sum(send) == 0:
+                # no resources or no space available for this route right now
                 continue
 
-            if useFreighters is False:
-                available_ships = int(
-                    math.ceil((Decimal(resources_to_send) / Decimal(ship_capacity)))
+            # other tasks of the account may be loading some of these ships right now. The ships are only reserved while they are loaded, so the reservation is never held while waiting
+            ships_needed = int(math.ceil(Decimal(sum(send)) / Decimal(capacity)))
+            with shipReservation(
+                session, ships_available, ships_needed, useFreighters
+            ) as reserved:
+                if reserved < ships_needed:
+                    # send what fits in the ships the other tasks have left
+                    storageCapacityInShips = reserved * capacity
+                    for i in range(len(send)):
+                        send[i] = min(send[i], storageCapacityInShips)
+                        storageCapacityInShips -= send[i]
+                sent = sum(send) > 0 and sendGoods(
+                    session,
+                    origin_city["id"],
+                    destination_city_id,
+                    route[2],
+                    reserved,
+                    send,
+                    useFreighters,
+                    origin_city,
                 )
-            else:
-                available_ships = int(
-                    math.ceil((Decimal(resources_to_send) / Decimal(freighter_capacity)))
-                )
-            sendGoods(
-                session,
-                origin_city["id"],
-                destination_city_id,
-                island_id,
-                available_ships,
-                send,
-                useFreighters,
-            )
+            if not sent:
+                # the ships are being loaded by other tasks or have not arrived yet, they are waited for in the next round
+                ships_busy = True
+                break
+            ships_available -= reserved
+            sent_any = True
+            for i in range(len(send)):
+                origin_city["availableResources"][i] -= send[i]
+                if foreign is False:
+                    destination_city["freeSpaceForResources"][i] -= send[i]
+                route[3 + i] -= send[i]
+            saveRoutes()
+            time.sleep(random.randint(5, 15))
+
+        pending = [route for route in pending if sum(route[3:]) > 0]
+        if ships_busy:
             time.sleep(random.randint(5, 15))
+        elif pending and not sent_any:
+            # no space available
+            # wait an hour and try again
+            wait(60 * 60)
+
+    if resumable:
+        deleteCheckpoint(session, "executeRoutes")
+
+
+def resumeRoutes(session, state):
+    """Resumes the routes checkpointed by ``executeRoutes``
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    state : dict
+    """
+    routes = [tuple(route) for route in state["routes"]]
+    executeRoutes(session, routes, state["useFreighters"])
 
 
 def get_random_wait_time():
@@ -194,8 +294,10 @@ def getMinimumWaitingTime(session):
     timeToWait : int
         the minimum waiting time for the closest fleet to arrive
     """
-    html = session.get()
-    idCiudad = re.search(r"currentCityId:\s(\d+),", html).group(1)
+    idCiudad = session.currentCityId
+    if idCiudad is None:
+        html = session.get()
+        idCiudad = re.search(r"currentCityId:\s(\d+),", html).group(1)
     url = "view=militaryAdvisor&oldView=city&oldBackgroundView=city&backgroundView=city&currentCityId={}&actionRequest={}&ajax=1".format(
         idCiudad, actionRequest
     )
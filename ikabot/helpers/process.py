@@ -1,15 +1,18 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import json
 import os
 import subprocess
+import threading
+import time
 
 import psutil
 
 from ikabot.config import *
+from ikabot.helpers.database import getAccountKey, getConnection
+from ikabot.helpers.rateLimit import setRequestPriority
 from ikabot.helpers.signals import deactivate_sigint
-from ikabot.helpers.varios import normalizeDicts
+from ikabot.helpers.varios import getTaskId
 
 
 def set_child_mode(session):
@@ -32,58 +35,313 @@ def run(command):
         return ret
 
 
-def updateProcessList(session, programprocesslist=[]):
-    """This function will return data about all the active ikabot processes. If it is passed the ``programprocesslist`` argument, it will write new processes from that list to the .ikabot file
+def setTaskStatus(session, pid, message):
+    """Stores the status message of a task in the process registry
     Parameters
     ----------
     session : ikabot.web.session.Session
-        Session object
-    programprocesslist : list[dict]
-        a list of dictionaries containing relevant data about a running ikabot process ('pid', 'proxies' and 'action')
+    pid : int
+        id of the task, its pid or its job id if it runs inside the worker process
+    message : str
+        status message to be displayed in the table on the main menu
+    """
+    # the task may not have been registered yet, the registration keeps the status
+    getConnection().execute(
+        """INSERT INTO processes (account, task, status, heartbeat) VALUES (?, ?, ?, ?)
+        ON CONFLICT (account, task) DO UPDATE SET status = excluded.status""",
+        (getAccountKey(session), pid, message, time.time()),
+    )
+
+
+def _taskId(process):
+    return process.get("job") or process["pid"]
+
+
+def taskLabel(process):
+    """
+    Parameters
+    ----------
+    process : dict
+        an entry of the process list
 
     Returns
     -------
-    runningIkabotProcessList : list[dict]
-        a list of dictionaries containing relevant data about a running ikabot process ('pid', 'proxies' and 'action')
+    label : str
+        the task of the process as shown in the tables of the main menu and the web server, with the number of times the supervisor restarted it
+    """
+    if process.get("restarts"):
+        return "{} (restarted {}x)".format(process["action"], process["restarts"])
+    return str(process["action"])
+
+
+def _formatBytes(size):
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024:
+            return "{:.0f}{}".format(size, unit)
+        size /= 1024
+    return "{:.1f}GB".format(size)
+
+
+def taskUsage(process):
     """
-    # read from file
-    sessionData = session.getSessionData()
+    Parameters
+    ----------
+    process : dict
+        an entry of the process list
+
+    Returns
+    -------
+    usage : str
+        requests sent by the task, bytes received, average latency, CPU time and memory of its process, as shown in the tables of the main menu and the web server. Tasks that run inside the worker process share its memory
+    """
+    usage = []
+    if process.get("requests"):
+        usage.append(
+            "{:d} req {} {:.0f}ms".format(
+                process["requests"],
+                _formatBytes(process["received"]),
+                process["latency"] / process["requests"] * 1000,
+            )
+        )
+    if process.get("cpu") is not None:
+        usage.append("cpu {:.1f}s".format(process["cpu"]))
+    if process.get("rss") is not None:
+        usage.append(_formatBytes(process["rss"]))
+    return " ".join(usage)
+
+
+# requests sent by the tasks of this process, by task id: [requests, bytes received, seconds spent waiting for responses]
+_usage = {}
+_usageLock = threading.Lock()
+
+
+def recordRequest(size, elapsed):
+    """Adds a request of the current task to its counters, they are written to the process registry with the next heartbeat
+    Parameters
+    ----------
+    size : int
+        bytes received
+    elapsed : float
+        seconds until the response arrived
+    """
+    with _usageLock:
+        usage = _usage.setdefault(getTaskId(), [0, 0, 0.0])
+        usage[0] += 1
+        usage[1] += size
+        usage[2] += elapsed
+
+
+def reportUsage(session):
+    """Refreshes the heartbeat and the resource usage of the tasks of the current process in the process registry
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    """
+    connection = getConnection()
+    account = getAccountKey(session)
+    pid = os.getpid()
+    process = psutil.Process(pid)
+    cpu_times = process.cpu_times()
+    cpu = cpu_times.user + cpu_times.system
+    rss = process.memory_info().rss
+    tasks = connection.execute(
+        "SELECT task, job FROM processes WHERE account = ? AND pid = ?", (account, pid)
+    ).fetchall()
+    threads = {}
+    if any(job is not None for task, job in tasks):
+        # the job id of a task of the worker process is the native id of its thread
+        threads = {
+            thread.id: thread.user_time + thread.system_time
+            for thread in process.threads()
+        }
+    with _usageLock:
+        usage = {task: list(counters) for task, counters in _usage.items()}
+    now = time.time()
+    connection.executemany(
+        """UPDATE processes SET heartbeat = ?, requests = ?, received = ?, latency = ?, cpu = ?, rss = ?
+        WHERE account = ? AND task = ?""",
+        [
+            (
+                now,
+                *usage.get(task, [None, None, None]),
+                cpu if job is None else threads.get(job),
+                rss,
+                account,
+                task,
+            )
+            for task, job in tasks
+        ],
+    )
+
+
+_heartbeat_pid = None
+
+
+def startHeartbeat(session):
+    """Starts a thread that keeps the entries of the current process alive in the process registry and refreshes their resource usage. Entries that stop receiving heartbeats, because their process died without unregistering them, disappear from the process list after ``process_heartbeat_timeout`` seconds
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    """
+    global _heartbeat_pid
+    if _heartbeat_pid == os.getpid():
+        return
+    _heartbeat_pid = os.getpid()
+
+    def _heartbeat():
+        while True:
+            time.sleep(process_heartbeat_interval)
+            try:
+                reportUsage(session)
+            except Exception:
+                # the task must not stop because of the registry, the next heartbeat will try again
+                pass
+
+    threading.Thread(target=_heartbeat, name="heartbeat", daemon=True).start()
+
+
+def unregisterTask(session, task_ids=None):
+    """Removes tasks from the process registry
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    task_ids : list[int]
+        ids of the tasks to remove, the current task if not given
+    """
+    if task_ids is None:
+        task_ids = [getTaskId()]
+    account = getAccountKey(session)
+    getConnection().executemany(
+        "DELETE FROM processes WHERE account = ? AND task = ?",
+        [(account, task_id) for task_id in task_ids],
+    )
+
+
+def renameTask(session, action):
+    """Changes the task name that is shown in the process list for the current task
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    action : str
+    """
+    getConnection().execute(
+        "UPDATE processes SET action = ? WHERE account = ? AND task = ?",
+        (action, getAccountKey(session), getTaskId()),
+    )
+
+
+def runTask(function, session, event, stdin_fd, predetermined_input):
+    """Target of the processes of the tasks. Keeps the task alive in the process registry while it runs and removes it when it returns. It also sets the priority class of the requests of the task
+    Parameters
+    ----------
+    function : Callable
+        a task function of the main menu
+    session : ikabot.web.session.Session
+    event : multiprocessing.Event
+    stdin_fd: int
+    predetermined_input : multiprocessing.managers.SyncManager.list
+    """
+    startHeartbeat(session)
+    setRequestPriority(request_priorities.get(function.__name__, "normal"))
     try:
-        fileList = sessionData["processList"]
-    except KeyError:
-        fileList = []
+        function(session, event, stdin_fd, predetermined_input)
+    finally:
+        # tasks that end with session.logout() unregister themselves there
+        unregisterTask(session)
 
-    # check it's still running
-    runningIkabotProcessList = []
-    ika_process = psutil.Process(pid=os.getpid()).name()
-    for process in fileList:
-        try:
-            proc = psutil.Process(pid=process["pid"])
-        except psutil.NoSuchProcess:
-            continue
 
-        # windows doesn't support the status method
-        isAlive = True if isWindows else proc.status() != "zombie"
+def _isAlive(pid):
+    if isWindows:
+        # os.kill would terminate the process, the heartbeat is enough
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
 
-        if proc.name() == ika_process and isAlive:
-            runningIkabotProcessList.append(process)
+# columns of the process registry returned by updateProcessList
+_PROCESS_KEYS = (
+    "pid",
+    "job",
+    "action",
+    "name",
+    "date",
+    "restarts",
+    "status",
+    "requests",
+    "received",
+    "latency",
+    "cpu",
+    "rss",
+)
 
-    # add new to the list and write to file only if it's given
-    for process in programprocesslist:
-        if process not in runningIkabotProcessList:
-            runningIkabotProcessList.append(process)
 
-    # check if all proceses have new status field
-    if len([p for p in runningIkabotProcessList if "status" not in p]) == len(
-        runningIkabotProcessList
-    ) and len(runningIkabotProcessList):
-        runningIkabotProcessList[0]["status"] = "running"
+def updateProcessList(session, programprocesslist=[]):
+    """This function will return data about all the active ikabot processes. If it is passed the ``programprocesslist`` argument, it will add the processes from that list to the process registry
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+        Session object
+    programprocesslist : list[dict]
+        a list of dictionaries containing relevant data about a running ikabot process ('pid', 'action', 'date', 'status' and optionally 'job', 'name' and 'restarts')
 
-    # write to file
-    sessionData["processList"] = runningIkabotProcessList
-    session.setSessionData(sessionData)
+    Returns
+    -------
+    runningIkabotProcessList : list[dict]
+        a list of dictionaries containing relevant data about a running ikabot process ('pid', 'job', 'action', 'name', 'date', 'restarts' and 'status') and its resource usage ('requests', 'received', 'latency', 'cpu' and 'rss', see ``taskUsage``). Tasks that run inside the worker process share its 'pid' and are told apart by their 'job' id
+    """
+    connection = getConnection()
+    account = getAccountKey(session)
+    now = time.time()
+    # new tasks start with the status they were given, not with the one of an old task that had the same pid. A status the task set before being registered is kept
+    connection.executemany(
+        """INSERT INTO processes (account, task, pid, job, action, name, date, restarts, status, heartbeat)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (account, task) DO UPDATE SET
+            pid = excluded.pid, job = excluded.job, action = excluded.action, name = excluded.name,
+            date = excluded.date, restarts = excluded.restarts, heartbeat = excluded.heartbeat,
+            status = CASE WHEN processes.pid IS NULL THEN processes.status ELSE excluded.status END""",
+        [
+            (
+                account,
+                _taskId(process),
+                process["pid"],
+                process.get("job"),
+                process.get("action"),
+                process.get("name"),
+                process.get("date", now),
+                process.get("restarts"),
+                process.get("status"),
+                now,
+            )
+            for process in programprocesslist
+        ],
+    )
 
-    # normalize process list (all processes must have properties pid, action, date and status)
-    normalized_processes = normalizeDicts(runningIkabotProcessList)
-    # remove dupes by pid
-    return list({d["pid"]: d for d in normalized_processes}.values())
+    rows = connection.execute(
+        "SELECT task, heartbeat, {} FROM processes WHERE account = ? ORDER BY date".format(
+            ", ".join(_PROCESS_KEYS)
+        ),
+        (account,),
+    ).fetchall()
+    runningIkabotProcessList = []
+    dead = []
+    for row in rows:
+        task, heartbeat = row[:2]
+        process = dict(zip(_PROCESS_KEYS, row[2:]))
+        if heartbeat < now - process_heartbeat_timeout or (
+            process["pid"] is not None and not _isAlive(process["pid"])
+        ):
+            dead.append(task)
+            continue
+        if process["pid"] is None:
+            # a status set by a task that is not registered yet
+            continue
+        runningIkabotProcessList.append(process)
+    if dead:
+        unregisterTask(session, dead)
+    return runningIkabotProcessList
@@ -0,0 +1,104 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Request rate limit shared by every process of an account. The requests of all the tasks draw from one token bucket stored in the local state database, which refills at ``request_rate`` tokens per second up to ``request_burst``. Each task belongs to a priority class (``request_priorities``): lower classes must leave ``request_priority_reserve`` tokens in the bucket, so when many tasks compete the latency critical ones are served first and bulk tasks slow down. The limit is off unless ``request_rate`` is set.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from ikabot.config import *
+from ikabot.helpers.database import getAccountKey, getConnection
+from ikabot.helpers.varios import getTaskId
+
+# priority class of the tasks of this process, by task id
+_priorities = {}
+# priority class of the requests a thread sends on behalf of another task
+_override = threading.local()
+
+
+def setRequestPriority(priority):
+    """Sets the priority class of the requests of the current task
+    Parameters
+    ----------
+    priority : str
+        one of the keys of ``request_priority_reserve``
+    """
+    if priority not in request_priority_reserve:
+        raise ValueError("Unknown request priority {!r}".format(priority))
+    _priorities[getTaskId()] = priority
+
+
+def getRequestPriority():
+    """
+    Returns
+    -------
+    priority : str
+        priority class of the requests of the current task, "normal" if it was not set
+    """
+    return getattr(_override, "priority", None) or _priorities.get(getTaskId(), "normal")
+
+
+@contextmanager
+def requestPriority(priority):
+    """Context manager that sends the requests of the current thread with the given priority class, whatever the class of its task. Used by the session broker, which sends the requests of every task
+    Parameters
+    ----------
+    priority : str
+        one of the keys of ``request_priority_reserve``
+    """
+    previous = getattr(_override, "priority", None)
+    _override.priority = priority
+    try:
+        yield
+    finally:
+        _override.priority = previous
+
+
+def _takeToken(connection, account, needed):
+    now = time.time()
+    # the write lock is taken right away, so no other process can refill and take the same token
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        row = connection.execute(
+            "SELECT tokens, updated FROM request_buckets WHERE account = ?", (account,)
+        ).fetchone()
+        if row is None:
+            tokens = request_burst
+        else:
+            tokens = min(request_burst, row[0] + max(now - row[1], 0) * request_rate)
+        taken = tokens >= needed
+        if taken:
+            tokens -= 1
+        connection.execute(
+            "INSERT OR REPLACE INTO request_buckets (account, tokens, updated) VALUES (?, ?, ?)",
+            (account, tokens, now),
+        )
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    return taken, tokens
+
+
+def acquireRequest(session, priority=None):
+    """Waits until the current task is allowed to send a request to the game server
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    priority : str
+        priority class of the request, the one of the current task if not given
+    """
+    if request_rate <= 0:
+        return
+    reserve = request_priority_reserve[priority or getRequestPriority()]
+    # a class can never wait for more tokens than the bucket holds
+    needed = 1 + min(reserve, request_burst - 1)
+    connection = getConnection()
+    account = getAccountKey(session)
+    while True:
+        taken, tokens = _takeToken(connection, account, needed)
+        if taken:
+            return
+        time.sleep((needed - tokens) / request_rate)
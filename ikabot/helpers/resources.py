@@ -9,6 +9,13 @@ from ikabot.config import *
 
 getcontext().prec = 30
 
+# compiled once, these are searched in every city page that is parsed
+_AVAILABLE_RESOURCES = re.compile(
+    r'\\"resource\\":(\d+),\\"2\\":(\d+),\\"1\\":(\d+),\\"4\\":(\d+),\\"3\\":(\d+)}'
+)
+_WAREHOUSE_CAPACITY = re.compile(r'maxResources:\s*JSON\.parse\(\'{\\"resource\\":(\d+),')
+_WINE_CONSUMPTION = re.compile(r"wineSpendings:\s(\d+)")
+
 
 def getAvailableResources(html, num=False):
     """
@@ -20,10 +27,7 @@ def getAvailableResources(html, num=False):
     -------
     resources_available : list[int] | list[str]
     """
-    resources = re.search(
-        r'\\"resource\\":(\d+),\\"2\\":(\d+),\\"1\\":(\d+),\\"4\\":(\d+),\\"3\\":(\d+)}',
-        html,
-    )
+    resources = _AVAILABLE_RESOURCES.search(html)
     if num:
         return [
             int(resources.group(1)),
@@ -51,9 +55,7 @@ def getWarehouseCapacity(html):
     -------
     capacity : int
     """
-    capacity = re.search(
-        r'maxResources:\s*JSON\.parse\(\'{\\"resource\\":(\d+),', html
-    ).group(1)
+    capacity = _WAREHOUSE_CAPACITY.search(html).group(1)
     return int(capacity)
 
 
@@ -66,7 +68,7 @@ def getWineConsumptionPerHour(html):
     -------
     capacity : int
     """
-    result = re.search(r"wineSpendings:\s(\d+)", html)
+    result = _WINE_CONSUMPTION.search(html)
     if result:
         return int(result.group(1))
     return 0
@@ -0,0 +1,81 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Process-wide scheduler for task wake-ups. Instead of each task sleeping on its own, tasks block until an absolute time (a game timestamp, like the arrival of a fleet or the end of a construction). A single thread per process keeps the wake-ups in a heap and releases each one when its time comes.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+
+# the scheduler thread wakes up at least this often, so a change of the system clock delays a wake-up by no more than this
+_MAX_SLEEP = 60
+
+
+class Scheduler:
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def schedule(self, when):
+        """Registers a wake-up at ``when``
+        Parameters
+        ----------
+        when : float
+            timestamp at which the wake-up is due
+
+        Returns
+        -------
+        event : threading.Event
+            set once ``when`` has passed
+        """
+        event = threading.Event()
+        with self.condition:
+            # the counter breaks ties, events can't be compared
+            heapq.heappush(self.heap, (when, next(self.counter), event))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+                self.thread.start()
+            elif self.heap[0][2] is event:
+                self.condition.notify()
+        return event
+
+    def _run(self):
+        with self.condition:
+            while True:
+                now = time.time()
+                while self.heap and self.heap[0][0] <= now:
+                    heapq.heappop(self.heap)[2].set()
+                timeout = _MAX_SLEEP
+                if self.heap:
+                    timeout = min(self.heap[0][0] - now, _MAX_SLEEP)
+                self.condition.wait(timeout)
+
+
+_scheduler = None
+_scheduler_pid = None
+_scheduler_guard = threading.Lock()
+
+
+def _getScheduler():
+    global _scheduler, _scheduler_pid
+    with _scheduler_guard:
+        # threads don't survive a fork, children start their own scheduler
+        if _scheduler is None or _scheduler_pid != os.getpid():
+            _scheduler = Scheduler()
+            _scheduler_pid = os.getpid()
+        return _scheduler
+
+
+def sleepUntil(when):
+    """Blocks until ``when``
+    Parameters
+    ----------
+    when : float
+        timestamp at which to wake up
+    """
+    _getScheduler().schedule(when).wait()
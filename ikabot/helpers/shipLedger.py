@@ -0,0 +1,122 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ledger of the ships reserved by the tasks of an account, kept in the local state database. The game only tells how many ships are in the port, so two tasks that read that number at the same time would both try to load the same ships. Before sending, a task reserves the ships it is going to use: a reservation is granted at once with whatever the other tasks haven't reserved, and it is released as soon as the ships leave. Several tasks can then ship at the same time, each one with its own ships. A task that dies without releasing its ships loses them after ``ship_reservation_timeout`` seconds.
+"""
+
+import time
+from contextlib import contextmanager
+
+from ikabot.config import *
+from ikabot.helpers.database import getAccountKey, getConnection
+from ikabot.helpers.varios import getTaskId
+
+
+def _kind(useFreighters):
+    return "freighters" if useFreighters else "transporters"
+
+
+def _transaction(function):
+    connection = getConnection()
+    # the write lock is taken right away, so no other process can reserve the same ships
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        result = function(connection)
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    return result
+
+
+def reserveShips(session, available, wanted, useFreighters=False):
+    """Reserves ships for the current task, replacing its previous reservation
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    available : int
+        ships the port has right now
+    wanted : int
+        ships the task would like to use
+    useFreighters : bool
+
+    Returns
+    -------
+    ships : int
+        ships reserved, at most ``wanted``. 0 if the other tasks have reserved every available ship
+    """
+    account = getAccountKey(session)
+    kind = _kind(useFreighters)
+    task = getTaskId()
+
+    def reserve(connection):
+        now = time.time()
+        connection.execute(
+            "DELETE FROM ship_reservations WHERE account = ? AND expires < ?",
+            (account, now),
+        )
+        (reserved,) = connection.execute(
+            "SELECT COALESCE(SUM(ships), 0) FROM ship_reservations WHERE account = ? AND kind = ? AND task != ?",
+            (account, kind, task),
+        ).fetchone()
+        ships = max(min(wanted, available - reserved), 0)
+        if ships == 0:
+            connection.execute(
+                "DELETE FROM ship_reservations WHERE account = ? AND kind = ? AND task = ?",
+                (account, kind, task),
+            )
+        else:
+            connection.execute(
+                "INSERT OR REPLACE INTO ship_reservations (account, kind, task, ships, expires) VALUES (?, ?, ?, ?, ?)",
+                (account, kind, task, ships, now + ship_reservation_timeout),
+            )
+        return ships
+
+    return _transaction(reserve)
+
+
+def releaseShips(session, ships=None, useFreighters=False):
+    """Gives back ships reserved by the current task, once they have left or if they won't be used
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    ships : int
+        ships to give back, all of them if not given
+    useFreighters : bool
+    """
+    key = (getAccountKey(session), _kind(useFreighters), getTaskId())
+
+    def release(connection):
+        if ships is not None:
+            connection.execute(
+                "UPDATE ship_reservations SET ships = ships - ?, expires = ? WHERE account = ? AND kind = ? AND task = ?",
+                (ships, time.time() + ship_reservation_timeout, *key),
+            )
+        connection.execute(
+            "DELETE FROM ship_reservations WHERE account = ? AND kind = ? AND task = ? AND (? IS NULL OR ships <= 0)",
+            (*key, ships),
+        )
+
+    _transaction(release)
+
+
+@contextmanager
+def shipReservation(session, available, wanted, useFreighters=False):
+    """Context manager that reserves ships for the current task and releases the ones that are left when it exits, even if the shipment fails
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    available : int
+    wanted : int
+    useFreighters : bool
+
+    Yields
+    ------
+    ships : int
+        ships reserved, see ``reserveShips``
+    """
+    ships = reserveShips(session, available, wanted, useFreighters)
+    try:
+        yield ships
+    finally:
+        releaseShips(session, useFreighters=useFreighters)
@@ -3,6 +3,7 @@
 
 import os
 import signal
+import threading
 
 from ikabot.config import *
 from ikabot.helpers.botComm import *
@@ -12,8 +13,14 @@ def do_nothing(signal, frame):
     pass
 
 
+def _isMainThread():
+    # handlers can only be set from the main thread, tasks that run inside the worker process are in other threads
+    return threading.current_thread() is threading.main_thread()
+
+
 def deactivate_sigint():
-    signal.signal(signal.SIGINT, do_nothing)
+    if _isMainThread():
+        signal.signal(signal.SIGINT, do_nothing)
 
 
 def create_handler(s):
@@ -28,6 +35,8 @@ def setSignalsHandlers(s):
         signal.SIGINT,
         signal.SIGTERM,
     ]  # signal.SIGQUIT replaced with signal.SIGINT for compatibility
+    if not _isMainThread():
+        return
     for sgn in signals:
         signal.signal(sgn, create_handler(s))
 
@@ -44,6 +53,8 @@ def setInfoSignal(session, info):  # send process info to bot
     def _sendInfo(signum, frame):
         sendToBot(session, info)
 
+    if not _isMainThread():
+        return
     signal.signal(
         signal.SIGABRT, _sendInfo
     )  # kill -SIGUSR1 pid, SIGUSR1 replaced with SIGABRT for compatibility
@@ -0,0 +1,117 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Supervisor for the headless mode. After starting the jobs of a job file, ikabot keeps running as long as one of the jobs with ``restart: true`` does, and starts those jobs again when their process crashes. A crash is any non-zero exit status: tasks exit with status 1 when their error handler catches an exception (see ``Session.logout``). Processes ended with SIGKILL, which is what "Kill tasks" sends, are not restarted. Consecutive crashes are spaced out with an exponential backoff, and a task that keeps crashing is given up.
+"""
+
+import multiprocessing.connection
+import signal
+import time
+
+from ikabot.config import *
+from ikabot.helpers.botComm import sendToBot
+from ikabot.helpers.logging import getLogger
+
+logger = getLogger(__name__)
+
+# the supervisor wakes up at least this often to refresh its status
+_MAX_SLEEP = 60
+# windows has no signals, processes killed with taskkill exit with status 1
+_SIGKILL = getattr(signal, "SIGKILL", None)
+
+
+def getBackoff(crashes):
+    """
+    Parameters
+    ----------
+    crashes : int
+        consecutive crashes of the task, at least 1
+
+    Returns
+    -------
+    seconds : float
+        how long to wait before starting the task again
+    """
+    return min(supervisor_backoff * 2 ** (crashes - 1), supervisor_backoff_max)
+
+
+def _crashed(session, entry, reason):
+    if time.time() - entry["started"] >= supervisor_stable_time:
+        entry["crashes"] = 0
+    entry["crashes"] += 1
+    if entry["crashes"] > supervisor_max_restarts:
+        msg = "{} crashed {:d} times in a row ({}), it won't be restarted again".format(
+            entry["job"]["name"], entry["crashes"], reason
+        )
+        print(msg)
+        sendToBot(session, msg)
+        return
+    backoff = getBackoff(entry["crashes"])
+    entry["restart_at"] = time.time() + backoff
+    print("{} {}, restarting it in {:.0f}s".format(entry["job"]["name"], reason, backoff))
+
+
+def supervise(session, supervised, startJob):
+    """Waits for the supervised tasks and restarts the ones that crash. Returns when none of them is running or waiting to be restarted
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    supervised : list[tuple[dict, multiprocessing.Process]]
+        the jobs to supervise, with the process they were started in
+    startJob : Callable[[ikabot.web.session.Session, dict, int], multiprocessing.Process | None]
+        starts a job again and returns its process, or None if it could not be started. The last argument is the number of times the job has been restarted
+    """
+    entries = [
+        {
+            "job": job,
+            "process": process,
+            "started": time.time(),
+            "crashes": 0,
+            "restarts": 0,
+            "restart_at": None,
+        }
+        for job, process in supervised
+    ]
+    while True:
+        running = [entry for entry in entries if entry["process"] is not None]
+        waiting = [entry for entry in entries if entry["restart_at"] is not None]
+        if len(running) == 0 and len(waiting) == 0:
+            return
+        session.setStatus(
+            "supervising {:d} tasks, {:d} waiting to be restarted".format(
+                len(running), len(waiting)
+            )
+        )
+
+        timeout = _MAX_SLEEP
+        if waiting:
+            next_restart = min(entry["restart_at"] for entry in waiting)
+            timeout = min(max(next_restart - time.time(), 0), _MAX_SLEEP)
+        if running:
+            multiprocessing.connection.wait(
+                [entry["process"].sentinel for entry in running], timeout
+            )
+        else:
+            time.sleep(timeout)
+
+        for entry in running:
+            process = entry["process"]
+            if process.exitcode is None:
+                continue
+            entry["process"] = None
+            if process.exitcode == 0:
+                logger.info("{} finished".format(entry["job"]["name"]))
+            elif _SIGKILL is not None and process.exitcode == -_SIGKILL:
+                print("{} was killed, it won't be restarted".format(entry["job"]["name"]))
+            else:
+                _crashed(session, entry, "exited with status {}".format(process.exitcode))
+
+        for entry in waiting:
+            if entry["restart_at"] > time.time():
+                continue
+            entry["restart_at"] = None
+            entry["restarts"] += 1
+            entry["started"] = time.time()
+            entry["process"] = startJob(session, entry["job"], entry["restarts"])
+            if entry["process"] is None:
+                _crashed(session, entry, "could not be started")
@@ -0,0 +1,161 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Planner for resource distributions. Deciding which city sends how much to which other city is a transportation problem: every unit moved from a city with a surplus to a city that needs it costs the time ships spend carrying it, so the planner solves a min-cost flow (successive shortest paths) that moves as much as possible at the lowest total cost. Each resource has its own storage, so each one is solved on its own and the results are merged into one route per origin and destination, which then carries several resources at once.
+"""
+
+import math
+import re
+
+
+def cityDistance(origin, destination):
+    """
+    Parameters
+    ----------
+    origin : dict
+        a city, either from ``getCity`` ('x' and 'y') or from ``getIdsOfCities`` ('coords')
+    destination : dict
+
+    Returns
+    -------
+    distance : float
+        distance between the islands of both cities, 0 if they share an island. Travel times grow with it
+    """
+    (x1, y1), (x2, y2) = _coords(origin), _coords(destination)
+    return math.hypot(x1 - x2, y1 - y2)
+
+
+def _coords(city):
+    if "x" in city:
+        return int(city["x"]), int(city["y"])
+    x, y = re.search(r"(\d+)\s*:\s*(\d+)", city["coords"]).groups()
+    return int(x), int(y)
+
+
+def minCostTransport(supply, demand, cost):
+    """Moves as much as possible from the origins to the destinations with the lowest total cost
+    Parameters
+    ----------
+    supply : dict[str, int]
+        amount each origin can send
+    demand : dict[str, int]
+        amount each destination needs, it should not be more than the space it has
+    cost : Callable[[str, str], float]
+        cost of moving one unit from an origin to a destination
+
+    Returns
+    -------
+    flows : dict[tuple[str, str], int]
+        amount to send from each origin to each destination, only the pairs that send something
+    """
+    origins = [origin for origin in supply if supply[origin] > 0]
+    destinations = [destination for destination in demand if demand[destination] > 0]
+    # nodes: 0 is the source, then the origins, then the destinations and last the sink
+    source, sink = 0, len(origins) + len(destinations) + 1
+    graph = [[] for _ in range(sink + 1)]
+
+    def addEdge(a, b, capacity, unit_cost):
+        # an edge is [to, residual capacity, cost, index of the reverse edge in graph[to]]
+        graph[a].append([b, capacity, unit_cost, len(graph[b])])
+        graph[b].append([a, 0, -unit_cost, len(graph[a]) - 1])
+
+    total = sum(demand[destination] for destination in destinations)
+    for i, origin in enumerate(origins, start=1):
+        addEdge(source, i, supply[origin], 0)
+    for j, destination in enumerate(destinations, start=len(origins) + 1):
+        addEdge(j, sink, demand[destination], 0)
+    for i, origin in enumerate(origins, start=1):
+        for j, destination in enumerate(destinations, start=len(origins) + 1):
+            if origin != destination:
+                addEdge(i, j, total, cost(origin, destination))
+
+    while True:
+        # Bellman-Ford, the residual graph has negative costs
+        distance = [math.inf] * len(graph)
+        previous = [None] * len(graph)
+        distance[source] = 0
+        for _ in range(len(graph) - 1):
+            updated = False
+            for node in range(len(graph)):
+                if distance[node] == math.inf:
+                    continue
+                for index, (to, capacity, unit_cost, _) in enumerate(graph[node]):
+                    if capacity > 0 and distance[node] + unit_cost < distance[to]:
+                        distance[to] = distance[node] + unit_cost
+                        previous[to] = (node, index)
+                        updated = True
+            if not updated:
+                break
+        if distance[sink] == math.inf:
+            break
+
+        path = []
+        node = sink
+        while node != source:
+            node, index = previous[node]
+            path.append(graph[node][index])
+        amount = min(edge[1] for edge in path)
+        for edge in path:
+            edge[1] -= amount
+            graph[edge[0]][edge[3]][1] += amount
+
+    flows = {}
+    for i, origin in enumerate(origins, start=1):
+        for to, capacity, unit_cost, reverse in graph[i]:
+            if to == source:
+                continue
+            sent = graph[to][reverse][1]
+            if sent > 0:
+                flows[(origin, destinations[to - len(origins) - 1])] = sent
+    return flows
+
+
+def planDistribution(cities, supply, demand, cost=None):
+    """Plans the routes of a distribution of one or more resources
+    Parameters
+    ----------
+    cities : dict[str, dict]
+        every city taking part, by id
+    supply : dict[str, list[int]]
+        amount of each resource each city can send
+    demand : dict[str, list[int]]
+        amount of each resource each city needs
+    cost : Callable[[str, str], float]
+        cost of moving one unit between two cities, by default the distance between their islands
+
+    Returns
+    -------
+    routes : list[tuple]
+        routes as ``executeRoutes`` takes them, (originCity, destinationCity, islandId, wood, wine, marble, crystal, sulfur), at most one per origin and destination
+    """
+    if cost is None:
+        cost = lambda origin, destination: cityDistance(
+            cities[origin], cities[destination]
+        )
+    resources = max(
+        len(amounts) for amounts in list(supply.values()) + list(demand.values())
+    )
+    loads = {}
+    for resource in range(resources):
+        flows = minCostTransport(
+            {origin: amounts[resource] for origin, amounts in supply.items()},
+            {destination: amounts[resource] for destination, amounts in demand.items()},
+            cost,
+        )
+        for pair, amount in flows.items():
+            loads.setdefault(pair, [0] * resources)[resource] = amount
+
+    origins = list(supply)
+    destinations = list(demand)
+    pairs = sorted(
+        loads, key=lambda pair: (origins.index(pair[0]), destinations.index(pair[1]))
+    )
+    return [
+        (
+            cities[origin],
+            cities[destination],
+            cities[destination]["islandId"],
+            *loads[(origin, destination)],
+        )
+        for origin, destination in pairs
+    ]
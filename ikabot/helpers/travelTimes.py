@@ -0,0 +1,185 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Travel times between the cities of an account. The time a shipment takes depends on the bonuses of the origin city (trading port level, government, Poseidon, sea chart archive...), which are read from its `transport` view, and on the distance to the destination, which only depends on the coordinates of both islands. The bonuses of every city are kept in the local state database, so the travel time between any two cities is computed without requests. They are read again when the port level of the city changes and after ``travel_times_max_age`` seconds, since the government and the Poseidon miracle can't be seen from the city page.
+"""
+
+import time
+
+from ikabot.config import *
+from ikabot.helpers import jsonCodec
+from ikabot.helpers.database import getAccountKey, getConnection
+from ikabot.helpers.getJson import (
+    changeCurrentCity,
+    getTransportParameters,
+    getTransportTime,
+)
+from ikabot.helpers.logging import getLogger
+from ikabot.helpers.transportPlanner import cityDistance
+
+logger = getLogger(__name__)
+
+# cities on the same island are half the distance of two neighbouring islands apart, 10 minutes with the base speed of trade ships
+_SAME_ISLAND_DISTANCE = 0.5
+
+# parameters of every city, by account, as (parameters, port level, updated)
+_cache = {}
+
+
+def _load(session):
+    account = getAccountKey(session)
+    rows = getConnection().execute(
+        "SELECT city, parameters, port, updated FROM travel_parameters WHERE account = ?",
+        (account,),
+    ).fetchall()
+    _cache[account] = {
+        city: (jsonCodec.loads(parameters), port, updated)
+        for city, parameters, port, updated in rows
+    }
+    return _cache[account]
+
+
+def _cities(session):
+    cities = _cache.get(getAccountKey(session))
+    if cities is None:
+        cities = _load(session)
+    return cities
+
+
+def _portLevel(city):
+    # cities from getIdsOfCities don't have their buildings
+    if "position" not in city:
+        return None
+    return sum(
+        position.get("level") or 0
+        for position in city["position"]
+        if position.get("building") == "port"
+    )
+
+
+def _fetchParameters(session, originCityId, destinationCityId):
+    changeCurrentCity(session, originCityId)
+    data = {
+        "view": "transport",
+        "destinationCityId": destinationCityId,
+        "oldView": "city",
+        "backgroundView": "city",
+        "currentCityId": originCityId,
+        "templateView": "transport",
+        "actionRequest": actionRequest,
+        "ajax": "1",
+    }
+    parameters = getTransportParameters(session.post(params=data))
+    # the queue of the port changes with every shipment, it is not worth keeping
+    parameters["queueTime"] = 0
+    return parameters
+
+
+def refreshTravelTimes(session, cities):
+    """Reads the travel time parameters of the cities that don't have them yet or whose parameters are outdated. It sends one request per city at most, and none if everything is up to date
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    cities : dict[str, dict]
+        the cities of the account by id, either from ``getCity`` or from ``getIdsOfCities``. The port level is only checked for the ones from ``getCity``
+    """
+    if len(cities) < 2:
+        return
+    known = _load(session)
+    account = getAccountKey(session)
+    for cityId, city in cities.items():
+        cityId = str(cityId)
+        port = _portLevel(city)
+        if cityId in known:
+            _, known_port, updated = known[cityId]
+            outdated = time.time() - updated > travel_times_max_age
+            if not outdated and (port is None or port == known_port):
+                continue
+            if port is None:
+                port = known_port
+        # any other city will do, the view holds the bonuses of the origin
+        destinationCityId = next(str(other) for other in cities if str(other) != cityId)
+        parameters = _fetchParameters(session, cityId, destinationCityId)
+        updated = time.time()
+        getConnection().execute(
+            "INSERT OR REPLACE INTO travel_parameters (account, city, parameters, port, updated) VALUES (?, ?, ?, ?, ?)",
+            (account, cityId, jsonCodec.dumps(parameters), port, updated),
+        )
+        known[cityId] = (parameters, port, updated)
+
+
+def getTravelTime(session, origin, destination, totalResources=0, useFreighters=False):
+    """Gets how long a shipment between two cities of the account takes, without sending any request
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    origin : dict
+        a city of the account, either from ``getCity`` or from ``getIdsOfCities``
+    destination : dict
+    totalResources : int
+        total amount of resources that are sent, their loading time is included
+    useFreighters : bool
+
+    Returns
+    -------
+    seconds : int | None
+        loading time plus travel time, None if the parameters of the origin have never been read with ``refreshTravelTimes``
+    """
+    known = _cities(session).get(str(origin["id"]))
+    if known is None:
+        return None
+    distance = cityDistance(origin, destination)
+    if distance == 0:
+        distance = _SAME_ISLAND_DISTANCE
+    _, loadingTime, travelTime, _ = getTransportTime(
+        known[0], distance, totalResources, useFreighters
+    )
+    return loadingTime + travelTime
+
+
+def getTravelTimes(session, cities, useFreighters=False):
+    """Gets the travel times between every pair of cities of the account, reading the parameters that are missing or outdated first
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    cities : dict[str, dict]
+        the cities of the account by id, either from ``getCity`` or from ``getIdsOfCities``
+    useFreighters : bool
+
+    Returns
+    -------
+    travelTimes : dict[tuple[str, str], int]
+        seconds it takes to go from each city to each other city
+    """
+    refreshTravelTimes(session, cities)
+    return {
+        (str(originId), str(destinationId)): getTravelTime(
+            session, origin, destination, useFreighters=useFreighters
+        )
+        for originId, origin in cities.items()
+        for destinationId, destination in cities.items()
+        if str(originId) != str(destinationId)
+    }
+
+
+def travelTimeCost(session, cities):
+    """Gets a cost for ``planDistribution`` that prefers the routes with the shortest travel times
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    cities : dict[str, dict]
+        every city taking part in the distribution, by id
+
+    Returns
+    -------
+    cost : Callable[[str, str], int] | None
+        seconds it takes to go from one city to another. None if the travel time parameters of some city can't be read, so that ``planDistribution`` falls back to the distance between the islands
+    """
+    try:
+        travelTimes = getTravelTimes(session, cities)
+    except Exception:
+        logger.warning("Could not read the travel times, the distance between the islands is used instead", exc_info=True)
+        return None
+    if None in travelTimes.values():
+        return None
+    return lambda origin, destination: travelTimes[(str(origin), str(destination))]
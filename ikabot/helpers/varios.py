@@ -2,14 +2,42 @@
 # -*- coding: utf-8 -*-
 
 import math
+import os
 import random
 import re
+import threading
 import time
 from datetime import datetime
 from decimal import *
 
+from ikabot.helpers.scheduler import sleepUntil
+
 getcontext().prec = 30
 
+_UNICODE_ESCAPE = re.compile(r"u([0-9a-fA-F]{4})")
+
+
+# set by ikabot.helpers.worker in the threads that run tasks inside the worker process
+currentJob = threading.local()
+
+
+def getTaskId():
+    """Returns the id under which the current task is listed in the process list: its pid, or its job id if it runs inside the worker process
+    Returns
+    -------
+    task id : int
+    """
+    return getattr(currentJob, "id", None) or os.getpid()
+
+
+def inWorkerJob():
+    """Returns True if the current thread runs a task inside the worker process, where exiting the process would also end every other task
+    Returns
+    -------
+    in worker job : bool
+    """
+    return getattr(currentJob, "id", None) is not None
+
 
 def addThousandSeparator(num, character="."):
     """Formats the number into a string and adds a `character` for every thousand (eg. 3000 -> 3.000)
@@ -58,7 +86,7 @@ def daysHoursMinutes(totalSeconds):
 
 
 def wait(seconds, maxrandom=0):
-    """This function will wait the provided number of seconds plus a random number of seconds drawn from a log-normal distribution capped at maxrandom
+    """This function will wait the provided number of seconds plus a random number of seconds drawn from a log-normal distribution capped at maxrandom. The wait is registered in the scheduler of the process instead of sleeping on its own
     Parameters
     -----------
     seconds : int
@@ -73,7 +101,7 @@ def wait(seconds, maxrandom=0):
         jitter = min(random.lognormvariate(mu, 0.5), maxrandom)
     else:
         jitter = 0
-    time.sleep(seconds + jitter)
+    sleepUntil(time.time() + seconds + jitter)
 
 
 def getCurrentCityId(session):
@@ -128,9 +156,7 @@ def decodeUnicodeEscape(input_string):
     Returns:
     - str: The string with replaced Unicode escape sequences.
     """
-    return re.sub(
-        r"u([0-9a-fA-F]{4})", lambda x: chr(int(x.group(1), 16)), input_string
-    )
+    return _UNICODE_ESCAPE.sub(lambda x: chr(int(x.group(1), 16)), input_string)
 
 
 def timeStringToSec(time_string):
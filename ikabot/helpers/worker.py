@@ -0,0 +1,167 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Opt-in worker mode (``IKABOT_WORKER_MODE=1``). The tasks listed in ``config.worker_tasks`` spend nearly all their time sleeping, so instead of starting one process per task, which holds its own session, connection pool and copy of every imported module, they run as threads of a single worker process per account that shares one session. The session sends the requests of its threads one at a time, since the actionRequest token, the cached response and the current city of the game belong to the session and not to the task.
+"""
+
+import atexit
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import traceback
+
+from ikabot import config
+from ikabot.config import *
+from ikabot.helpers.logging import getLogger
+from ikabot.helpers.process import (
+    set_child_mode,
+    startHeartbeat,
+    unregisterTask,
+    updateProcessList,
+)
+from ikabot.helpers.rateLimit import setRequestPriority
+from ikabot.helpers.varios import currentJob
+
+logger = getLogger(__name__)
+
+# (process, connection) of the worker started by this menu
+_worker = None
+
+
+def isWorkerTask(function):
+    """Returns True if ``function`` should be run inside the worker process
+    Parameters
+    ----------
+    function : Callable
+        a task function of the main menu
+
+    Returns
+    -------
+    is worker task : bool
+    """
+    return worker_mode and function.__name__ in worker_tasks
+
+
+def runInWorker(session, function, name=None):
+    """Starts ``function`` as a thread of the worker process, starting the worker first if needed, and waits until the task fires its event, like the menu does with the tasks that run in their own process
+    Parameters
+    ----------
+    session : ikabot.web.session.Session
+    function : Callable
+        a task function of the main menu
+    name : str
+        name of the job that started the task, if it was started from a job file
+    """
+    global _worker
+    if _worker is None or not _worker[0].is_alive():
+        connection, worker_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=_workerMain,
+            args=(
+                session,
+                worker_connection,
+                connection,
+                sys.stdin.fileno(),
+                config.predetermined_input,
+            ),
+            name="worker",
+        )
+        process.start()
+        worker_connection.close()
+        # lets the worker know the menu is gone even if this process exits normally
+        atexit.register(connection.close)
+        _worker = (process, connection)
+    process, connection = _worker
+    connection.send((function, name))
+    while True:
+        try:
+            # the task may be reading from the terminal, so the menu must not return before it is done
+            connection.recv()
+            return
+        except KeyboardInterrupt:
+            continue
+        except EOFError:
+            _worker = None
+            return
+
+
+class _JobEvent:
+    """Stands in for the ``multiprocessing.Event`` that tasks receive, setting it gives the control of the terminal back to the menu"""
+
+    def __init__(self, connection, lock):
+        self.connection = connection
+        self.lock = lock
+        self.flag = False
+
+    def set(self):
+        if self.flag:
+            return
+        self.flag = True
+        with self.lock:
+            try:
+                self.connection.send(os.getpid())
+            except (OSError, EOFError):
+                # the menu has exited, nobody is waiting
+                pass
+
+    def is_set(self):
+        return self.flag
+
+
+def _runJob(session, function, name, event, stdin_fd):
+    job = threading.get_native_id()
+    currentJob.id = job
+    pid = os.getpid()
+    process = {
+        "pid": pid,
+        "job": job,
+        "action": function.__name__,
+        "date": time.time(),
+        "status": "started",
+    }
+    if name is not None:
+        process["name"] = name
+    updateProcessList(session, programprocesslist=[process])
+    setRequestPriority(request_priorities.get(function.__name__, "normal"))
+
+    try:
+        # every task wraps the fd it is given in its own sys.stdin and closes it, so each one gets a copy
+        function(session, event, os.dup(stdin_fd), config.predetermined_input)
+    except SystemExit:
+        pass
+    except Exception:
+        logger.error(
+            "Task {} failed in the worker process:\n{}".format(
+                function.__name__, traceback.format_exc()
+            )
+        )
+    finally:
+        event.set()
+        unregisterTask(session, [job])
+
+
+def _workerMain(session, connection, menu_connection, stdin_fd, predetermined_input):
+    # otherwise the pipe would never be closed when the menu exits
+    menu_connection.close()
+    config.predetermined_input = predetermined_input
+    set_child_mode(session)
+    startHeartbeat(session)
+    lock = threading.Lock()
+    threads = []
+    while True:
+        try:
+            function, name = connection.recv()
+        except (EOFError, OSError):
+            break
+        thread = threading.Thread(
+            target=_runJob,
+            args=(session, function, name, _JobEvent(connection, lock), stdin_fd),
+            name=function.__name__,
+        )
+        thread.start()
+        threads.append(thread)
+    # the menu has exited, the running tasks carry on and the process ends with the last one
+    for thread in threads:
+        thread.join()
@@ -10,9 +10,11 @@ import os
 import random
 import re
 import sys
+import threading
 import time
 import traceback
 from collections import deque
+from urllib.parse import parse_qs
 
 import requests
 from urllib3.exceptions import InsecureRequestWarning
@@ -21,13 +23,22 @@ from ikabot import config
 from ikabot.config import *
 from ikabot.helpers.aesCipher import *
 from ikabot.helpers.botComm import *
+from ikabot.helpers.fileLock import lockFile
 from ikabot.helpers.getJson import getCity
 from ikabot.helpers.gui import banner
 from ikabot.helpers.pedirInfo import read
-from ikabot.helpers.varios import getDateTime, lastloginTimetoString
+from ikabot.helpers.process import recordRequest, setTaskStatus, unregisterTask
+from ikabot.helpers.rateLimit import acquireRequest
+from ikabot.helpers.broker import BrokerUnavailable, brokerRequest
+from ikabot.helpers.varios import getDateTime, getTaskId, inWorkerJob, lastloginTimetoString
 from ikabot.helpers.apiComm import getNewBlackBoxToken
 from ikabot.helpers.lobbyDecaptcha import break_interactive_captcha
 
+# tasks that run inside the worker process share their Session, only one of them should log in again when it expires
+_sessionRenewalLock = threading.RLock()
+# taken while the request lock of a session is created in a process, so that all its threads get the same one
+_requestLockCreation = threading.Lock()
+
 
 class Session:
     def __init__(self):
@@ -36,10 +47,46 @@ class Session:
         self.blackbox = None
         self.logger = getLogger(__name__)
         self.requestHistory = deque(maxlen=5)  # keep last 5 requests in history
+        self.actionRequestToken = None  # last actionRequest token seen in a game server response
+        self.actionRequestTokenTime = 0
+        self.currentCityId = None  # city the game server has selected for this session, as seen in the last response that said so
+        self.lastRequestTime = 0  # used to discard pooled connections the game server has probably closed
+        self.lastResponse = None  # (cache key, time, html) of the last GET, see __cachedResponse
+        self.sessionRenewedTime = 0
+        self.broker = None  # (address, authkey) of the session broker the requests are sent through, see ikabot.helpers.broker
+        self.failedTasks = set()  # ids of the tasks whose error handler set ``failed``
+        self.requestLock = None  # (pid, lock) held while a request is sent, see __requestLock
         # disable ssl verification warning
         requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
         self.__login()
 
+    @property
+    def failed(self):
+        """Set by the error handler of a task, its process then exits with status 1 so the supervisor can tell it crashed. Each task sharing the session has its own flag"""
+        return getTaskId() in self.failedTasks
+
+    @failed.setter
+    def failed(self, value):
+        if value:
+            self.failedTasks.add(getTaskId())
+        else:
+            self.failedTasks.discard(getTaskId())
+
+    def __getstate__(self):
+        # locks can't be sent to other processes, each one gets its own
+        state = self.__dict__.copy()
+        state["requestLock"] = None
+        return state
+
+    def __requestLock(self):
+        """Returns the lock that serializes the requests of this process. The tasks of the worker and the broker send requests from several threads, and the actionRequest token, the cached response and the current city must not change while one of them is sent"""
+        # a lock inherited by a forked child could be held by a thread that doesn't exist there
+        if self.requestLock is None or self.requestLock[0] != os.getpid():
+            with _requestLockCreation:
+                if self.requestLock is None or self.requestLock[0] != os.getpid():
+                    self.requestLock = (os.getpid(), threading.RLock())
+        return self.requestLock[1]
+
     def setStatus(self, message):
         """This function will modify the current tasks status message that appears in the table on the main menu
         Parameters
@@ -48,17 +95,7 @@ class Session:
         """
         self.logger.info(f"Changing status to {message}")
 
-        # read from file
-        sessionData = self.getSessionData()
-        try:
-            fileList = sessionData["processList"]
-        except KeyError:
-            fileList = []
-        # modify current process' status message
-        [p.update({"status": message}) for p in fileList if p["pid"] == os.getpid()]
-        # dump back to session data
-        sessionData["processList"] = fileList
-        self.setSessionData(sessionData)
+        setTaskStatus(self, getTaskId(), message)
 
     def __genRand(self):
         return hex(random.randint(0, 65535))[2:]
@@ -107,19 +144,17 @@ class Session:
         return self.__isExpired(html)
 
     def __saveNewCookies(self):
-        sessionData = self.getSessionData()
-
         cookie_dict = dict(self.s.cookies.items())
-        sessionData["cookies"] = cookie_dict
-
-        self.setSessionData(sessionData)
+        self.updateSessionData(lambda sessionData: sessionData.update({"cookies": cookie_dict}))
 
     def __getCookie(self, sessionData=None):
         if sessionData is None:
             sessionData = self.getSessionData()
         try:
             cookie_dict = sessionData["cookies"]
-            self.s = requests.Session()
+            # keep the same requests session so that pooled connections to the game server are reused
+            self.s.cookies.clear()
+            self.__invalidateToken()
             self.__update_proxy(sessionData=sessionData)
             self.s.headers.clear()
             self.s.headers.update(self.headers)
@@ -216,6 +251,7 @@ class Session:
         self.user_agent = user_agents[sum(ord(c) for c in self.mail) % len(user_agents)]
 
         self.s = requests.Session()
+        self.__invalidateToken()
         self.cipher = AESCipher(self.mail, self.password)
         self.logger.info("__login()")
 
@@ -749,6 +785,7 @@ class Session:
 
         self.host = "s{}-{}.ikariam.gameforge.com".format(self.mundo, self.servidor)
         self.urlBase = "https://{}/index.php?".format(self.host)
+        self.__mountGameAdapter()
 
         self.headers = {
             "Host": self.host,
@@ -959,23 +996,31 @@ class Session:
 
     def __sessionExpired(self):
         self.logger.info("__sessionExpired()")
+        expired_at = time.time()
         self.__backoff()
 
-        sessionData = self.getSessionData()
+        # only one process logs in again, the others pick up its cookies when they get the lock
+        with _sessionRenewalLock, lockFile(ikaFile + ".login"):
+            if self.sessionRenewedTime > expired_at:
+                # another task sharing this session renewed it in the meantime
+                return
 
-        try:
-            if self.s.cookies["PHPSESSID"] != sessionData["cookies"]["PHPSESSID"]:
-                self.__getCookie(sessionData)
-            else:
+            sessionData = self.getSessionData()
+
+            try:
+                if self.s.cookies["PHPSESSID"] != sessionData["cookies"]["PHPSESSID"]:
+                    self.__getCookie(sessionData)
+                else:
+                    try:
+                        self.__login(3)
+                    except Exception:
+                        self.__sessionExpired()
+            except KeyError:
                 try:
                     self.__login(3)
                 except Exception:
                     self.__sessionExpired()
-        except KeyError:
-            try:
-                self.__login(3)
-            except Exception:
-                self.__sessionExpired()
+            self.sessionRenewedTime = time.time()
 
     def __proxy_error(self):
         sessionData = self.getSessionData()
@@ -1007,11 +1052,25 @@ class Session:
         if "proxy" in sessionData and sessionData["proxy"]["set"] is True:
             obj.proxies.update(sessionData["proxy"]["conf"])
         else:
-            obj.proxies.update({})
+            obj.proxies.clear()
+
+    def __mountGameAdapter(self):
+        """Mounts a keep-alive connection pool for the game server on the requests session, so that game requests don't pay a new TCP and TLS handshake each time"""
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=game_pool_size
+        )
+        self.s.mount("https://{}/".format(self.host), adapter)
 
-    def __checkCookie(self):
+    def __dropIdleConnections(self):
+        """Discards the pooled connections to the game server if they have been idle for too long, the server has most likely closed them already"""
+        if time.time() - self.lastRequestTime > game_pool_idle_timeout:
+            self.s.get_adapter(self.urlBase).close()
+        self.lastRequestTime = time.time()
+
+    def __checkCookie(self, sessionData=None):
         self.logger.info("__checkCookie()")
-        sessionData = self.getSessionData()
+        if sessionData is None:
+            sessionData = self.getSessionData()
 
         try:
             if self.s.cookies["PHPSESSID"] != sessionData["cookies"]["PHPSESSID"]:
@@ -1022,18 +1081,66 @@ class Session:
             except Exception:
                 self.__sessionExpired()
 
+    def __harvestToken(self, text):
+        """Stores the actionRequest token carried by a game server response, if there is one. Both full pages and ajax responses (``updateGlobalData``) carry the token that must be used for the next request. The current city is stored as well, so that tasks know when they have to switch cities
+        Parameters
+        ----------
+        text : str
+            body of the response received from the game server
+        """
+        match = re.search(r'actionRequest"?:\s*"(.*?)"', text)
+        if match is not None:
+            self.actionRequestToken = match.group(1)
+            self.actionRequestTokenTime = time.time()
+        match = re.search(r'currentCityId"?:\s*"?(\d+)', text)
+        if match is not None:
+            self.currentCityId = match.group(1)
+
+    def __invalidateToken(self):
+        self.actionRequestToken = None
+        self.actionRequestTokenTime = 0
+
     def __token(self):
-        """Generates a valid actionRequest token from the session
+        """Returns a valid actionRequest token. The last token harvested from a response is used if it is fresh enough, otherwise the city page is fetched to obtain a new one
         Returns
         -------
         token : str
             a string representing a valid actionRequest token
         """
-        html = self.get()
-        return re.search(r'actionRequest"?:\s*"(.*?)"', html).group(1)
+        if (
+            self.actionRequestToken is not None
+            and time.time() - self.actionRequestTokenTime < actionRequest_max_age
+        ):
+            token = self.actionRequestToken
+        else:
+            html = self.get(cache=False)
+            token = re.search(r'actionRequest"?:\s*"(.*?)"', html).group(1)
+        # every token can only be used once, the response to the post will carry the next one
+        self.__invalidateToken()
+        return token
+
+    def __responseCacheKey(self, url, params, noIndex, noQuery):
+        """Returns the key under which the response to a GET can be cached, or None if it can't be cached"""
+        query = {k: v[-1] for k, v in parse_qs(url.split("?")[-1]).items()}
+        query.update(params)
+        if "action" in query or "function" in query:
+            return None
+        view = query.get("view", "")
+        if view not in response_cache_ttl:
+            return None
+        return (view, url, tuple(sorted((str(k), str(v)) for k, v in params.items())), noIndex, noQuery)
+
+    def __cachedResponse(self, key):
+        """Returns the html of the last GET if it was sent with the same ``key`` no longer than the TTL of its view ago. Only the last response is kept, so a hit means no other request (which could have changed the game state, e.g. the current city) was sent in between"""
+        if key is None or self.lastResponse is None:
+            return None
+        last_key, last_time, html = self.lastResponse
+        if last_key != key or time.time() - last_time > response_cache_ttl[key[0]]:
+            return None
+        return html
 
     def get(
-        self, url='', params={}, ignoreExpire=False, noIndex=False, fullResponse=False, noQuery=False, **kwargs
+        self, url='', params={}, ignoreExpire=False, noIndex=False, fullResponse=False, noQuery=False, cache=True, **kwargs
     ):
         """Sends get request to ikariam
         Parameters
@@ -1048,14 +1155,58 @@ class Session:
             if set to True it will remove 'index.php' from the end of urlBase before appending url params and sending the get request
         fullResponse : bool
             if set to True it will retrn the full response object instead of the string containing html or json data
+        cache : bool
+            if set to False the request will always be sent, even if the same page was just received. Responses are only reused for the views listed in ``config.response_cache_ttl``
 
         Returns
         -------
         html : str
             response from the server
         """
-        self.__checkCookie()
-        self.__update_proxy()
+        if self.broker is not None and self.padre is False:
+            try:
+                return brokerRequest(
+                    self,
+                    "get",
+                    dict(
+                        url=url,
+                        params=params,
+                        ignoreExpire=ignoreExpire,
+                        noIndex=noIndex,
+                        fullResponse=fullResponse,
+                        noQuery=noQuery,
+                        cache=cache,
+                        **kwargs,
+                    ),
+                )
+            except BrokerUnavailable:
+                pass
+
+        cache_key = None
+        if cache and not fullResponse and not kwargs:
+            cache_key = self.__responseCacheKey(url, params, noIndex, noQuery)
+            with self.__requestLock():
+                html = self.__cachedResponse(cache_key)
+            if html is not None:
+                return html
+        # the rate limit is waited for before taking the lock, so a task waiting for a token doesn't hold back the other threads of the process
+        acquireRequest(self)
+        with self.__requestLock():
+            return self.__get(
+                url, params, ignoreExpire, noIndex, fullResponse, noQuery, cache_key, **kwargs
+            )
+
+    def __get(self, url, params, ignoreExpire, noIndex, fullResponse, noQuery, cache_key, **kwargs):
+        # another thread may have received the same page while this one waited for the lock
+        html = self.__cachedResponse(cache_key)
+        if html is not None:
+            return html
+        self.lastResponse = None
+
+        sessionData = self.getSessionData()
+        self.__checkCookie(sessionData)
+        self.__update_proxy(sessionData=sessionData)
+        self.__dropIdleConnections()
 
         if noIndex:
             url = self.urlBase.replace("index.php", "") + url
@@ -1063,6 +1214,8 @@ class Session:
             url = self.urlBase + url
         if noQuery:
             url = url.replace('?','')
+        # the token for the first attempt was taken by the caller
+        retry = False
         while True:
             try:
                 self.requestHistory.append(
@@ -1077,6 +1230,9 @@ class Session:
                     }
                 )
                 self.logger.debug(f"About to send: {str(self.requestHistory[-1])}")
+                if retry:
+                    acquireRequest(self)
+                retry = True
                 response = self.s.get(
                     url, params=params, verify=config.do_ssl_verify, timeout=300, **kwargs
                 )
@@ -1086,7 +1242,9 @@ class Session:
                     "headers": dict(response.headers),
                     "text": response.text,
                 }
+                recordRequest(len(response.content), response.elapsed.total_seconds())
                 html = response.text
+                self.__harvestToken(html)
 
                # modifica redirect 302
                 if response.status_code == 302:
@@ -1116,6 +1274,8 @@ class Session:
                 except Exception:
                     pass
 
+                if cache_key is not None:
+                    self.lastResponse = (cache_key, time.time(), html)
                 if fullResponse:
                     return response
                 else:
@@ -1151,11 +1311,40 @@ class Session:
         html : str
             response from the server
         """
+        if self.broker is not None and self.padre is False:
+            try:
+                return brokerRequest(
+                    self,
+                    "post",
+                    dict(
+                        url=url,
+                        payloadPost=payloadPost,
+                        params=params,
+                        ignoreExpire=ignoreExpire,
+                        noIndex=noIndex,
+                        fullResponse=fullResponse,
+                        noQuery=noQuery,
+                        **kwargs,
+                    ),
+                )
+            except BrokerUnavailable:
+                pass
+
+        acquireRequest(self)
+        with self.__requestLock():
+            return self.__post(
+                url, payloadPost, params, ignoreExpire, noIndex, fullResponse, noQuery, **kwargs
+            )
+
+    def __post(self, url, payloadPost, params, ignoreExpire, noIndex, fullResponse, noQuery, **kwargs):
         url_original = url
         payloadPost_original = payloadPost
         params_original = params
-        self.__checkCookie()
-        self.__update_proxy()
+        self.lastResponse = None
+        sessionData = self.getSessionData()
+        self.__checkCookie(sessionData)
+        self.__update_proxy(sessionData=sessionData)
+        self.__dropIdleConnections()
 
         # add the request id
         token = self.__token()
@@ -1171,6 +1360,8 @@ class Session:
             url = self.urlBase + url
         if noQuery:
             url = url.replace('?','')
+        # the token for the first attempt was taken by the caller
+        retry = False
         while True:
             try:
                 self.requestHistory.append(
@@ -1185,6 +1376,9 @@ class Session:
                     }
                 )
                 self.logger.debug(f"About to send: {str(self.requestHistory[-1])}")
+                if retry:
+                    acquireRequest(self)
+                retry = True
                 response = self.s.post(
                     url,
                     data=payloadPost,
@@ -1199,7 +1393,10 @@ class Session:
                     "headers": dict(response.headers),
                     "text": response.text,
                 }
+                recordRequest(len(response.content), response.elapsed.total_seconds())
                 resp = response.text
+                if "TXT_ERROR_WRONG_REQUEST_ID" not in resp:
+                    self.__harvestToken(resp)
 
                 #  modifica redirect 302
                 if response.status_code == 302:
@@ -1221,6 +1418,8 @@ class Session:
                     assert self.__isExpired(resp) is False
                 if "TXT_ERROR_WRONG_REQUEST_ID" in resp:
                     self.logger.warning("got TXT_ERROR_WRONG_REQUEST_ID, bad actionRequest")
+                    # another process probably used the session in between, fetch a new token
+                    self.__invalidateToken()
                     return self.post(
                         url=url_original,
                         payloadPost=payloadPost_original,
@@ -1249,10 +1448,14 @@ class Session:
                 time.sleep(ConnectionError_wait)
 
     def logout(self):
-        """This function kills the current (chlid) process"""
+        """This function kills the current (chlid) process, or ends the current task if it runs inside the worker process. The exit status is 1 if the task failed"""
         self.logger.info("logout()")
         if self.padre is False:
-            os._exit(0)
+            if inWorkerJob():
+                sys.exit()
+            # os._exit skips the finally clause of runTask
+            unregisterTask(self)
+            os._exit(1 if self.failed else 0)
 
     def setSessionData(self, sessionData, shared=False):
         """Encrypts relevant session data and writes it to the .ikabot file
@@ -1269,6 +1472,17 @@ class Session:
         """Gets relevant session data from the .ikabot file"""
         return self.cipher.getSessionData(self)
 
+    def updateSessionData(self, function, shared=False):
+        """Atomically modifies the session data stored in the .ikabot file
+        Parameters
+        ----------
+        function : Callable[[dict], None]
+            function that receives the current session data and modifies it in place, it is called while holding the lock of the .ikabot file
+        shared : bool
+            Indicates if the shared data among all accounts asociated with the user-password should be modified instead
+        """
+        self.cipher.updateSessionData(self, function, shared=shared)
+
 
 def normal_get(url, params={}):
     """Sends a get request to provided url
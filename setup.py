@@ -14,7 +14,7 @@ setuptools.setup(
     include_package_data=True,
     packages=setuptools.find_packages(),
     install_requires=["requests", "requests[socks]", "cryptography", "psutil", "python-dotenv"],
-    extras_require={"webServer": ["flask"]},
+    extras_require={"webServer": ["flask"], "fast": ["orjson"], "jobs": ["pyyaml"]},
     entry_points={
         "console_scripts": ["ikabot=ikabot.command_line:main"],
     },
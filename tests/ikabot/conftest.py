@@ -0,0 +1,16 @@
+import threading
+
+import pytest
+
+from ikabot.helpers import database
+
+
+@pytest.fixture
+def stateDatabase(tmp_path, monkeypatch):
+    """Points the local state database to an empty file of the test, with no connection opened yet"""
+    monkeypatch.setattr(database, "ikaDatabaseFile", str(tmp_path / ".ikabot.db"))
+    monkeypatch.setattr(database, "_local", threading.local())
+    yield tmp_path
+    connection = getattr(database._local, "connection", None)
+    if connection is not None:
+        connection.close()
@@ -13,6 +13,12 @@ def test_distribute_evenly(monkeypatch, session, cities):
     monkeypatch.setattr(
         ikabot.function.distributeResources, "getCity", lambda city: city
     )
+    # plan by distance instead of reading the travel times from the game
+    monkeypatch.setattr(
+        ikabot.function.distributeResources,
+        "travelTimeCost",
+        lambda session, cities: None,
+    )
 
     # test
     routes = distribute_evenly(
@@ -0,0 +1,110 @@
+import multiprocessing
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from ikabot.config import ikaFile
+from ikabot.helpers import aesCipher
+from ikabot.helpers.aesCipher import AESCipher
+
+
+def _increment(mail, times):
+    session = _session(mail)
+    cipher = AESCipher(mail, "password")
+    for _ in range(times):
+        cipher.updateSessionData(
+            session, lambda data: data.update({"counter": data.get("counter", 0) + 1})
+        )
+
+
+def _session(mail):
+    return SimpleNamespace(
+        mail=mail, username="player", mundo="1", servidor="en", padre=True
+    )
+
+
+@pytest.fixture(autouse=True)
+def ikabot_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ikaFile).write_text("")
+    return tmp_path / ikaFile
+
+
+def test_set_and_get_session_data():
+    session = _session("player@mail.com")
+    cipher = AESCipher(session.mail, "password")
+
+    cipher.setSessionData(session, {"cookies": {"PHPSESSID": "abc"}})
+
+    assert cipher.getSessionData(session) == {
+        "cookies": {"PHPSESSID": "abc"},
+        "shared": {},
+    }
+
+
+def test_set_session_data_keeps_other_entries(ikabot_file):
+    first = _session("first@mail.com")
+    second = _session("second@mail.com")
+    first_cipher = AESCipher(first.mail, "password")
+    second_cipher = AESCipher(second.mail, "password")
+    first_cipher.setSessionData(first, {"value": 1})
+    second_cipher.setSessionData(second, {"value": 2})
+    first_line = ikabot_file.read_text().split("\n")[0]
+
+    second_cipher.setSessionData(second, {"value": 3})
+
+    lines = ikabot_file.read_text().split("\n")
+    assert len(lines) == 2
+    assert lines[0] == first_line
+    assert second_cipher.getSessionData(second)["value"] == 3
+
+
+def test_delete_session_data(ikabot_file):
+    session = _session("player@mail.com")
+    cipher = AESCipher(session.mail, "password")
+    cipher.setSessionData(session, {"value": 1})
+
+    cipher.deleteSessionData(session)
+
+    assert ikabot_file.read_text() == ""
+    assert cipher.getSessionData(session) == {}
+
+
+def test_concurrent_updates_are_not_lost():
+    mail = "player@mail.com"
+    processes = [
+        multiprocessing.Process(target=_increment, args=(mail, 10)) for _ in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    cipher = AESCipher(mail, "password")
+    assert cipher.getSessionData(_session(mail))["counter"] == 40
+
+
+def test_parsed_data_is_cached_until_the_file_changes(ikabot_file, monkeypatch):
+    session = _session("player@mail.com")
+    cipher = AESCipher(session.mail, "password")
+    cipher.setSessionData(session, {"cookies": {"PHPSESSID": "abc"}})
+    # files written within the last second are not cached
+    old = time.time() - 10
+    os.utime(ikabot_file, (old, old))
+    parsed = []
+    loads = aesCipher.jsonCodec.loads
+    monkeypatch.setattr(
+        aesCipher.jsonCodec, "loads", lambda data: parsed.append(data) or loads(data)
+    )
+
+    first = cipher.getSessionData(session)
+    first["cookies"]["PHPSESSID"] = "changed by the caller"
+    second = cipher.getSessionData(session)
+
+    assert len(parsed) == 1
+    assert second["cookies"]["PHPSESSID"] == "abc"
+
+    cipher.setSessionData(session, {"cookies": {"PHPSESSID": "def"}})
+    assert cipher.getSessionData(session)["cookies"]["PHPSESSID"] == "def"
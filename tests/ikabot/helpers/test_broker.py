@@ -0,0 +1,48 @@
+import pytest
+
+from ikabot.helpers import broker
+
+
+class FakeSession:
+    mail = "broker@mail.com"
+    username = "player"
+    mundo = "1"
+    servidor = "en"
+
+    def __init__(self):
+        self.padre = True
+        self.broker = None
+
+    def get(self, url="", **kwargs):
+        if url == "fail":
+            raise ValueError("bad url")
+        return "html of {} from {}".format(url, self.broker)
+
+
+@pytest.fixture
+def session(stateDatabase):
+    session = FakeSession()
+    broker.startBroker(session)
+    yield session
+    broker._broker.kill()
+    broker._broker.join()
+    broker._broker = None
+
+
+def test_requests_are_sent_by_the_broker(session):
+    assert session.broker is not None
+    # the session of the broker sends the requests itself
+    assert broker.brokerRequest(session, "get", {"url": "a"}) == "html of a from None"
+
+    with pytest.raises(ValueError, match="bad url"):
+        broker.brokerRequest(session, "get", {"url": "fail"})
+
+
+def test_unreachable_broker(session):
+    broker._broker.kill()
+    broker._broker.join()
+    broker._local.connection = None
+
+    with pytest.raises(broker.BrokerUnavailable):
+        broker.brokerRequest(session, "get", {"url": "a"})
+    assert session.broker is None
@@ -0,0 +1,63 @@
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from ikabot.helpers.checkpoint import (
+    claimCheckpoint,
+    deleteCheckpoint,
+    getInterruptedCheckpoints,
+    saveCheckpoint,
+)
+from ikabot.helpers.process import updateProcessList
+from ikabot.helpers.varios import currentJob
+
+
+@pytest.fixture
+def session(stateDatabase):
+    return SimpleNamespace(
+        mail="player@mail.com", username="player", mundo="1", servidor="en", padre=True
+    )
+
+
+def test_interrupted_checkpoint_is_claimed_once(session):
+    # a task that is not in the process list, as if it had died
+    currentJob.id = 4000000
+    try:
+        saveCheckpoint(session, "test", "module:function", {"left": [1, 2]}, info="2 left")
+    finally:
+        del currentJob.id
+
+    (checkpoint,) = [c for c in getInterruptedCheckpoints(session) if c["kind"] == "test"]
+    assert checkpoint["state"] == {"left": [1, 2]}
+    assert checkpoint["info"] == "2 left"
+
+    assert claimCheckpoint(session, checkpoint) is True
+    assert claimCheckpoint(session, checkpoint) is False
+    # the checkpoint now belongs to this process, which is running
+    assert [c for c in getInterruptedCheckpoints(session) if c["kind"] == "test"] == []
+
+    deleteCheckpoint(session, "test")
+
+
+def test_checkpoint_of_a_reused_task_id_is_interrupted(session):
+    currentJob.id = 4000000
+    try:
+        saveCheckpoint(session, "test", "module:function", {})
+    finally:
+        del currentJob.id
+
+    # a task that was started after the checkpoint was saved got the same id
+    updateProcessList(
+        session,
+        [{"pid": os.getpid(), "job": 4000000, "action": "other", "date": time.time() + 60}],
+    )
+    assert [c["task"] for c in getInterruptedCheckpoints(session)] == [4000000]
+
+    # the task that saved it is still running
+    updateProcessList(
+        session,
+        [{"pid": os.getpid(), "job": 4000000, "action": "test", "date": time.time() - 60}],
+    )
+    assert getInterruptedCheckpoints(session) == []
@@ -0,0 +1,184 @@
+import json
+import pickle
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from ikabot.helpers import getJson, jsonCodec, naval
+from ikabot.helpers.getJson import getCity, getHeaderData, getIsland
+from ikabot.helpers.models import WorldMapIsland
+
+
+def test_get_header_data():
+    data = json.dumps(
+        [
+            [
+                "updateGlobalData",
+                {
+                    "actionRequest": "abc",
+                    "headerData": {
+                        "relatedCity": {"owncity": 1},
+                        "currentResources": {
+                            "citizens": 120.5,
+                            "population": 900,
+                            "resource": 1000,
+                            "1": 200,
+                            "2": 300,
+                            "3": 400,
+                            "4": 500,
+                        },
+                        "maxResources": {"resource": 8000, "1": 8000},
+                        "resourceProduction": 0.25,
+                        "tradegoodProduction": 0.1,
+                        "producedTradegood": "3",
+                        "wineSpendings": 12,
+                        "freeTransporters": 7,
+                        "maxTransporters": 40,
+                        "freeFreighters": 1,
+                        "maxFreighters": 2,
+                        "gold": "12345.67",
+                        "scientistsUpkeep": -10,
+                        "income": 50,
+                        "upkeep": -15,
+                    },
+                },
+            ]
+        ]
+    )
+
+    header = getHeaderData(data)
+
+    assert header["isOwnCity"] is True
+    assert header["availableResources"] == [1000, 200, 300, 400, 500]
+    assert header["storageCapacity"] == 8000
+    assert header["citizens"] == 120
+    assert header["woodProductionPerHour"] == Decimal(900)
+    assert header["tradegoodProductionPerHour"] == Decimal(360)
+    assert header["producedTradegood"] == 3
+    assert header["freeTransporters"] == 7
+    assert header["maxTransporters"] == 40
+    assert header["freeFreighters"] == 1
+    assert header["maxFreighters"] == 2
+    assert header["gold"] == Decimal("12345.67")
+    assert header["goldProductionPerHour"] == Decimal(25)
+
+
+def test_get_city():
+    background = {
+        "name": "Polis u00e9",
+        "id": 123,
+        "ownerId": "9",
+        "ownerName": "Player",
+        "islandId": "55",
+        "islandXCoord": "10",
+        "islandYCoord": "20",
+        "position": [
+            {"name": "Town hall", "level": "10", "building": "townHall"},
+            {"name": "Port", "level": "5", "building": "port constructionSite"},
+            {"building": "buildingGround sea"},
+        ],
+    }
+    html = (
+        '<li id="js_GlobalMenu_citizens">1,234</span>\n'
+        "currentResources: JSON.parse('{\\\"citizens\\\":1234,\\\"resource\\\":1500,\\\"2\\\":300,\\\"1\\\":200,\\\"4\\\":500,\\\"3\\\":400}'),\n"
+        "maxResources: JSON.parse('{\\\"resource\\\":8000,\\\"1\\\":8000}'),\n"
+        "branchOfficeResources: JSON.parse('{\\\"resource\\\":\\\"10\\\",\\\"1\\\":\\\"20\\\",\\\"2\\\":\\\"0\\\",\\\"3\\\":\\\"0\\\",\\\"4\\\":\\\"5\\\"}'),\n"
+        "wineSpendings: 42,\n"
+        '[["updateBackgroundData", ' + json.dumps(background) + '],["updateTemplateData",{}]]'
+    )
+
+    city = getCity(html)
+
+    assert city["id"] == "123"
+    assert city["name"] == city["cityName"] == "Polis é"
+    assert (city["x"], city["y"]) == (10, 20)
+    assert city["availableResources"] == [1500, 200, 300, 400, 500]
+    assert city["storageCapacity"] == 8000
+    assert city["freeCitizens"] == 1234
+    assert city["wineConsumptionPerHour"] == 42
+    assert city["resourcesListedForSale"] == [10, 20, 0, 0, 5]
+    assert city["freeSpaceForResources"] == [6490, 7780, 7700, 7600, 7495]
+    assert city["position"][1]["isBusy"] is True
+    assert city["position"][1]["building"] == "port"
+    assert city["position"][2]["building"] == "empty"
+    assert city["position"][2]["type"] == "sea"
+
+
+def test_get_island():
+    data = {
+        "id": "55",
+        "name": "Phytios",
+        "xCoord": "10",
+        "yCoord": "20",
+        "tradegood": 3,
+        "cities": [
+            {"type": "city", "name": "Polis", "id": 1, "level": 5, "ownerId": "9", "ownerName": "Player", "ownerAllyTag": "ABC", "state": ""},
+            {"type": "buildplace", "name": "Building ground", "id": -1, "buildplace_type": "normal"},
+        ],
+        "someNewKey": 1,
+    }
+    html = "ajax.Responder, " + json.dumps([["updateGlobalData", {}], ["updateBackgroundData", data]]) + ");"
+
+    island = getIsland(html)
+
+    assert (island["x"], island["y"], island["tipo"]) == (10, 20, "3")
+    assert island["someNewKey"] == 1
+    city, empty = island["cities"]
+    assert (city["Id"], city["Name"], city["AllyTag"]) == ("9", "Player", "ABC")
+    assert "AllyTag" in city and "AllyId" not in city
+    assert city.get("AllyId") is None
+    assert empty["type"] == "empty" and empty["_type"] == "normal"
+    city["islandId"] = island["id"]
+    assert city["islandId"] == "55"
+    # aliases aren't stored, so they aren't serialized either
+    dumped = jsonCodec.loads(jsonCodec.dumps(island))
+    assert "x" not in dumped and "Name" not in dumped["cities"][0]
+    assert dumped["cities"][0]["islandId"] == "55"
+    assert pickle.loads(pickle.dumps(island)) == island
+    assert not hasattr(city, "__dict__")
+
+
+def test_missing_freighters_are_read_from_the_city_page(monkeypatch):
+    header = {"freeTransporters": 7, "maxTransporters": 40}
+    monkeypatch.setattr(
+        naval,
+        "getHeaderSnapshot",
+        lambda session: {**header, "freeFreighters": None, "maxFreighters": None},
+    )
+    session = SimpleNamespace(
+        get=lambda: '<li id="js_GlobalMenu_freeFreighters">3</li><li id="js_GlobalMenu_maxFreighters">5</li>'
+    )
+
+    assert naval.getAvailableFreighters(session) == 3
+    assert naval.getTotalFreighters(session) == 5
+
+
+def test_header_snapshot_changes_city_without_the_city_page(monkeypatch):
+    requests = []
+    monkeypatch.setattr(getJson, "getHeaderData", lambda data: data)
+    session = SimpleNamespace(
+        currentCityId="1",
+        post=lambda params: requests.append(("post", params["function"], params["cityId"])),
+        get=lambda url, noIndex: requests.append(("get", url)) or "header",
+    )
+
+    assert getJson.getHeaderSnapshot(session, "2") == "header"
+    assert requests == [
+        ("post", "changeCurrentCity", "2"),
+        ("get", "view=updateGlobalData&ajax=1"),
+    ]
+    assert session.currentCityId == "2"
+
+
+def test_world_map_island_names_can_be_written():
+    island = WorldMapIsland({"x": 1, "y": 2, "resourceType": 1, "miracleType": 0})
+    assert (island["resourceName"], island["miracleName"]) == ("Wine", "")
+
+    island["resourceName"] = "Sulfur"
+    island["miracleName"] = "Hephaestus' Forge"
+    assert (island["resourceType"], island["miracleType"]) == (4, 1)
+    assert island["resourceName"] == "Sulfur"
+
+    with pytest.raises(ValueError, match="Unknown resource name"):
+        island["resourceName"] = "Gold"
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from ikabot.helpers.jobs import loadJobs
+
+
+def loginDaily(session, event, stdin_fd, predetermined_input):
+    pass
+
+
+def autoPirate(session, event, stdin_fd, predetermined_input):
+    pass
+
+
+functions = {"loginDaily": loginDaily, "autoPirate": autoPirate}
+
+
+def test_load_jobs(tmp_path):
+    path = tmp_path / "jobs.json"
+    path.write_text(
+        json.dumps(
+            {
+                "jobs": [
+                    {"function": "loginDaily", "restart": True},
+                    {"function": "autoPirate", "name": "pirates", "inputs": [5, "n"]},
+                    {"function": "autoPirate", "enabled": False},
+                ]
+            }
+        )
+    )
+
+    jobs = loadJobs(str(path), functions)
+
+    assert jobs == [
+        {"function": loginDaily, "name": "loginDaily", "inputs": [], "restart": True},
+        {"function": autoPirate, "name": "pirates", "inputs": [5, "n"], "restart": False},
+    ]
+
+
+def test_load_jobs_reports_every_error(tmp_path):
+    path = tmp_path / "jobs.json"
+    path.write_text(
+        json.dumps(
+            [
+                {"function": "fly"},
+                {"function": "loginDaily", "inputs": [{"a": 1}]},
+                {"function": "autoPirate", "when": "now"},
+            ]
+        )
+    )
+
+    with pytest.raises(ValueError) as error:
+        loadJobs(str(path), functions)
+
+    message = str(error.value)
+    assert "job 1: unknown function 'fly'" in message
+    assert "job 2 (loginDaily): inputs must be" in message
+    assert "job 3: unknown keys when" in message
+
+
+def test_load_yaml_jobs(tmp_path):
+    pytest.importorskip("yaml")
+    path = tmp_path / "jobs.yaml"
+    path.write_text("jobs:\n  - function: autoPirate\n    inputs: [5, n]\n")
+
+    assert loadJobs(str(path), functions) == [
+        {"function": autoPirate, "name": "autoPirate", "inputs": [5, "n"], "restart": False}
+    ]
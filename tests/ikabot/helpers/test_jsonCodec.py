@@ -0,0 +1,86 @@
+import json
+import os
+import random
+import timeit
+
+import pytest
+
+from ikabot.helpers import jsonCodec
+
+
+@pytest.fixture()
+def island_payload():
+    random.seed(0)
+    cities = [
+        {
+            "type": "city",
+            "name": "City {}".format(i),
+            "id": i,
+            "level": random.randint(1, 40),
+            "ownerId": str(random.randint(1, 10**6)),
+            "ownerName": "Player é{}".format(i),
+            "ownerAllyId": random.randint(0, 5000),
+            "ownerAllyTag": "TAG",
+            "hasTreaties": 0,
+            "actions": [],
+            "state": "",
+            "viewAble": 1,
+        }
+        for i in range(17)
+    ]
+    island = {
+        "id": "55",
+        "name": "Isla",
+        "xCoord": "10",
+        "yCoord": "20",
+        "tradegood": 3,
+        "cities": cities,
+        "avatarScores": {
+            city["ownerId"]: {"place": str(random.randint(1, 9999))} for city in cities
+        },
+    }
+    return json.dumps([["updateGlobalData", {}], ["updateBackgroundData", island]] * 40)
+
+
+def test_loads_matches_standard_library(island_payload):
+    assert jsonCodec.loads(island_payload) == json.loads(island_payload)
+
+
+def test_loads_accepts_control_characters_in_strings():
+    assert jsonCodec.loads('{"text": "line\nbreak"}') == {"text": "line\nbreak"}
+
+
+def test_dumps_round_trip():
+    obj = {"a": [1, 2.5, None, True], "b": {"c": "é"}, 3: "int key"}
+
+    assert json.loads(jsonCodec.dumps(obj)) == json.loads(json.dumps(obj))
+
+
+
+# ajax responses of the island and city views, with made-up players and names
+_DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+@pytest.mark.parametrize("view", ["island", "city"])
+def test_decode_benchmark(view):
+    with open(os.path.join(_DATA, view + ".json"), encoding="utf-8") as file:
+        payload = file.read()
+    decoders = {"json": lambda data: json.loads(data, strict=False)}
+    if jsonCodec.orjson is not None:
+        decoders["orjson"] = jsonCodec.orjson.loads
+    if jsonCodec.ujson is not None:
+        decoders["ujson"] = jsonCodec.ujson.loads
+
+    assert jsonCodec.loads(payload) == json.loads(payload)
+    # only reported, timings are too noisy to assert on
+    times = {
+        name: min(timeit.repeat(lambda: decode(payload), number=200, repeat=3)) / 200
+        for name, decode in decoders.items()
+    }
+    print(
+        "{} view ({} bytes): ".format(view, len(payload.encode("utf-8")))
+        + ", ".join(
+            "{} {:.1f}us ({:.1f}x)".format(name, seconds * 1e6, times["json"] / seconds)
+            for name, seconds in times.items()
+        )
+    )
@@ -0,0 +1,164 @@
+from types import SimpleNamespace
+
+import pytest
+
+import ikabot.helpers.planRoutes as planRoutes
+from ikabot.helpers import shipLedger
+from ikabot.helpers.database import getAccountKey, getConnection
+from ikabot.helpers.planRoutes import executeRoutes, splitShips
+
+
+def test_split_ships():
+    assert splitShips(30, [5, 10, 4]) == [5, 10, 4]
+    assert splitShips(10, [10, 10]) == [5, 5]
+    assert splitShips(10, [20, 5, 1]) == [9, 1, 0]
+    assert sum(splitShips(7, [3, 3, 3])) == 7
+
+
+def city(id, resources):
+    return {
+        "id": id,
+        "name": "City" + id,
+        "availableResources": list(resources),
+        "freeSpaceForResources": [10000] * 5,
+    }
+
+
+def reservedShips(session):
+    return [
+        ships
+        for (ships,) in getConnection().execute(
+            "SELECT ships FROM ship_reservations WHERE account = ?",
+            (getAccountKey(session),),
+        )
+    ]
+
+
+@pytest.fixture
+def shipping(stateDatabase, monkeypatch):
+    """Routes between three cities with a port of 10 ships. ``sendGoods`` records what it is asked to send and the ships reserved at that moment"""
+    cities = {
+        "1": city("1", [1500, 0, 0, 0, 0]),
+        "2": city("2", [0, 0, 0, 0, 0]),
+        "3": city("3", [0, 0, 1000, 0, 0]),
+    }
+    session = SimpleNamespace(
+        get=lambda url: url.split("=")[-1],
+        setStatus=lambda message: None,
+        mail="routes@mail.com",
+        username="player",
+        mundo="1",
+        servidor="en",
+        cities=cities,
+        sent=[],
+        reserved=[],
+        arrivals=[],
+        inPort=[],
+    )
+
+    def sendGoods(session, *args):
+        session.reserved.append(reservedShips(session))
+        if session.inPort and not session.inPort.pop(0):
+            return False
+        session.sent.append(args[:5])
+        return True
+
+    def waitForArrival(session, useFreighters):
+        session.arrivals.append(reservedShips(session))
+        return 10
+
+    monkeypatch.setattr(planRoutes, "getShipCapacity", lambda session: (500, 50000))
+    monkeypatch.setattr(planRoutes, "waitForArrival", waitForArrival)
+    monkeypatch.setattr(planRoutes, "getCity", lambda html: cities[html])
+    monkeypatch.setattr(planRoutes, "sendGoods", sendGoods)
+    monkeypatch.setattr(planRoutes.time, "sleep", lambda seconds: None)
+    return session
+
+
+def test_routes_share_the_available_ships(shipping):
+    cities = shipping.cities
+    routes = [
+        (cities["1"], cities["2"], "100", 1000, 0, 0, 0, 0),
+        (cities["1"], cities["3"], "100", 500, 0, 0, 0, 0),
+        (cities["3"], cities["2"], "100", 0, 0, 1000, 0, 0),
+    ]
+    executeRoutes(shipping, routes, resumable=False)
+
+    # the three routes are loaded in a single round, without waiting for ships in between
+    assert shipping.sent == [
+        ("1", "2", "100", 2, [1000, 0, 0, 0, 0]),
+        ("1", "3", "100", 1, [500, 0, 0, 0, 0]),
+        ("3", "2", "100", 2, [0, 0, 1000, 0, 0]),
+    ]
+    assert shipping.arrivals == [[]]
+    # each route reserved its ships only while they were loaded
+    assert shipping.reserved == [[2], [1], [2]]
+    assert reservedShips(shipping) == []
+
+
+def test_ships_are_waited_for_without_a_reservation(shipping):
+    cities = shipping.cities
+    # the first load finds the port empty
+    shipping.inPort = [False]
+    executeRoutes(
+        shipping, [(cities["1"], cities["2"], "100", 1000, 0, 0, 0, 0)], resumable=False
+    )
+
+    assert shipping.sent == [("1", "2", "100", 2, [1000, 0, 0, 0, 0])]
+    assert shipping.arrivals == [[], []]
+    assert reservedShips(shipping) == []
+
+
+def test_ships_reserved_by_other_tasks_are_not_loaded(shipping, monkeypatch):
+    cities = shipping.cities
+    with monkeypatch.context() as otherTask:
+        otherTask.setattr(shipLedger, "getTaskId", lambda: -1)
+        shipLedger.reserveShips(shipping, 10, 9)
+
+    executeRoutes(
+        shipping, [(cities["1"], cities["2"], "100", 1000, 0, 0, 0, 0)], resumable=False
+    )
+
+    # one ship is left for this task, the route goes in two rounds
+    assert shipping.sent == [("1", "2", "100", 1, [500, 0, 0, 0, 0])] * 2
+
+
+def loadingSession(*feedbacks):
+    session = SimpleNamespace(currentCityId="1", posts=[])
+
+    def post(params):
+        session.posts.append(params)
+        if params["function"] == "changeCurrentCity":
+            return ""
+        return '[[], [], [], ["provideFeedback", [{}]]]'.format(feedbacks[len(session.posts) // 2 - 1])
+
+    session.post = post
+    return session
+
+
+def test_send_goods_switches_city_and_loads_what_the_origin_has():
+    session = loadingSession('{"type": 10}')
+    origin = {"availableResources": [800, 0, 300, 0, 0]}
+
+    planRoutes.sendGoods(session, "3", "2", "100", 1, [500, 0, 0, 0, 0], originCity=origin)
+
+    change, load = session.posts
+    # the current city is changed even if the session thinks it is there already
+    assert change["function"] == "changeCurrentCity"
+    assert change["cityId"] == "3"
+    assert session.currentCityId == "3"
+    assert load["cargo_resource"] == 500
+    assert load["cargo_tradegood2"] == 0
+    assert "cargo_tradegood1" not in load
+
+
+def test_send_goods_does_not_wait_for_ships():
+    origin = {"availableResources": [800, 0, 0, 0, 0]}
+
+    session = loadingSession('{"type": 11}')
+    assert planRoutes.sendGoods(session, "1", "2", "100", 1, [500, 0, 0, 0, 0], originCity=origin) is False
+    assert len(session.posts) == 2
+
+    session = loadingSession('{"type": 12, "text": "Not enough resources"}')
+    with pytest.raises(Exception, match="Not enough resources"):
+        planRoutes.sendGoods(session, "1", "2", "100", 1, [500, 0, 0, 0, 0], originCity=origin)
@@ -0,0 +1,83 @@
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from ikabot.config import process_heartbeat_timeout
+from ikabot.helpers.database import getAccountKey, getConnection
+from ikabot.helpers import process as processModule
+from ikabot.helpers.process import (
+    recordRequest,
+    reportUsage,
+    setTaskStatus,
+    taskUsage,
+    unregisterTask,
+    updateProcessList,
+)
+from ikabot.helpers.varios import currentJob, getTaskId
+
+
+@pytest.fixture
+def session(stateDatabase):
+    return SimpleNamespace(
+        mail="player@mail.com", username="player", mundo="1", servidor="en", padre=True
+    )
+
+
+def test_worker_jobs_are_listed_separately(session):
+    pid = os.getpid()
+    jobs = [
+        {"pid": pid, "job": job, "action": "loginDaily", "date": time.time(), "status": "started"}
+        for job in (101, 102)
+    ]
+    updateProcessList(session, programprocesslist=jobs)
+
+    currentJob.id = 102
+    try:
+        setTaskStatus(session, getTaskId(), "sleeping")
+    finally:
+        del currentJob.id
+
+    process_list = updateProcessList(session)
+    assert {process["job"]: process["status"] for process in process_list} == {
+        101: "started",
+        102: "sleeping",
+    }
+    assert getTaskId() == pid
+
+    unregisterTask(session, [101])
+    assert [process["job"] for process in updateProcessList(session)] == [102]
+
+
+def test_tasks_without_heartbeat_are_dropped(session):
+    updateProcessList(
+        session,
+        programprocesslist=[
+            {"pid": os.getpid(), "job": 201, "action": "alertAttacks", "status": "started"}
+        ],
+    )
+    getConnection().execute(
+        "UPDATE processes SET heartbeat = ? WHERE task = 201",
+        (time.time() - process_heartbeat_timeout - 1,),
+    )
+
+    assert updateProcessList(session) == []
+
+
+def test_usage_is_reported_per_task(session, monkeypatch):
+    monkeypatch.setattr(processModule, "_usage", {})
+    updateProcessList(
+        session,
+        programprocesslist=[
+            {"pid": os.getpid(), "action": "alertAttacks", "status": "started"}
+        ],
+    )
+    for elapsed in (0.1, 0.3):
+        recordRequest(2048, elapsed)
+    reportUsage(session)
+
+    (process,) = updateProcessList(session)
+    assert (process["requests"], process["received"]) == (2, 4096)
+    assert process["cpu"] > 0 and process["rss"] > 0
+    assert taskUsage(process).startswith("2 req 4KB 200ms cpu ")
@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import pytest
+
+from ikabot.helpers import rateLimit
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(stateDatabase, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rateLimit, "time", clock)
+    monkeypatch.setattr(rateLimit, "request_rate", 2.0)
+    monkeypatch.setattr(rateLimit, "request_burst", 4)
+    monkeypatch.setattr(rateLimit, "request_priority_reserve", {"high": 0, "normal": 1, "bulk": 2})
+    return clock
+
+
+@pytest.fixture
+def session():
+    session = SimpleNamespace(
+        mail="limit@mail.com", username="player", mundo="1", servidor="en"
+    )
+    return session
+
+
+def test_burst_then_rate(clock, session):
+    for _ in range(4):
+        rateLimit.acquireRequest(session, "high")
+    assert clock.sleeps == []
+
+    rateLimit.acquireRequest(session, "high")
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+
+def test_bulk_yields_to_higher_priorities(clock, session):
+    rateLimit.acquireRequest(session, "high")
+    rateLimit.acquireRequest(session, "high")
+    # 2 tokens left: a normal request still fits, a bulk one has to leave 2 in the bucket
+    rateLimit.acquireRequest(session, "normal")
+    assert clock.sleeps == []
+
+    rateLimit.acquireRequest(session, "bulk")
+    assert sum(clock.sleeps) == pytest.approx(1.0)
+
+
+def test_unknown_priority():
+    with pytest.raises(ValueError):
+        rateLimit.setRequestPriority("urgent")
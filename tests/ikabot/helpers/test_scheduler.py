@@ -0,0 +1,26 @@
+import threading
+import time
+
+from ikabot.helpers.scheduler import sleepUntil
+
+
+def test_sleepers_wake_up_in_order():
+    woken = []
+    now = time.time()
+    threads = [
+        threading.Thread(target=lambda d=delay: sleepUntil(now + d) or woken.append(d))
+        for delay in (0.3, 0.1, 0.2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2)
+
+    assert woken == [0.1, 0.2, 0.3]
+    assert time.time() - now >= 0.3
+
+
+def test_past_time_returns_at_once():
+    now = time.time()
+    sleepUntil(now - 10)
+    assert time.time() - now < 1
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import pytest
+
+from ikabot.helpers import shipLedger
+
+
+@pytest.fixture
+def session(stateDatabase):
+    return SimpleNamespace(
+        mail="ships@mail.com", username="player", mundo="1", servidor="en"
+    )
+
+
+def task(monkeypatch, task_id):
+    monkeypatch.setattr(shipLedger, "getTaskId", lambda: task_id)
+
+
+def test_tasks_share_the_ships(session, monkeypatch):
+    task(monkeypatch, 1)
+    assert shipLedger.reserveShips(session, 10, 6) == 6
+    task(monkeypatch, 2)
+    assert shipLedger.reserveShips(session, 10, 6) == 4
+    task(monkeypatch, 3)
+    assert shipLedger.reserveShips(session, 10, 6) == 0
+    # freighters are reserved apart
+    assert shipLedger.reserveShips(session, 3, 6, useFreighters=True) == 3
+
+    # the first task sends 2 ships and gives back the rest
+    task(monkeypatch, 1)
+    shipLedger.releaseShips(session, 2)
+    task(monkeypatch, 3)
+    assert shipLedger.reserveShips(session, 8, 6) == 0
+    task(monkeypatch, 1)
+    shipLedger.releaseShips(session)
+    task(monkeypatch, 3)
+    assert shipLedger.reserveShips(session, 8, 6) == 4
+
+
+def test_reservation_is_released_on_failure(session, monkeypatch):
+    task(monkeypatch, 1)
+    with pytest.raises(RuntimeError):
+        with shipLedger.shipReservation(session, 5, 5) as ships:
+            assert ships == 5
+            raise RuntimeError("the shipment failed")
+    task(monkeypatch, 2)
+    assert shipLedger.reserveShips(session, 5, 5) == 5
+
+
+def test_reservations_of_dead_tasks_expire(session, monkeypatch):
+    task(monkeypatch, 1)
+    monkeypatch.setattr(shipLedger, "ship_reservation_timeout", -1)
+    assert shipLedger.reserveShips(session, 5, 5) == 5
+    task(monkeypatch, 2)
+    assert shipLedger.reserveShips(session, 5, 5) == 5
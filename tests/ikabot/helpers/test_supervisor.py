@@ -0,0 +1,45 @@
+import multiprocessing
+import os
+from types import SimpleNamespace
+
+from ikabot.helpers import supervisor
+
+
+def _exit(status):
+    os._exit(status)
+
+
+def _start(status):
+    process = multiprocessing.Process(target=_exit, args=(status,))
+    process.start()
+    return process
+
+
+def test_crashed_task_is_restarted_until_the_crash_loop_limit(monkeypatch):
+    monkeypatch.setattr(supervisor, "supervisor_backoff", 0.01)
+    monkeypatch.setattr(supervisor, "supervisor_max_restarts", 3)
+    messages = []
+    monkeypatch.setattr(supervisor, "sendToBot", lambda session, msg: messages.append(msg))
+    session = SimpleNamespace(setStatus=lambda message: None)
+    restarts = []
+
+    def startJob(session, job, restart):
+        restarts.append(restart)
+        return _start(job["status"])
+
+    crashing = {"name": "crashing", "status": 1}
+    finishing = {"name": "finishing", "status": 0}
+    supervisor.supervise(
+        session, [(crashing, _start(1)), (finishing, _start(0))], startJob
+    )
+
+    assert restarts == [1, 2, 3]
+    assert messages == [
+        "crashing crashed 4 times in a row (exited with status 1), it won't be restarted again"
+    ]
+
+
+def test_backoff_is_capped(monkeypatch):
+    monkeypatch.setattr(supervisor, "supervisor_backoff", 30)
+    monkeypatch.setattr(supervisor, "supervisor_backoff_max", 600)
+    assert [supervisor.getBackoff(crashes) for crashes in (1, 2, 3, 6)] == [30, 60, 120, 600]
@@ -0,0 +1,41 @@
+from ikabot.helpers.transportPlanner import minCostTransport, planDistribution
+
+
+def city(id, x, y):
+    return {"id": id, "name": "City" + id, "x": str(x), "y": str(y), "islandId": id}
+
+
+def test_closest_pairs_are_used():
+    positions = {"a": 0, "b": 10, "x": 1, "y": 11}
+    flows = minCostTransport(
+        {"a": 100, "b": 100},
+        {"x": 100, "y": 100},
+        lambda origin, destination: abs(positions[origin] - positions[destination]),
+    )
+    # unlike a greedy pairing, the result does not depend on the order of the cities
+    assert flows == {("a", "x"): 100, ("b", "y"): 100}
+
+    flows = minCostTransport(
+        {"b": 100, "a": 100},
+        {"y": 100, "x": 100},
+        lambda origin, destination: abs(positions[origin] - positions[destination]),
+    )
+    assert flows == {("a", "x"): 100, ("b", "y"): 100}
+
+
+def test_supply_is_split_and_capped():
+    flows = minCostTransport({"a": 150}, {"x": 100, "y": 100}, lambda o, d: 1 if d == "x" else 2)
+    assert flows == {("a", "x"): 100, ("a", "y"): 50}
+
+
+def test_resources_of_a_pair_share_one_route():
+    cities = {"1": city("1", 0, 0), "2": city("2", 0, 5), "3": city("3", 50, 50)}
+    routes = planDistribution(
+        cities,
+        {"1": [100, 0, 30, 0, 0], "3": [100, 0, 0, 0, 0]},
+        {"2": [150, 0, 30, 0, 0]},
+    )
+    assert routes == [
+        (cities["1"], cities["2"], "2", 100, 0, 30, 0, 0),
+        (cities["3"], cities["2"], "2", 50, 0, 0, 0, 0),
+    ]
@@ -0,0 +1,122 @@
+from types import SimpleNamespace
+
+import pytest
+
+from ikabot.helpers import travelTimes
+from ikabot.helpers.transportPlanner import planDistribution
+
+TRANSPORT_VIEW = """
+'transporterSpeed': 60,
+'worldBonus': 1,
+'governmentBonus': 1,
+'poseidonEffect': 0,
+'marineChartArchiveBonus': 1,
+'minimumJourneyDuration': 600,
+'distance': 3,
+'fleetJourneyTime': 72000,
+'queueTime': 0,
+'loadingSpeed': 10,
+"""
+
+
+class FakeSession(SimpleNamespace):
+    transportView = TRANSPORT_VIEW
+
+    def post(self, params={}, **kwargs):
+        if params.get("view") == "transport":
+            self.views.append(params["currentCityId"])
+            return self.transportView
+        return ""
+
+
+@pytest.fixture
+def session(stateDatabase, monkeypatch):
+    monkeypatch.setattr(travelTimes, "_cache", {})
+    return FakeSession(
+        mail="travel@mail.com",
+        username="player",
+        mundo="1",
+        servidor="en",
+        currentCityId=None,
+        views=[],
+    )
+
+
+def city(id, x, y, port):
+    return {
+        "id": id,
+        "x": x,
+        "y": y,
+        "islandId": "{}:{}".format(x, y),
+        "position": [{"building": "port", "level": port}, {"building": "empty"}],
+    }
+
+
+def test_parameters_are_read_once(session):
+    cities = {"1": city("1", 10, 10, 5), "2": city("2", 13, 14, 5)}
+
+    times = travelTimes.getTravelTimes(session, cities)
+    assert sorted(session.views) == ["1", "2"]
+    # 5 islands away, 20 minutes each
+    assert times[("1", "2")] == 5 * 1200
+    assert times[("2", "1")] == 5 * 1200
+
+    session.views.clear()
+    assert travelTimes.getTravelTimes(session, cities) == times
+    assert session.views == []
+
+
+def test_lookup_needs_no_request(session):
+    cities = {"1": city("1", 10, 10, 5), "2": city("2", 10, 10, 5)}
+    travelTimes.refreshTravelTimes(session, cities)
+    session.views.clear()
+    # a new process reads them from the database
+    travelTimes._cache.clear()
+
+    assert travelTimes.getTravelTime(session, cities["1"], cities["2"]) == 600
+    assert travelTimes.getTravelTime(session, cities["1"], cities["2"], 1000) == 700
+    assert session.views == []
+    assert travelTimes.getTravelTime(session, {"id": "3", "x": 1, "y": 1}, cities["1"]) is None
+
+
+def test_port_level_change_refreshes_the_city(session):
+    cities = {"1": city("1", 10, 10, 5), "2": city("2", 13, 14, 5)}
+    travelTimes.refreshTravelTimes(session, cities)
+    session.views.clear()
+
+    cities["2"] = city("2", 13, 14, 6)
+    travelTimes.refreshTravelTimes(session, cities)
+    assert session.views == ["2"]
+
+    # cities without buildings don't tell the port level
+    session.views.clear()
+    travelTimes.refreshTravelTimes(
+        session, {"1": {"id": "1", "coords": "[10:10]"}, "2": {"id": "2", "coords": "[13:14]"}}
+    )
+    assert session.views == []
+
+
+def test_outdated_parameters_are_read_again(session, monkeypatch):
+    cities = {"1": city("1", 10, 10, 5), "2": city("2", 13, 14, 5)}
+    travelTimes.refreshTravelTimes(session, cities)
+    session.views.clear()
+
+    monkeypatch.setattr(travelTimes, "travel_times_max_age", -1)
+    travelTimes.refreshTravelTimes(session, cities)
+    assert sorted(session.views) == ["1", "2"]
+
+
+def test_distance_is_used_without_parameters(session):
+    session.transportView = "<html>maintenance</html>"
+    cities = {
+        "1": city("1", 10, 10, 5),
+        "2": city("2", 13, 14, 5),
+        "3": city("3", 10, 11, 5),
+    }
+    assert travelTimes.travelTimeCost(session, cities) is None
+
+    # the distribution is still planned, with the closest city
+    supply = {"2": [100, 0, 0, 0, 0], "3": [100, 0, 0, 0, 0]}
+    demand = {"1": [100, 0, 0, 0, 0]}
+    routes = planDistribution(cities, supply, demand, travelTimes.travelTimeCost(session, cities))
+    assert [(route[0]["id"], route[1]["id"]) for route in routes] == [("3", "1")]
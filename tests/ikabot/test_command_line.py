@@ -0,0 +1,46 @@
+import subprocess
+import sys
+
+from ikabot.command_line import job_functions, loadFunction
+
+_IMPORT_TIME = """
+import sys, time
+start = time.perf_counter()
+import ikabot.command_line
+{extra}
+print(time.perf_counter() - start)
+print(",".join(m for m in sys.modules if m.startswith("ikabot.function.")))
+"""
+
+_IMPORT_ALL = """
+for path in ikabot.command_line.job_functions.values():
+    ikabot.command_line.loadFunction(path)
+"""
+
+
+def _importTime(extra):
+    times = []
+    for _ in range(3):
+        output = subprocess.run(
+            [sys.executable, "-c", _IMPORT_TIME.format(extra=extra)],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.splitlines()
+        times.append(float(output[-2]))
+    return min(times), output[-1].split(",")
+
+
+def test_every_task_can_be_loaded():
+    for name, path in job_functions.items():
+        assert loadFunction(path).__name__ == name
+
+
+def test_task_modules_are_imported_lazily():
+    lazy_time, lazy_modules = _importTime("")
+    eager_time, eager_modules = _importTime(_IMPORT_ALL)
+
+    print("import time: {:.3f}s lazy, {:.3f}s importing every task".format(lazy_time, eager_time))
+    assert "ikabot.function.dumpWorld" not in lazy_modules
+    assert "ikabot.function.constructionList" not in lazy_modules
+    assert len(lazy_modules) < len(eager_modules)
@@ -0,0 +1,288 @@
+import datetime
+import multiprocessing
+import pickle
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+
+import ikabot.web.session as sessionModule
+from ikabot.config import actionRequest
+from ikabot.helpers import broker, rateLimit
+from ikabot.helpers.logging import getLogger
+from ikabot.web.session import Session
+
+CITY_PAGE = 'view: "city", actionRequest: "{}", currentCityId: 1'
+
+
+class FakeRequests:
+    """Stands for the requests.Session of the game session, answers with the given responses in order"""
+
+    def __init__(self):
+        self.responses = []
+        self.sent = []
+        self.proxies = {}
+        self.headers = {}
+
+    def _send(self, method, url, params, data):
+        self.sent.append((method, url, dict(params or {}), dict(data or {})))
+        text = self.responses.pop(0)
+        return SimpleNamespace(
+            text=text,
+            content=text.encode(),
+            status_code=200,
+            headers={},
+            elapsed=datetime.timedelta(0),
+        )
+
+    def get(self, url, params=None, **kwargs):
+        return self._send("GET", url, params, None)
+
+    def post(self, url, data=None, params=None, **kwargs):
+        return self._send("POST", url, params, data)
+
+    def get_adapter(self, url):
+        return SimpleNamespace(close=lambda: None)
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(sessionModule, "acquireRequest", lambda session: None)
+    monkeypatch.setattr(sessionModule, "recordRequest", lambda size, elapsed: None)
+    # a logged in session, without logging in
+    session = Session.__new__(Session)
+    session.padre = True
+    session.broker = None
+    session.logger = getLogger(__name__)
+    session.requestHistory = deque(maxlen=5)
+    session.actionRequestToken = None
+    session.actionRequestTokenTime = 0
+    session.currentCityId = None
+    session.lastRequestTime = time.time()
+    session.lastResponse = None
+    session.sessionRenewedTime = 0
+    session.failedTasks = set()
+    session.requestLock = None
+    session.urlBase = "https://s1-en.ikariam.gameforge.com/index.php?"
+    session.s = FakeRequests()
+    session.getSessionData = lambda: {}
+    session._Session__checkCookie = lambda sessionData=None: None
+    session._Session__update_proxy = lambda **kwargs: None
+    return session
+
+
+def post(session):
+    return session.post(params={"action": "header", "actionRequest": actionRequest})
+
+
+def test_harvested_token_is_reused(session):
+    session.s.responses = [CITY_PAGE.format("first"), "[]"]
+    session.get("view=city&cityId=1")
+    post(session)
+
+    # the token of the page is used right away, no page is fetched to get one
+    assert [method for method, *_ in session.s.sent] == ["GET", "POST"]
+    assert session.s.sent[1][2]["actionRequest"] == "first"
+    assert session.currentCityId == "1"
+
+
+def test_token_is_used_once(session):
+    session.s.responses = [
+        CITY_PAGE.format("first"),
+        "[]",
+        CITY_PAGE.format("second"),
+        "[]",
+    ]
+    session.get("view=city&cityId=1")
+    post(session)
+    # the response of the post carried no token, a new one is fetched
+    post(session)
+
+    assert [method for method, *_ in session.s.sent] == ["GET", "POST", "GET", "POST"]
+    assert session.s.sent[3][2]["actionRequest"] == "second"
+
+
+def test_token_is_refetched_on_wrong_request_id(session):
+    session.s.responses = [
+        CITY_PAGE.format("stale"),
+        'TXT_ERROR_WRONG_REQUEST_ID actionRequest: "ignored"',
+        CITY_PAGE.format("fresh"),
+        "[]",
+    ]
+    session.get("view=city&cityId=1")
+    post(session)
+
+    assert [method for method, *_ in session.s.sent] == ["GET", "POST", "GET", "POST"]
+    assert session.s.sent[1][2]["actionRequest"] == "stale"
+    assert session.s.sent[3][2]["actionRequest"] == "fresh"
+
+
+def test_old_token_is_not_trusted(session):
+    session.s.responses = [CITY_PAGE.format("old"), CITY_PAGE.format("new"), "[]"]
+    session.get("view=city&cityId=1")
+    session.actionRequestTokenTime -= sessionModule.actionRequest_max_age + 1
+    post(session)
+
+    assert session.s.sent[2][2]["actionRequest"] == "new"
+
+
+def test_repeated_get_is_served_from_memory(session):
+    session.s.responses = [CITY_PAGE.format("first")]
+    first = session.get("view=city&cityId=1")
+
+    assert session.get("view=city&cityId=1") == first
+    assert len(session.s.sent) == 1
+
+
+def test_cache_is_keyed_by_request(session):
+    session.s.responses = [CITY_PAGE.format("first"), CITY_PAGE.format("second")]
+    session.get("view=city&cityId=1")
+    session.get("view=city&cityId=2")
+
+    assert len(session.s.sent) == 2
+
+
+def test_uncached_views_and_actions_are_always_sent(session):
+    session.s.responses = ["island", "island", "action", "action"]
+    session.get("view=island&islandId=1")
+    session.get("view=island&islandId=1")
+    session.get("view=city&action=header")
+    session.get("view=city&action=header")
+
+    assert len(session.s.sent) == 4
+
+
+def test_cached_response_expires(session):
+    session.s.responses = [CITY_PAGE.format("first"), CITY_PAGE.format("second")]
+    session.get("view=city&cityId=1")
+    key, sent, html = session.lastResponse
+    session.lastResponse = (key, sent - sessionModule.response_cache_ttl["city"] - 1, html)
+
+    assert session.get("view=city&cityId=1") == CITY_PAGE.format("second")
+    assert len(session.s.sent) == 2
+
+
+def test_post_invalidates_the_cache(session):
+    session.s.responses = [CITY_PAGE.format("first"), "[]", CITY_PAGE.format("second")]
+    session.get("view=city&cityId=1")
+    post(session)
+
+    assert session.get("view=city&cityId=1") == CITY_PAGE.format("second")
+    assert [method for method, *_ in session.s.sent] == ["GET", "POST", "GET"]
+
+
+def test_cache_can_be_skipped(session):
+    session.s.responses = [CITY_PAGE.format("first"), CITY_PAGE.format("second")]
+    session.get("view=city&cityId=1")
+
+    assert session.get("view=city&cityId=1", cache=False) == CITY_PAGE.format("second")
+
+
+def watchOverlaps(session):
+    """Makes the requests of the session slow and returns a list that gets an item whenever two of them are sent at the same time"""
+    sending = []
+    overlapped = []
+    send = session.s._send
+
+    def slowSend(method, url, params, data):
+        sending.append(1)
+        if len(sending) > 1:
+            overlapped.append(1)
+        time.sleep(0.01)
+        try:
+            return send(method, url, params, data)
+        finally:
+            sending.pop()
+
+    session.s._send = slowSend
+    return overlapped
+
+
+def test_threads_send_one_request_at_a_time(session):
+    overlapped = watchOverlaps(session)
+    session.s.responses = [CITY_PAGE.format(i) for i in range(20)]
+    threads = [
+        threading.Thread(target=session.get, args=("view=city&cityId={}".format(i),))
+        for i in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(session.s.sent) == 20
+    assert overlapped == []
+
+
+def test_broker_serves_one_request_at_a_time(session):
+    overlapped = watchOverlaps(session)
+    session.s.responses = [CITY_PAGE.format(i) for i in range(10)]
+    clients = {"lock": threading.Lock(), "count": 10, "last": time.time()}
+    tasks = []
+    for i in range(10):
+        task, served = multiprocessing.Pipe()
+        threading.Thread(
+            target=broker._serve, args=(session, served, clients), daemon=True
+        ).start()
+        task.send(("get", {"url": "view=city&cityId={}".format(i)}, "normal"))
+        tasks.append(task)
+
+    replies = [task.recv() for task in tasks]
+    for task in tasks:
+        task.close()
+
+    assert [status for status, _ in replies] == ["ok"] * 10
+    assert len(session.s.sent) == 10
+    assert overlapped == []
+
+
+def test_bulk_task_waiting_for_the_rate_limit_does_not_block_others(
+    session, stateDatabase, monkeypatch
+):
+    monkeypatch.setattr(sessionModule, "acquireRequest", rateLimit.acquireRequest)
+    monkeypatch.setattr(rateLimit, "request_rate", 2.0)
+    monkeypatch.setattr(rateLimit, "request_burst", 3)
+    monkeypatch.setattr(rateLimit, "request_priority_reserve", {"high": 0, "bulk": 2})
+    session.mail, session.username, session.mundo, session.servidor = "a@b.c", "p", "1", "en"
+    session.s.responses = [CITY_PAGE.format(i) for i in range(2)]
+    # one token left, a bulk request has to wait a second for two more
+    rateLimit.acquireRequest(session, "high")
+    rateLimit.acquireRequest(session, "high")
+
+    def bulk():
+        with rateLimit.requestPriority("bulk"):
+            session.get("view=city&cityId=1")
+
+    thread = threading.Thread(target=bulk)
+    thread.start()
+    time.sleep(0.2)
+    with rateLimit.requestPriority("high"):
+        session.get("view=city&cityId=2")
+    thread.join()
+
+    assert [sent[1] for sent in session.s.sent] == [
+        session.urlBase + "view=city&cityId=2",
+        session.urlBase + "view=city&cityId=1",
+    ]
+
+
+def test_failed_is_kept_per_task(session, monkeypatch):
+    monkeypatch.setattr(sessionModule, "getTaskId", lambda: 1)
+    session.failed = True
+    monkeypatch.setattr(sessionModule, "getTaskId", lambda: 2)
+    assert session.failed is False
+    monkeypatch.setattr(sessionModule, "getTaskId", lambda: 1)
+    assert session.failed is True
+
+
+def test_request_lock_is_not_pickled():
+    session = Session.__new__(Session)
+    session.requestLock = None
+    lock = session._Session__requestLock()
+
+    copy = pickle.loads(pickle.dumps(session))
+
+    assert copy.requestLock is None
+    assert copy._Session__requestLock() is not lock